@@ -0,0 +1,27 @@
+"""
+Значения окружения по умолчанию для запуска бенчмарков без `.env`.
+
+Импортируется до любого модуля из `src`, чтобы `Settings` не требовал
+реальных ключей облака и адресов инфраструктуры.
+"""
+
+import os
+import tempfile
+
+DEFAULTS = {
+    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
+    "STORAGE_PATH": tempfile.gettempdir(),
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_DB": "bench",
+    "AWS_S3_REGION_NAME": "ru-central1",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "AWS_ACCESS_KEY_ID": "bench",
+    "AWS_S3_ENDPOINT_URL": "http://127.0.0.1:9000",
+    "BUCKET_NAME": "bench",
+    "BROKER_URL": "memory://",
+    "RESULT_BACKEND": "cache+memory://",
+}
+
+for key, value in DEFAULTS.items():
+    os.environ.setdefault(key, value)
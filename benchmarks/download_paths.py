@@ -0,0 +1,303 @@
+"""
+Отдача локального файла через приложение: os.sendfile против генератора с os.pread в потоке.
+
+Для каждого пути сервер (`python -m src`, один воркер uvicorn) запускается
+заново с DOWNLOAD_ZERO_COPY=true или false, в него загружается файл, после чего
+клиенты по постоянным HTTP/1.1-соединениям скачивают его через
+`GET /files/download/{uid}` — целиком и диапазоном (`Range`). Печатаются
+пропускная способность, p50/p99 задержки и CPU сервера на гигабайт ответа.
+
+Ответы клиент читает в заранее выделенный буфер, CPU клиента в отчёт не входит.
+Отдача через os.sendfile работает, если установлен httptools
+(`poetry install --extras server`): `server` в отчёте показывает выбранный парсер.
+
+Запуск из корня проекта:
+    python -m benchmarks.download_paths --size-mb 64 --connections 4 --duration 10
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from benchmarks import _env  # noqa: F401
+
+PATHS = {"pread": "false", "sendfile": "true"}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as file:
+        # Поля после имени процесса: utime и stime — 14-е и 15-е
+        fields = file.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _server_cpu_seconds(master: int) -> float:
+    """Процессорное время главного процесса и его воркеров (только Linux)."""
+    total = _cpu_seconds(master)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                parent = int(file.read().rsplit(")", 1)[1].split()[1])
+            if parent == master:
+                total += _cpu_seconds(int(entry))
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+# Клиент
+
+
+def _download(
+    port: int, request: bytes, stop_at: float, stats: Dict, lock: threading.Lock
+) -> None:
+    buffer = memoryview(bytearray(4 * 1024 * 1024))
+    latencies: List[float] = []
+    received = errors = 0
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        reader = sock.makefile("rb")
+        while (started := time.monotonic()) < stop_at:
+            sock.sendall(request)
+            status = reader.readline()
+            length = 0
+            while (line := reader.readline()) != b"\r\n":
+                name, _, value = line.partition(b":")
+                if name.lower() == b"content-length":
+                    length = int(value)
+            remaining = length
+            while remaining:
+                n = reader.readinto(buffer[: min(remaining, len(buffer))])
+                if not n:
+                    raise ConnectionError("Server closed the connection")
+                remaining -= n
+            if status.split()[1] in (b"200", b"206"):
+                latencies.append(time.monotonic() - started)
+                received += length
+            else:
+                errors += 1
+
+    with lock:
+        stats["latencies"].extend(latencies)
+        stats["bytes"] += received
+        stats["errors"] += errors
+
+
+def _measure(
+    args: argparse.Namespace, port: int, master: int, request: bytes
+) -> Dict:
+    # Прогрев: файл попадает в страничный кэш, соединения открыты
+    _drive(port, request, args.connections, time.monotonic() + args.warmup)
+
+    cpu_before = _server_cpu_seconds(master)
+    wall_start = time.monotonic()
+    stats = _drive(port, request, args.connections, wall_start + args.duration)
+    wall = time.monotonic() - wall_start
+    cpu = _server_cpu_seconds(master) - cpu_before
+
+    latencies = sorted(stats["latencies"])
+    gigabytes = stats["bytes"] / 1024**3
+    return {
+        "requests": len(latencies),
+        "errors": stats["errors"],
+        "throughput_mb_s": round(stats["bytes"] / 1024**2 / wall, 1),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "server_cpu_seconds_per_gb": round(cpu / gigabytes, 4),
+    }
+
+
+def _drive(port: int, request: bytes, connections: int, stop_at: float) -> Dict:
+    stats = {"latencies": [], "bytes": 0, "errors": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_download, args=(port, request, stop_at, stats, lock))
+        for _ in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+# Сервер
+
+
+def _start_server(
+    zero_copy: str, port: int, workdir: str, size_mb: int, log_path: str
+) -> subprocess.Popen:
+    storage = os.path.join(workdir, "storage")
+    os.makedirs(storage, exist_ok=True)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+        "STORAGE_PATH": storage,
+        "BROKER_URL": "memory://",
+        "RESULT_BACKEND": "cache+memory://",
+        "MIN_FREE_SPACE_MB": "0",
+        "MAX_FILE_SIZE_MB": str(size_mb + 1),
+        "DOWNLOAD_ZERO_COPY": zero_copy,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": "1",
+    }
+    with open(log_path, "wb") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "src"],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+
+
+def _wait_ready(port: int, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/files/00000000-0000-0000-0000-000000000000")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError("Server did not start in time")
+
+
+def _upload(port: int, path: str) -> str:
+    boundary = "benchboundary"
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="bench.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    with open(path, "rb") as file:
+        body = head + file.read() + tail
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+    connection.request(
+        "POST",
+        "/files/upload",
+        body=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    response = connection.getresponse()
+    payload = response.read()
+    connection.close()
+    if response.status != 201:
+        raise RuntimeError(f"Upload failed: {response.status} {payload!r}")
+    return json.loads(payload)["uid"]
+
+
+def _workloads(uid: str, size: int) -> Dict[str, bytes]:
+    target = f"GET /files/download/{uid} HTTP/1.1\r\nHost: bench\r\n"
+    middle = size // 2
+    return {
+        "full": f"{target}\r\n".encode(),
+        "range_1mb": (
+            f"{target}Range: bytes={middle}-{middle + 1024 * 1024 - 1}\r\n\r\n"
+        ).encode(),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    results: List[Dict] = []
+    engine = ""
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "bench.pdf")
+        with open(source, "wb") as file:
+            file.write(b"%PDF-1.4\n")
+            for _ in range(args.size_mb):
+                file.write(os.urandom(1024 * 1024))
+        size = os.path.getsize(source)
+
+        for path, zero_copy in PATHS.items():
+            serverdir = os.path.join(workdir, path)
+            os.makedirs(serverdir)
+            port = _free_port()
+            log_path = os.path.join(serverdir, "server.log")
+            server = _start_server(zero_copy, port, serverdir, args.size_mb, log_path)
+            try:
+                _wait_ready(port, server)
+                uid = _upload(port, source)
+                for workload, request in _workloads(uid, size).items():
+                    result = _measure(args, port, server.pid, request)
+                    results.append({"workload": workload, "path": path, **result})
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=60)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+                # Строка главного процесса с выбранными циклом событий и парсером HTTP
+                with open(log_path) as log:
+                    for line in log:
+                        if "Starting" in line:
+                            engine = line.split("INFO:", 1)[-1].strip()
+
+    return {
+        "benchmark": "download_paths",
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "server": engine,
+        "config": {
+            "size_mb": args.size_mb,
+            "connections": args.connections,
+            "duration": args.duration,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--output", default=None, help="Also write the JSON to a file")
+    args = parser.parse_args()
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
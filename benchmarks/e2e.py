@@ -0,0 +1,418 @@
+"""
+Сквозной бенчмарк сервиса: загрузка, метаданные и скачивание через настоящее
+приложение под uvicorn.
+
+Все зависимости локальные и поднимаются самим скриптом отдельными процессами:
+замена S3 (`benchmarks/s3_stub.py`), база SQLite во временном каталоге и воркер
+Celery с брокером на файловой системе (`filesystem://`), так что задачи загрузки
+в облако выполняются так же, как в продакшене, но без Redis.
+
+Для каждого размера файла и уровня параллельности печатается пропускная
+способность, p50/p95/p99 задержки и ресурсы процессов (CPU на запрос, RSS)
+в JSON с хешем коммита, чтобы результаты можно было сравнивать между коммитами.
+
+Запуск из корня проекта:
+    python -m benchmarks.e2e --sizes-kb 16 256 2048 --concurrency 1 8 32 \\
+        --requests 64 --output e2e.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, List, Optional
+
+from benchmarks import _env  # noqa: F401
+
+# Состояния, в которых файл ещё не загружен воркером в облако
+LOCAL_STATES = ("received", "local_only", "uploading")
+MB = 1024 * 1024
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ProcessStats:
+    """Процессорное время и память процесса по /proc (только Linux)."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as file:
+            # Поля после имени процесса: utime и stime — 14-е и 15-е
+            fields = file.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def memory_mb(self) -> Dict[str, float]:
+        values = {}
+        with open(f"/proc/{self.pid}/status") as file:
+            for line in file:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "VmHWM"):
+                    values[name] = int(value.split()[0]) / 1024
+        return {
+            "rss_mb": round(values["VmRSS"], 1),
+            "peak_rss_mb": round(values["VmHWM"], 1),
+        }
+
+
+def _configure_celery(broker_folder: str):
+    # Брокер на файловой системе: очередь общая для процессов приложения и воркера
+    from src.tasks.celery_app import app as celery
+
+    celery.conf.broker_transport_options = {
+        "data_folder_in": broker_folder,
+        "data_folder_out": broker_folder,
+        "control_folder": os.path.join(broker_folder, "control"),
+    }
+    os.makedirs(os.path.join(broker_folder, "control"), exist_ok=True)
+    return celery
+
+
+def _serve(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    _configure_celery(os.environ["BENCH_BROKER_FOLDER"])
+    from src.main import app
+
+    uvicorn.run(
+        app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False
+    )
+
+
+def _work(args: argparse.Namespace) -> None:
+    celery = _configure_celery(os.environ["BENCH_BROKER_FOLDER"])
+    import src.tasks  # noqa: F401  регистрирует задачи
+
+    celery.worker_main(
+        [
+            "worker",
+            "--pool=threads",
+            f"--concurrency={args.worker_concurrency}",
+            "--loglevel=warning",
+            "--without-heartbeat",
+            "--without-mingle",
+            "--without-gossip",
+        ]
+    )
+
+
+class Scenario:
+    """Один замер: запросы с заданной параллельностью и ресурсы процессов."""
+
+    def __init__(self, server: ProcessStats, worker: ProcessStats):
+        self.server = server
+        self.worker = worker
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.transferred = 0
+
+    async def run(self, requests: List, concurrency: int) -> float:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def timed(request) -> None:
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    transferred = await request()
+                    self.transferred += transferred
+                except Exception:
+                    self.errors += 1
+                self.latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(request) for request in requests))
+        return time.perf_counter() - start
+
+    def report(self, seconds: float, server_cpu: float, worker_cpu: float) -> dict:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "throughput_rps": round(count / seconds, 1),
+            "throughput_mb_s": round(self.transferred / MB / seconds, 1),
+            "p50_ms": round(_percentile(latencies, 0.5), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+            "server_cpu_ms_per_request": round(server_cpu * 1000 / count, 3),
+            "worker_cpu_ms_per_request": round(worker_cpu * 1000 / count, 3),
+            **{f"server_{key}": value for key, value in self.server.memory_mb().items()},
+        }
+
+
+async def _measure(
+    server: ProcessStats,
+    worker: ProcessStats,
+    requests: List,
+    concurrency: int,
+    drain=None,
+) -> dict:
+    scenario = Scenario(server, worker)
+    server_cpu, worker_cpu = server.cpu_seconds(), worker.cpu_seconds()
+    seconds = await scenario.run(requests, concurrency)
+    result = {}
+    if drain is not None:
+        # Загрузка завершена, когда воркер отправил все файлы в облако
+        drain_seconds = await drain()
+        result["drain_seconds"] = round(drain_seconds, 3)
+    return {
+        **scenario.report(
+            seconds,
+            server.cpu_seconds() - server_cpu,
+            worker.cpu_seconds() - worker_cpu,
+        ),
+        **result,
+    }
+
+
+async def _wait_drained(database: str, timeout: float = 300) -> float:
+    start = time.perf_counter()
+    query = (
+        "SELECT count(*) FROM files WHERE storage_state IN "
+        f"({', '.join('?' * len(LOCAL_STATES))})"
+    )
+    while time.perf_counter() - start < timeout:
+        with closing(sqlite3.connect(database)) as conn:
+            if conn.execute(query, LOCAL_STATES).fetchone()[0] == 0:
+                return time.perf_counter() - start
+        await asyncio.sleep(0.05)
+    raise TimeoutError("Celery worker did not upload files to the S3 stub in time")
+
+
+async def _wait_ready(client, timeout: float = 30) -> None:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            await client.get(f"/files/{uuid.uuid4()}")
+            return
+        except Exception:
+            await asyncio.sleep(0.1)
+    raise TimeoutError("Application did not start in time")
+
+
+async def _drive(
+    args: argparse.Namespace,
+    base_url: str,
+    database: str,
+    server: ProcessStats,
+    worker: ProcessStats,
+) -> List[dict]:
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    timeout = httpx.Timeout(300)
+    results = []
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=timeout
+    ) as client:
+        await _wait_ready(client)
+
+        for size_kb in args.sizes_kb:
+            # Общее содержимое с разным началом: дедупликация не срабатывает
+            payload = os.urandom(size_kb * 1024)
+
+            for concurrency in args.concurrency:
+                uids: List[str] = []
+
+                def upload_request(number: int):
+                    body = f"%PDF-1.4\n{uuid.uuid4()}\n".encode() + payload
+
+                    async def request() -> int:
+                        response = await client.post(
+                            "/files/upload",
+                            files={"file": ("bench.pdf", body, "application/pdf")},
+                        )
+                        response.raise_for_status()
+                        uids.append(response.json()["uid"])
+                        return len(body)
+
+                    return request
+
+                def download_request(uid: str):
+                    async def request() -> int:
+                        size = 0
+                        async with client.stream("GET", f"/files/download/{uid}") as response:
+                            response.raise_for_status()
+                            async for chunk in response.aiter_raw():
+                                size += len(chunk)
+                        return size
+
+                    return request
+
+                def metadata_request(uid: str):
+                    async def request() -> int:
+                        response = await client.get(f"/files/{uid}")
+                        response.raise_for_status()
+                        return len(response.content)
+
+                    return request
+
+                common = {"size_kb": size_kb, "concurrency": concurrency}
+                results.append(
+                    {
+                        "workload": "upload",
+                        **common,
+                        **await _measure(
+                            server,
+                            worker,
+                            [upload_request(n) for n in range(args.requests)],
+                            concurrency,
+                            drain=lambda: _wait_drained(database),
+                        ),
+                    }
+                )
+                for workload, factory in (
+                    ("metadata", metadata_request),
+                    ("download", download_request),
+                ):
+                    results.append(
+                        {
+                            "workload": workload,
+                            **common,
+                            **await _measure(
+                                server,
+                                worker,
+                                [factory(uid) for uid in uids],
+                                concurrency,
+                            ),
+                        }
+                    )
+    return results
+
+
+def _spawn(arguments: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", *arguments], env=env, stdout=subprocess.DEVNULL
+    )
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = os.path.join(workdir, "storage")
+        broker = os.path.join(workdir, "broker")
+        database = os.path.join(workdir, "bench.sqlite3")
+        os.makedirs(storage)
+        os.makedirs(broker)
+
+        s3_port, app_port = _free_port(), _free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{database}",
+            "STORAGE_PATH": storage,
+            "AWS_S3_ENDPOINT_URL": f"http://127.0.0.1:{s3_port}",
+            "BROKER_URL": "filesystem://",
+            "RESULT_BACKEND": "cache+memory://",
+            "BENCH_BROKER_FOLDER": broker,
+            "MIN_FREE_SPACE_MB": "0",
+            "MAX_FILE_SIZE_MB": str(max(args.sizes_kb) // 1024 + 1),
+        }
+
+        processes = [
+            _spawn(
+                ["benchmarks.s3_stub", f"--port={s3_port}", f"--latency-ms={args.latency_ms}"],
+                env,
+            )
+        ]
+        try:
+            server = _spawn(["benchmarks.e2e", "--role=server", f"--port={app_port}"], env)
+            processes.append(server)
+            worker = _spawn(
+                [
+                    "benchmarks.e2e",
+                    "--role=worker",
+                    f"--worker-concurrency={args.worker_concurrency}",
+                ],
+                env,
+            )
+            processes.append(worker)
+
+            results = asyncio.run(
+                _drive(
+                    args,
+                    f"http://127.0.0.1:{app_port}",
+                    database,
+                    ProcessStats(server.pid),
+                    ProcessStats(worker.pid),
+                )
+            )
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    return {
+        "benchmark": "e2e",
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "sizes_kb": args.sizes_kb,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "latency_ms": args.latency_ms,
+            "worker_concurrency": args.worker_concurrency,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[16, 256, 2048])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--worker-concurrency", type=int, default=8)
+    parser.add_argument("--output", default=None, help="Also write the JSON to a file")
+    # Служебные режимы дочерних процессов
+    parser.add_argument("--role", choices=["server", "worker"], default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.role == "server":
+        return _serve(args)
+    if args.role == "worker":
+        return _work(args)
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Накладные расходы бортового самописца: запись выключена
+(FLIGHT_RECORDER_CAPACITY=0), включена с профилировщиком в покое
+(FLIGHT_RECORDER_PROFILE_RATE=0, режим по умолчанию) и с профилированием
+каждого запроса (FLIGHT_RECORDER_PROFILE_RATE=1).
+
+Запросы метаданных и скачивания небольших файлов из локального кэша идут
+через приложение (httpx ASGITransport) с заданной параллельностью — на таких
+коротких запросах доля самописца наибольшая. Режимы чередуются по раундам,
+а порядок режимов в раунде сдвигается, чтобы дрейф машины и прогрев
+не попадали в сравнение.
+
+Отдельно замеряется сам путь самописца — промежуточный слой вокруг пустого
+ASGI-приложения с несколькими событиями на запрос: на общей машине разница
+между режимами в сквозном прогоне сравнима с шумом.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import _env  # noqa: F401
+
+MODES = {
+    "off": {"capacity": 0, "profile_rate": 0.0},
+    "recording": {"capacity": 100, "profile_rate": 0.0},
+    "profiling": {"capacity": 100, "profile_rate": 1.0},
+}
+
+
+def _percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def measure(client, uids: list, requests: int, concurrency: int) -> dict:
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def fetch(number: int) -> None:
+        nonlocal errors
+        uid = uids[number % len(uids)]
+        url = f"/files/download/{uid}" if number % 2 else f"/files/{uid}"
+        async with slots:
+            start = time.perf_counter()
+            response = await client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    cpu, start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(fetch(number) for number in range(requests)))
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+    return {"latencies": latencies, "errors": errors, "seconds": wall, "cpu": cpu}
+
+
+async def measure_hot_path(requests: int) -> dict:
+    from src.api.flight_recorder import FlightRecorderMiddleware
+    from src.flight_recorder import flight_recorder, record
+
+    async def app(scope, receive, send) -> None:
+        # Типичное скачивание: этапы и запросы к базе
+        for _ in range(4):
+            record("db", "SELECT files.uid FROM files", time.perf_counter(), 0.0)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message) -> None:
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/files/download/bench"}
+    results = {}
+    for mode, handler in (
+        ("bare", app),
+        ("off", FlightRecorderMiddleware(app)),
+        ("recording", FlightRecorderMiddleware(app)),
+    ):
+        flight_recorder.capacity = 0 if mode == "off" else 100
+        flight_recorder.profile_rate = 0.0
+        start = time.perf_counter()
+        for _ in range(requests):
+            await handler(scope, None, send)
+        results[f"{mode}_us_per_request"] = round(
+            (time.perf_counter() - start) / requests * 1e6, 2
+        )
+    flight_recorder.clear()
+    return results
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from src.db_conn import Base, engine
+    from src.flight_recorder import flight_recorder
+    from src.main import app
+    from src.services.storage_capacity import storage_capacity
+
+    storage_capacity.min_free_bytes = 0
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    totals = {mode: [] for mode in MODES}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        uids = [
+            (
+                await client.post(
+                    "/files/upload",
+                    files={"file": ("bench.pdf", b"%PDF-1.4\n" + bytes([n]) * args.size, "application/pdf")},
+                )
+            ).json()["uid"]
+            for n in range(args.files)
+        ]
+
+        # Прогрев: кэш метаданных и соединения с базой
+        await measure(client, uids, args.requests, args.concurrency)
+        modes = list(MODES.items())
+        for number in range(args.rounds):
+            # Порядок режимов сдвигается каждый раунд
+            for mode, options in modes[number % 3 :] + modes[: number % 3]:
+                flight_recorder.capacity = options["capacity"]
+                flight_recorder.profile_rate = options["profile_rate"]
+                totals[mode].append(
+                    await measure(client, uids, args.requests, args.concurrency)
+                )
+                flight_recorder.clear()
+
+    await engine.dispose()
+
+    results = []
+    for mode, rounds in totals.items():
+        latencies = sorted(value for result in rounds for value in result["latencies"])
+        count = len(latencies)
+        seconds = sum(result["seconds"] for result in rounds)
+        results.append(
+            {
+                "mode": mode,
+                "requests": count,
+                "errors": sum(result["errors"] for result in rounds),
+                "requests_per_second": round(count / seconds, 1),
+                "p50_ms": round(_percentile(latencies, 0.5), 3),
+                "p99_ms": round(_percentile(latencies, 0.99), 3),
+                "cpu_us_per_request": round(
+                    sum(result["cpu"] for result in rounds) / count * 1e6, 1
+                ),
+            }
+        )
+    off = results[0]["cpu_us_per_request"]
+    for result in results:
+        result["cpu_overhead_percent"] = round(
+            (result["cpu_us_per_request"] / off - 1) * 100, 1
+        )
+    return {
+        "hot_path": await measure_hot_path(args.requests * 50),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--size", type=int, default=16 * 1024)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as storage:
+        # Движок базы создаётся при импорте src, поэтому адрес задаётся заранее
+        os.environ["DATABASE_URL"] = (
+            f"sqlite+aiosqlite:///{os.path.join(storage, 'bench.sqlite3')}"
+        )
+        os.environ["STORAGE_PATH"] = storage
+        if "src.config" in sys.modules:
+            raise RuntimeError("src must not be imported before the database URL is set")
+
+        results = asyncio.run(run(args))
+
+    print(json.dumps({"benchmark": "flight_recorder", **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
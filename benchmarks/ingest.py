@@ -0,0 +1,142 @@
+"""
+Приём загружаемого файла: прежний путь (спулинг Starlette в
+SpooledTemporaryFile и копирование в хранилище, см. `_legacy`) против
+потокового `MultipartIngestor`.
+
+Тело запроса подаётся в приложение ASGI-сообщениями по 64 KB, как это делает
+сервер. Каждый замер идёт в отдельном процессе, чтобы пиковый RSS не смешивался.
+
+Запуск из корня проекта:
+    python -m benchmarks.ingest --size-mb 100 --repeat 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import aiofiles
+
+from benchmarks import _env  # noqa: F401
+
+from starlette.requests import Request
+
+from src.config import settings
+from src.services.ingest import MultipartIngestor
+
+BOUNDARY = "benchmarkboundary"
+MESSAGE_SIZE = 64 * 1024
+
+
+def _request(size: int) -> Request:
+    head = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="bench.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+    payload = b"\x00" * MESSAGE_SIZE
+    total = len(head) + size + len(tail)
+
+    def body():
+        yield head
+        remaining = size
+        while remaining > 0:
+            chunk = payload[: min(MESSAGE_SIZE, remaining)]
+            remaining -= len(chunk)
+            yield chunk
+        yield tail
+
+    chunks = body()
+
+    async def receive():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/files/upload",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+            (b"content-length", str(total).encode()),
+        ],
+    }
+    return Request(scope, receive)
+
+
+async def _legacy(size: int) -> None:
+    # Прежнее сохранение: файлы больше WRITE_CHUNK_SIZE копировались из спула
+    # кусками по 1 KB, меньшие читались в память целиком
+    request = _request(size)
+    form = await request.form()
+    file = form["file"]
+    file_path = os.path.join(settings.STORAGE_PATH, f"{uuid.uuid4()}.pdf")
+    async with aiofiles.open(file_path, "wb") as out_file:
+        if int(request.headers["content-length"]) > settings.WRITE_CHUNK_SIZE:
+            while content := await file.read(1024):
+                await out_file.write(content)
+        else:
+            await out_file.write(await file.read())
+    await form.close()
+
+
+async def _streaming(size: int) -> None:
+    await MultipartIngestor(_request(size), settings.STORAGE_PATH).ingest()
+
+
+def _child(mode: str, size: int) -> dict:
+    runner = {"legacy": _legacy, "streaming": _streaming}[mode]
+    with tempfile.TemporaryDirectory() as storage:
+        settings.STORAGE_PATH = storage
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        asyncio.run(runner(size))
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+
+    return {
+        "mode": mode,
+        "size_mb": size // (1024 * 1024),
+        "seconds": round(wall, 4),
+        "throughput_mb_s": round(size / 1024**2 / wall, 1),
+        "cpu_seconds": round(cpu, 4),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=["legacy", "streaming"])
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    if args.child:
+        print(json.dumps(_child(args.child, size)))
+        return
+
+    results = []
+    for _ in range(args.repeat):
+        for mode in ("legacy", "streaming"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.ingest", "--child", mode,
+                 "--size-mb", str(args.size_mb)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results.append(json.loads(output))
+
+    print(json.dumps({"benchmark": "ingest", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
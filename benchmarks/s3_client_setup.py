@@ -0,0 +1,71 @@
+"""
+Стоимость одной операции S3 с новым клиентом на каждый вызов и с общим
+долгоживущим клиентом `YandexCloudProvider.connect()`.
+
+Каждая операция — HeadObject небольшого объекта на локальной замене S3,
+поэтому время почти целиком уходит на создание сессии, клиента и соединения.
+
+Запуск из корня проекта:
+    python -m benchmarks.s3_client_setup --operations 200
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.s3_stub import S3Stub
+
+from src.config import settings
+from src.services.s3 import YandexCloudProvider
+
+
+async def measure(provider: YandexCloudProvider, operations: int) -> dict:
+    latencies = []
+    for _ in range(operations):
+        start = time.perf_counter()
+        await provider.exists("object")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    return {
+        "operations": operations,
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+async def run(args: argparse.Namespace) -> list:
+    stub = S3Stub()
+    settings.AWS_S3_ENDPOINT_URL = await stub.start()
+    stub.objects["object"] = b"x"
+
+    try:
+        per_call = YandexCloudProvider()
+        pooled = YandexCloudProvider()
+        await pooled.connect()
+        try:
+            return [
+                {"client": "per_call", **await measure(per_call, args.operations)},
+                {"client": "pooled", **await measure(pooled, args.operations)},
+            ]
+        finally:
+            await pooled.close()
+    finally:
+        await stub.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=int, default=200)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps({"benchmark": "s3_client_setup", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
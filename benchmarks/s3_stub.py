@@ -0,0 +1,150 @@
+"""
+Минимальная замена S3 для бенчмарков.
+
+Поддерживает операции, которые использует `YandexCloudProvider`: PutObject,
+Multipart Upload, GetObject, HeadObject, DeleteObject. Объекты хранятся в памяти.
+Задержка на запрос и ограничение скорости одного соединения позволяют
+приблизить поведение к удалённому Object Storage.
+
+Отдельный запуск:
+    python -m benchmarks.s3_stub --port 9000 --latency-ms 20 --bandwidth-mb-s 50
+"""
+
+import argparse
+import asyncio
+import hashlib
+import uuid
+from typing import Dict, Optional
+
+from aiohttp import web
+
+
+class S3Stub:
+    def __init__(self, latency_ms: float = 0, bandwidth_mb_s: Optional[float] = None):
+        self.latency = latency_ms / 1000
+        self.bandwidth = bandwidth_mb_s * 1024 * 1024 if bandwidth_mb_s else None
+
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.requests = 0
+
+        self.app = web.Application(client_max_size=1024**3)
+        self.app.router.add_route("*", "/{bucket}/{key:.+}", self.handle)
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _read_body(self, request: web.Request) -> bytes:
+        chunks = []
+        async for chunk in request.content.iter_chunked(256 * 1024):
+            chunks.append(chunk)
+            await self._throttle(len(chunk))
+        return b"".join(chunks)
+
+    async def _throttle(self, size: int) -> None:
+        if self.bandwidth:
+            await asyncio.sleep(size / self.bandwidth)
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        key = request.match_info["key"]
+        query = request.query
+
+        if request.method == "PUT" and "uploadId" in query:
+            body = await self._read_body(request)
+            self.uploads[query["uploadId"]][int(query["partNumber"])] = body
+            return web.Response(headers={"ETag": _etag(body)})
+
+        if request.method == "PUT":
+            body = await self._read_body(request)
+            self.objects[key] = body
+            return web.Response(headers={"ETag": _etag(body)})
+
+        if request.method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            return _xml(
+                "InitiateMultipartUploadResult",
+                f"<Key>{key}</Key><UploadId>{upload_id}</UploadId>",
+            )
+
+        if request.method == "POST" and "uploadId" in query:
+            await request.read()
+            parts = self.uploads.pop(query["uploadId"])
+            body = b"".join(parts[number] for number in sorted(parts))
+            self.objects[key] = body
+            return _xml(
+                "CompleteMultipartUploadResult",
+                f"<Key>{key}</Key><ETag>{_etag(body)}</ETag>",
+            )
+
+        if request.method == "DELETE" and "uploadId" in query:
+            self.uploads.pop(query["uploadId"], None)
+            return web.Response(status=204)
+
+        if request.method == "DELETE":
+            self.objects.pop(key, None)
+            return web.Response(status=204)
+
+        if request.method in ("GET", "HEAD"):
+            body = self.objects.get(key)
+            if body is None:
+                if request.method == "HEAD":
+                    return web.Response(status=404)
+                return _xml("Error", "<Code>NoSuchKey</Code>", status=404)
+
+            headers = {"ETag": _etag(body), "Content-Length": str(len(body))}
+            if request.method == "HEAD":
+                return web.Response(headers=headers)
+
+            response = web.StreamResponse(headers=headers)
+            await response.prepare(request)
+            for offset in range(0, len(body), 256 * 1024):
+                chunk = body[offset : offset + 256 * 1024]
+                await self._throttle(len(chunk))
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+
+        return web.Response(status=405)
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def _xml(root: str, content: str, status: int = 200) -> web.Response:
+    return web.Response(
+        status=status,
+        content_type="application/xml",
+        text=f'<?xml version="1.0" encoding="UTF-8"?><{root}>{content}</{root}>',
+    )
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    stub = S3Stub(args.latency_ms, args.bandwidth_mb_s)
+    print(f"S3 stub listening on {await stub.start(port=args.port)}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-mb-s", type=float, default=None)
+    asyncio.run(_serve(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Загрузка файлов в облако через `YandexCloudProvider.upload` на локальной замене S3.
+
+Сравнивает последовательную загрузку частей (S3_UPLOAD_CONCURRENCY=1, как было
+раньше) с параллельной при разных размерах файлов.
+
+Запуск из корня проекта:
+    python -m benchmarks.s3_upload --sizes-mb 4 32 128 --concurrency 1 4 8 \\
+        --latency-ms 20 --bandwidth-mb-s 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.s3_stub import S3Stub
+
+from src.config import settings
+from src.services.s3 import YandexCloudProvider
+
+
+async def run(args: argparse.Namespace) -> list:
+    stub = S3Stub(args.latency_ms, args.bandwidth_mb_s)
+    settings.AWS_S3_ENDPOINT_URL = await stub.start()
+
+    results = []
+    try:
+        for size_mb in args.sizes_mb:
+            with tempfile.NamedTemporaryFile(delete=False) as tmp:
+                tmp.write(os.urandom(size_mb * 1024 * 1024))
+                path = tmp.name
+
+            try:
+                for concurrency in args.concurrency:
+                    settings.S3_UPLOAD_CONCURRENCY = concurrency
+                    provider = YandexCloudProvider()
+                    requests_before = stub.requests
+
+                    start = time.perf_counter()
+                    await provider.upload(f"bench-{size_mb}-{concurrency}", path)
+                    elapsed = time.perf_counter() - start
+
+                    results.append(
+                        {
+                            "size_mb": size_mb,
+                            "concurrency": concurrency,
+                            "part_size_mb": provider.part_size(size_mb * 1024 * 1024)
+                            // (1024 * 1024),
+                            "s3_requests": stub.requests - requests_before,
+                            "seconds": round(elapsed, 4),
+                            "throughput_mb_s": round(size_mb / elapsed, 1),
+                        }
+                    )
+            finally:
+                os.unlink(path)
+    finally:
+        await stub.stop()
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[4, 32, 128])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--bandwidth-mb-s", type=float, default=50)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps({"benchmark": "s3_upload", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Масштабирование продакшен-сервера (`python -m src`) по числу воркеров.
+
+Для каждого значения SERVER_WORKERS сервер запускается заново (база SQLite
+и хранилище во временном каталоге, брокер в памяти), в него загружается
+небольшой файл, после чего генераторы нагрузки — отдельные процессы
+с постоянными HTTP/1.1-соединениями — в течение --duration секунд запрашивают
+метаданные файла и скачивают его. Печатаются запросы в секунду, ускорение
+относительно первого числа воркеров, p50/p99 задержки и CPU сервера
+(главный процесс и воркеры) на запрос.
+
+Генераторы нагрузки делят ядра с сервером, поэтому рост ограничен числом
+ядер машины: `cpu_count` в отчёте показывает, сколько их было доступно.
+
+Запуск из корня проекта:
+    python -m benchmarks.server_scaling --workers 1 2 4 --clients 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks import _env  # noqa: F401
+
+WORKLOADS = {
+    "metadata": "/files/{uid}",
+    "download": "/files/download/{uid}",
+}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as file:
+        # Поля после имени процесса: utime и stime — 14-е и 15-е
+        fields = file.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _server_cpu_seconds(master: int) -> float:
+    """Процессорное время главного процесса и его воркеров (только Linux)."""
+    total = _cpu_seconds(master)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                parent = int(file.read().rsplit(")", 1)[1].split()[1])
+            if parent == master:
+                total += _cpu_seconds(int(entry))
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+# Генератор нагрузки (отдельный процесс)
+
+
+async def _connection(
+    port: int, path: str, start_at: float, stop_at: float, stats: dict
+) -> None:
+    request = f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while (now := time.monotonic()) < stop_at:
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n")[1:]:
+                name, _, value = line.partition(b":")
+                if name.lower() == b"content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+
+            # Запросы прогрева не учитываются
+            if now >= start_at:
+                if head.startswith(b"HTTP/1.1 200"):
+                    stats["latencies"].append(time.monotonic() - now)
+                else:
+                    stats["errors"] += 1
+    finally:
+        writer.close()
+
+
+def _generate(
+    port: int,
+    path: str,
+    connections: int,
+    start_at: float,
+    stop_at: float,
+    results: multiprocessing.Queue,
+) -> None:
+    stats = {"latencies": [], "errors": 0}
+
+    async def run() -> None:
+        await asyncio.gather(
+            *(
+                _connection(port, path, start_at, stop_at, stats)
+                for _ in range(connections)
+            )
+        )
+
+    asyncio.run(run())
+    results.put(stats)
+
+
+# Сервер
+
+
+def _start_server(
+    workers: int, port: int, workdir: str, log_path: str
+) -> subprocess.Popen:
+    storage = os.path.join(workdir, "storage")
+    os.makedirs(storage, exist_ok=True)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+        "STORAGE_PATH": storage,
+        "BROKER_URL": "memory://",
+        "RESULT_BACKEND": "cache+memory://",
+        "MIN_FREE_SPACE_MB": "0",
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": str(workers),
+        "SERVER_MAX_REQUESTS": "0",
+    }
+    with open(log_path, "wb") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "src"],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+
+
+def _wait_ready(port: int, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/docs")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError("Server did not start in time")
+
+
+def _upload(port: int, size_kb: int) -> str:
+    boundary = "benchboundary"
+    content = b"%PDF-1.4\n" + os.urandom(size_kb * 1024)
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="bench.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.request(
+        "POST",
+        "/files/upload",
+        body=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    response = connection.getresponse()
+    payload = response.read()
+    connection.close()
+    if response.status != 201:
+        raise RuntimeError(f"Upload failed: {response.status} {payload!r}")
+    return json.loads(payload)["uid"]
+
+
+def _measure(args: argparse.Namespace, port: int, master: int, path: str) -> dict:
+    results: multiprocessing.Queue = multiprocessing.Queue()
+    start_at = time.monotonic() + 1 + args.warmup
+    stop_at = start_at + args.duration
+    per_client = max(1, args.connections // args.clients)
+    clients = [
+        multiprocessing.Process(
+            target=_generate,
+            args=(port, path, per_client, start_at, stop_at, results),
+        )
+        for _ in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+
+    time.sleep(max(0, start_at - time.monotonic()))
+    cpu_before = _server_cpu_seconds(master)
+    time.sleep(max(0, stop_at - time.monotonic()))
+    cpu = _server_cpu_seconds(master) - cpu_before
+
+    latencies: List[float] = []
+    errors = 0
+    for _ in clients:
+        stats = results.get(timeout=60)
+        latencies.extend(stats["latencies"])
+        errors += stats["errors"]
+    for client in clients:
+        client.join()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / args.duration, 1),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "server_cpu_ms_per_request": round(cpu * 1000 / count, 3),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    results: List[Dict] = []
+    baseline: Dict[str, float] = {}
+    engine = ""
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as workdir:
+            port = _free_port()
+            log_path = os.path.join(workdir, "server.log")
+            server = _start_server(workers, port, workdir, log_path)
+            try:
+                _wait_ready(port, server)
+                uid = _upload(port, args.size_kb)
+                for workload, template in WORKLOADS.items():
+                    result = _measure(args, port, server.pid, template.format(uid=uid))
+                    baseline.setdefault(workload, result["throughput_rps"])
+                    results.append(
+                        {
+                            "workload": workload,
+                            "workers": workers,
+                            **result,
+                            "speedup": round(
+                                result["throughput_rps"] / baseline[workload], 2
+                            ),
+                        }
+                    )
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=60)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+                # Строка главного процесса с выбранными циклом событий и парсером HTTP
+                with open(log_path) as log:
+                    for line in log:
+                        if "Starting" in line:
+                            engine = line.split("INFO:", 1)[-1].strip()
+
+    return {
+        "benchmark": "server_scaling",
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "cpu_count": _available_cpus(),
+        "server": engine,
+        "config": {
+            "workers": args.workers,
+            "clients": args.clients,
+            "connections": args.connections,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "size_kb": args.size_kb,
+        },
+        "results": results,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    cpus = _available_cpus()
+    default_workers = sorted({1, *(n for n in (2, 4, 8, 16, 32) if n < cpus), cpus})
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument(
+        "--clients", type=int, default=cpus, help="Load generator processes"
+    )
+    parser.add_argument(
+        "--connections", type=int, default=64, help="Connections in total"
+    )
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--size-kb", type=int, default=16)
+    parser.add_argument("--output", default=None, help="Also write the JSON to a file")
+    args = parser.parse_args()
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,86 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Dict, Optional
+import hashlib
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Request, UploadFile, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import RedirectResponse, StreamingResponse
 
-from src import tasks
 from src.config import settings
 from src.db_conn import get_session
-from src.models import AppExceptions, File, FileResponseSchema
+from src.metrics import stage
+from src.models import (
+    AppExceptions,
+    File,
+    FileLookupRequest,
+    FileLookupResponse,
+    FileResponseSchema,
+)
 from src.repositories import FileRepository
-from src.services import DownloadFileService, UploadFileService, enough_free_space
+from src.services import DownloadFileService, UploadFileService, local_cache
+from src.services.http_cache import http_date, is_not_modified
+from src.services.image_derivatives import parse_spec
 from src.services.proceed_file import FileMetadata, FileValidator
-from src.services.s3 import YandexCloudProvider
+from src.services.s3 import cloud_provider
+from src.services.storage_capacity import Reservation
+from src.tasks.outbox import outbox_dispatcher
 
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
 
+# Запас на заголовки части и поля формы на каждый файл в multipart-теле
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+# Тело разбирается потоково из запроса, поэтому схема описана вручную
+UPLOAD_FILE_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+UPLOAD_FILES_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {
+                        "files": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                        }
+                    },
+                }
+            }
+        },
+    }
+}
+
 
 @router.post(
     "/upload",
     status_code=status.HTTP_201_CREATED,
     summary="Загрузка файла",
+    openapi_extra=UPLOAD_FILE_OPENAPI,
 )
 async def upload_file(
     request: Request,
-    file: UploadFile,
+    direct: Optional[bool] = None,
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, str]:
     """
@@ -37,34 +89,159 @@ async def upload_file(
     Загружает файл на сервер, выполняет его проверку на допустимость и отправляет в облачное хранилище.
 
     - **file**: файл, который нужно загрузить.
+    - **direct**: передавать файл в облако прямо во время загрузки, чтобы к ответу он уже был
+      в бакете. По умолчанию включается для файлов от `DIRECT_UPLOAD_THRESHOLD_MB`.
 
     Возвращает:
     - **uid**: уникальный идентификатор файла.
     """
-    if not await enough_free_space():
-        raise AppExceptions.internal_error()
+    with stage("upload", "prepare"):
+        direct, reservation = await _prepare_upload(request, direct, max_files=1)
+
+    validator = FileValidator(
+        allowed_types=settings.ALLOWED_FILE_TYPES,
+        max_size_mb=settings.MAX_FILE_SIZE_MB,
+    )
+
+    async with reservation:
+        file_metadata: FileMetadata = await UploadFileService.proceed_file(
+            request, session, validator, direct=direct
+        )
+
+        # Таска для Celery записана в outbox вместе с файлом, её отправит диспетчер
+        with stage("upload", "enqueue"):
+            reservation.keep(
+                await UploadFileService.track_stored_files([file_metadata])
+            )
+            outbox_dispatcher.notify([file_metadata.file_uid])
+
+    return {"uid": file_metadata.file_uid}
+
+
+@router.post(
+    "/upload/batch",
+    status_code=status.HTTP_201_CREATED,
+    summary="Загрузка нескольких файлов",
+    openapi_extra=UPLOAD_FILES_OPENAPI,
+)
+async def upload_files(
+    request: Request,
+    direct: Optional[bool] = None,
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, List[str]]:
+    """
+    Загрузка нескольких файлов одним запросом.
+
+    Все файлы проверяются и регистрируются в базе одной транзакцией: если хотя бы один
+    не прошёл проверку, не сохраняется ни один. Загрузка в облако ставится в очередь
+    одной задачей.
+
+    - **files**: файлы (не больше `UPLOAD_BATCH_MAX_FILES`).
+    - **direct**: как в `/upload`.
+
+    Возвращает:
+    - **uids**: идентификаторы файлов в порядке их следования в запросе.
+    """
+    with stage("upload", "prepare"):
+        direct, reservation = await _prepare_upload(
+            request, direct, max_files=settings.UPLOAD_BATCH_MAX_FILES
+        )
 
-    FileValidator(
+    validator = FileValidator(
         allowed_types=settings.ALLOWED_FILE_TYPES,
         max_size_mb=settings.MAX_FILE_SIZE_MB,
-    ).validate(file)
+    )
+
+    async with reservation:
+        files_metadata: List[FileMetadata] = await UploadFileService.proceed_files(
+            request,
+            session,
+            validator,
+            direct=direct,
+            max_files=settings.UPLOAD_BATCH_MAX_FILES,
+        )
+
+        # Одна таска Celery на все файлы, записанная в outbox вместе с ними
+        with stage("upload", "enqueue"):
+            reservation.keep(
+                await UploadFileService.track_stored_files(files_metadata)
+            )
+            outbox_dispatcher.notify(
+                [file_metadata.file_uid for file_metadata in files_metadata]
+            )
+
+    return {"uids": [file_metadata.file_uid for file_metadata in files_metadata]}
+
+
+async def _prepare_upload(
+    request: Request, direct: Optional[bool], max_files: int
+) -> Tuple[bool, Reservation]:
+    """
+    Проверяет Content-Length и резервирует место под тело запроса.
+
+    Тело, в которое заведомо не уместятся max_files файлов допустимого
+    размера, отклоняется без чтения.
 
-    file_metadata: FileMetadata = await UploadFileService.proceed_file(
-        file, request, session
+    :return: Отправлять ли файлы в облако во время приёма и резерв места,
+        который освобождается после сохранения файлов.
+    """
+    content_length = request.headers.get("content-length")
+    if not content_length:
+        raise AppExceptions.content_length_missing()
+    if not content_length.isdigit():
+        raise AppExceptions.invalid_file_data()
+    max_body = max_files * (
+        settings.MAX_FILE_SIZE_MB * 1024 * 1024 + MULTIPART_OVERHEAD
     )
+    if int(content_length) > max_body:
+        raise AppExceptions.request_too_large(max_body)
+
+    if direct is None:
+        threshold = settings.DIRECT_UPLOAD_THRESHOLD_MB * 1024 * 1024
+        direct = bool(threshold) and int(content_length) >= threshold
 
-    # Таска для Celery
-    tasks.upload_file_to_cloud.delay(
-        file_path=file_metadata.file_path,
-        destination_name=file_metadata.file_unique_name,
+    # Место под файл освобождается вытеснением уже выгруженных в облако файлов
+    # и резервируется, чтобы параллельные загрузки не заняли его же
+    stores_locally = not direct or settings.DIRECT_UPLOAD_TEE_LOCAL
+    reservation = await local_cache.make_room(
+        int(content_length) if stores_locally else 0
     )
+    if reservation is None:
+        raise AppExceptions.insufficient_storage()
 
-    return {"uid": file_metadata.file_uid}
+    return direct, reservation
+
+
+@router.post("/lookup", status_code=status.HTTP_200_OK)
+async def lookup_files(
+    lookup: FileLookupRequest,
+    session: AsyncSession = Depends(get_session),
+) -> FileLookupResponse:
+    """
+    Получает информацию о нескольких файлах одним запросом.
+
+    - **uids**: список UID (не больше 1000).
+
+    Возвращает:
+    - **files**: детали найденных файлов в порядке запроса.
+    - **missing**: UID, которых нет.
+    """
+    file_records: List[File] = await FileRepository(session).get_cached_by_uids(
+        [str(uid) for uid in lookup.uids]
+    )
+    found = {file_record.uid for file_record in file_records}
+
+    return FileLookupResponse(
+        files=[_to_schema(file_record) for file_record in file_records],
+        missing=[uid for uid in lookup.uids if str(uid) not in found],
+    )
 
 
 @router.get("/{uid}", status_code=status.HTTP_200_OK)
 async def get_file(
     uid: UUID,
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_session),
 ) -> FileResponseSchema:
     """
@@ -72,15 +249,44 @@ async def get_file(
 
     - **uid**: Уникальный идентификатор файла.
 
+    Поддерживает заголовки `If-None-Match` и `If-Modified-Since`.
+
     Возвращает:
     - Детали файла (оригинальное имя, размер, расширение и формат).
+    - 304 без тела, если у клиента актуальная версия.
     """
     # Получаем запись о файле из базы
-    file_record: Optional[File] = await FileRepository(session).get_by_uid(str(uid))
+    file_record: Optional[File] = await FileRepository(session).get_cached_by_uid(
+        str(uid)
+    )
 
     if not file_record:
         raise AppExceptions.file_not_found()
 
+    schema = _to_schema(file_record)
+
+    # Валидатор — хеш самого ответа: он меняется вместе с любым полем схемы
+    digest = hashlib.sha256(schema.model_dump_json().encode()).hexdigest()
+    headers = {
+        "ETag": f'"{digest[:32]}"',
+        "Cache-Control": f"public, max-age={settings.HTTP_METADATA_MAX_AGE_SECONDS}",
+    }
+    if file_record.created_at is not None:
+        headers["Last-Modified"] = http_date(file_record.created_at)
+
+    if is_not_modified(
+        request.headers.get("if-none-match"),
+        request.headers.get("if-modified-since"),
+        headers["ETag"],
+        file_record.created_at,
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return schema
+
+
+def _to_schema(file_record: File) -> FileResponseSchema:
     return FileResponseSchema(
         uid=file_record.uid,
         original_name=file_record.original_name,
@@ -93,25 +299,75 @@ async def get_file(
 @router.get("/download/{uid}", status_code=status.HTTP_200_OK)
 async def download_file(
     uid: str,
+    request: Request,
+    width: Optional[int] = Query(None, description="Ширина варианта изображения"),
+    height: Optional[int] = Query(None, description="Высота варианта изображения"),
+    format: Optional[str] = Query(None, description="Формат варианта изображения"),
+    quality: Optional[int] = Query(None, description="Качество варианта изображения"),
     session: AsyncSession = Depends(get_session),
-) -> StreamingResponse:
+) -> Response:
     """
     Скачивает файл по UID.
 
     - **uid**: Уникальный идентификатор файла.
+    - **width**, **height**, **format**, **quality**: для JPEG и PNG — вариант
+      изображения, вписанный в заданные размеры. Допустимы только значения
+      из `IMAGE_DERIVATIVE_SIZES`, `IMAGE_DERIVATIVE_FORMATS`
+      и `IMAGE_DERIVATIVE_QUALITIES`. Вариант строится при первом запросе.
+
+    Поддерживает заголовки `Range` (в том числе несколько диапазонов), `If-Range`,
+    `If-None-Match` и `If-Modified-Since`.
 
     Возвращает:
-    - Потоковый ответ с содержимым файла.
+    - Потоковый ответ с содержимым файла (200) или его частью (206).
+    - 304 без тела, если у клиента актуальная копия.
+    - При `DOWNLOAD_PRESIGNED_REDIRECT` для файлов в облаке — перенаправление (307)
+      на временную ссылку в хранилище.
     """
 
-    download_service = DownloadFileService(YandexCloudProvider, session)
+    download_service = DownloadFileService(cloud_provider, session)
 
     if not await download_service.get_and_set_file_record(uid):
         raise AppExceptions.file_not_found()
 
+    derivative = parse_spec(
+        download_service.file_record.file_format, width, height, format, quality
+    )
+
+    # Содержимое неизменяемо: проверка валидаторов не трогает ни диск, ни облако
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None or if_modified_since is not None:
+        not_modified = download_service.not_modified(
+            if_none_match, if_modified_since, derivative
+        )
+        if not_modified is not None:
+            return not_modified
+
+    if derivative is not None:
+        if not await download_service.get_derivative_locally(derivative):
+            raise AppExceptions.file_not_found()
+        return await download_service.get_file_stream(
+            range_header=request.headers.get("range"),
+            if_range=request.headers.get("if-range"),
+        )
+
+    if settings.DOWNLOAD_PRESIGNED_REDIRECT:
+        redirect_url = await download_service.get_redirect_url()
+        if redirect_url is not None:
+            # Ссылка временная, поэтому перенаправление не кэшируется
+            return RedirectResponse(
+                redirect_url,
+                status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                headers={"Cache-Control": "no-store"},
+            )
+
     if not await download_service.get_file_locally():
         raise AppExceptions.file_not_found()
 
-    file_stream: StreamingResponse = await download_service.get_file_stream()
+    file_stream: StreamingResponse = await download_service.get_file_stream(
+        range_header=request.headers.get("range"),
+        if_range=request.headers.get("if-range"),
+    )
 
     return file_stream
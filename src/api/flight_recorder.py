@@ -0,0 +1,38 @@
+import sys
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.flight_recorder import flight_recorder
+
+
+class FlightRecorderMiddleware:
+    """
+    Ведёт хронологию каждого запроса и отдаёт её бортовому самописцу.
+
+    Выключенный самописец (FLIGHT_RECORDER_CAPACITY=0) пропускает запросы
+    без изменений.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not flight_recorder.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timeline, token = flight_recorder.start(scope["method"], scope["path"])
+        # Кадр этого вызова — корень стеков запроса для профилировщика
+        profiled = flight_recorder.start_profile(timeline, sys._getframe())
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                timeline.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            timeline.route = route.path if route is not None else None
+            flight_recorder.finish(timeline, token, profiled)
@@ -0,0 +1,25 @@
+import secrets
+from typing import Optional
+
+from fastapi import Header
+
+from src.config import settings
+from src.models import AppExceptions
+
+
+async def require_internal_token(
+    authorization: Optional[str] = Header(None),
+) -> None:
+    """
+    Пропускает запросы к служебным маршрутам (/metrics, /internal/*)
+    только с заголовком `Authorization: Bearer <INTERNAL_API_TOKEN>`.
+
+    Пока токен не задан, служебные маршруты недоступны.
+    """
+    if not settings.INTERNAL_API_TOKEN:
+        raise AppExceptions.internal_api_disabled()
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        token.encode(), settings.INTERNAL_API_TOKEN.encode()
+    ):
+        raise AppExceptions.internal_token_invalid()
@@ -0,0 +1,57 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import PlainTextResponse
+
+from src.api.internal_auth import require_internal_token
+from src.flight_recorder import flight_recorder
+from src.models import AppExceptions
+from src.repositories import metadata_cache
+
+router = APIRouter(dependencies=[Depends(require_internal_token)])
+
+
+@router.get("/metadata-cache", status_code=status.HTTP_200_OK)
+async def get_metadata_cache_stats() -> Dict[str, Any]:
+    """
+    Статистика кэша метаданных файлов этого процесса.
+
+    Возвращает:
+    - Число попаданий (локальных, в Redis и отрицательных), промахов и инвалидаций,
+      а также текущее заполнение кэша.
+    """
+    return metadata_cache.snapshot()
+
+
+@router.get("/flight-recorder", status_code=status.HTTP_200_OK)
+async def get_slow_requests(
+    limit: int = Query(50, ge=1, description="Сколько последних записей вернуть"),
+) -> List[Dict[str, Any]]:
+    """
+    Последние медленные и профилированные запросы этого процесса.
+
+    В буфер попадают запросы не короче `FLIGHT_RECORDER_SLOW_MS`
+    и все профилированные (`FLIGHT_RECORDER_PROFILE_RATE`).
+
+    Возвращает:
+    - Хронологии от новых к старым: этапы, запросы к S3 и базе
+      со смещением от начала запроса, переданные байты.
+    """
+    return flight_recorder.snapshot(limit)
+
+
+@router.get(
+    "/flight-recorder/{request_id}/profile",
+    status_code=status.HTTP_200_OK,
+    response_class=PlainTextResponse,
+)
+async def get_request_profile(request_id: str) -> PlainTextResponse:
+    """
+    Профиль запроса в формате folded для flamegraph.pl или speedscope.
+
+    - **request_id**: `id` из `/internal/flight-recorder`.
+    """
+    profile = flight_recorder.get_profile(request_id)
+    if profile is None:
+        raise AppExceptions.profile_not_found()
+    return PlainTextResponse(profile)
@@ -0,0 +1,57 @@
+import time
+
+from fastapi import APIRouter, Depends, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.api.internal_auth import require_internal_token
+from src.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_PROGRESS, render
+
+router = APIRouter(dependencies=[Depends(require_internal_token)])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Метрики приложения для Prometheus."""
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+
+class MetricsMiddleware:
+    """
+    Считает запросы в обработке и длительность запросов по шаблону маршрута.
+
+    Шаблон (`/files/download/{uid}`), а не путь запроса, держит число
+    временных рядов ограниченным.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            # Маршрут записывается в scope при разборе пути
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                method,
+                route.path if route is not None else "unmatched",
+                str(status_code),
+            ).observe(time.perf_counter() - start)
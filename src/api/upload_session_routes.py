@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict
+
+from fastapi import APIRouter, Depends, Header, Request, Response, status
+
+from src.config import settings
+from src.db_conn import get_session
+from src.models import (
+    AppExceptions,
+    DirectUploadCompleteSchema,
+    DirectUploadSchema,
+    UploadSessionCreateSchema,
+    UploadSessionSchema,
+)
+from src.services import UploadFileService, local_cache
+from src.services.proceed_file import FileValidator
+from src.services.resumable_upload import DirectUploadService, ResumableUploadService
+from src.services.s3 import cloud_provider
+from src.tasks.outbox import outbox_dispatcher
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter()
+
+
+def _validator() -> FileValidator:
+    return FileValidator(
+        allowed_types=settings.ALLOWED_FILE_TYPES,
+        max_size_mb=settings.MAX_FILE_SIZE_MB,
+    )
+
+
+@router.post("", status_code=status.HTTP_201_CREATED, summary="Начало загрузки частями")
+async def create_upload(
+    upload: UploadSessionCreateSchema,
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+) -> UploadSessionSchema:
+    """
+    Начинает возобновляемую загрузку файла.
+
+    - **filename**, **content_type**, **size**: имя, MIME-тип и размер файла в байтах.
+
+    Дальше части файла отправляются запросами `PATCH /files/uploads/{upload_id}`
+    с заголовком `Upload-Offset`. Незавершённая загрузка удаляется,
+    если к ней не обращались `UPLOAD_SESSION_TTL_HOURS` часов.
+
+    Возвращает:
+    - **upload_id**, текущее смещение, размер и срок действия загрузки.
+    """
+    # Проверка, что файл поместится; место под части резервируется при их приёме
+    reservation = await local_cache.make_room(upload.size)
+    if reservation is None:
+        raise AppExceptions.insufficient_storage()
+    await reservation.release()
+
+    created = await ResumableUploadService(session).create(
+        upload.filename, upload.content_type, upload.size, _validator()
+    )
+    response.headers["Location"] = f"/files/uploads/{created.id}"
+    return _to_schema(created)
+
+
+@router.post(
+    "/direct", status_code=status.HTTP_201_CREATED, summary="Начало загрузки в бакет"
+)
+async def create_direct_upload(
+    upload: UploadSessionCreateSchema,
+    session: AsyncSession = Depends(get_session),
+) -> DirectUploadSchema:
+    """
+    Начинает загрузку файла напрямую в облачное хранилище, минуя сервис.
+
+    - **filename**, **content_type**, **size**: имя, MIME-тип и размер файла в байтах.
+
+    Клиент отправляет каждую часть файла (`part_size` байт, последняя — остаток)
+    запросом `PUT` на её ссылку, запоминает `ETag` из ответа и завершает загрузку
+    запросом `POST /files/uploads/direct/{upload_id}/complete`.
+
+    Возвращает:
+    - **upload_id**, размер части, ссылки на части и срок действия загрузки.
+    """
+    created, part_size, part_urls = await DirectUploadService(
+        cloud_provider, session
+    ).create(upload.filename, upload.content_type, upload.size, _validator())
+    return DirectUploadSchema(
+        upload_id=created.id,
+        part_size=part_size,
+        parts=[
+            {"part_number": part_number, "url": url}
+            for part_number, url in enumerate(part_urls, start=1)
+        ],
+        expires_at=created.expires_at,
+    )
+
+
+@router.post(
+    "/direct/{upload_id}/complete",
+    status_code=status.HTTP_201_CREATED,
+    summary="Завершение загрузки в бакет",
+)
+async def complete_direct_upload(
+    upload_id: str,
+    completed: DirectUploadCompleteSchema,
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, str]:
+    """
+    Завершает прямую загрузку и регистрирует файл.
+
+    - **parts**: номера отправленных частей и их `ETag`.
+
+    Возвращает:
+    - **uid**: уникальный идентификатор файла.
+    """
+    file_metadata = await DirectUploadService(cloud_provider, session).complete(
+        upload_id,
+        {part.part_number: part.etag for part in completed.parts},
+        _validator(),
+    )
+    return {"uid": file_metadata.file_uid}
+
+
+@router.delete(
+    "/direct/{upload_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+)
+async def abort_direct_upload(
+    upload_id: str,
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    """Отменяет прямую загрузку и удаляет отправленные части."""
+    await DirectUploadService(cloud_provider, session).abort(upload_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.head("/{upload_id}", status_code=status.HTTP_200_OK)
+async def get_upload_offset(
+    upload_id: str,
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+) -> None:
+    """
+    Текущее смещение загрузки в заголовке `Upload-Offset`
+    и размер файла в `Upload-Length`.
+    """
+    upload = await ResumableUploadService(session).get(upload_id)
+    response.headers["Upload-Offset"] = str(upload.offset)
+    response.headers["Upload-Length"] = str(upload.upload_length)
+    response.headers["Cache-Control"] = "no-store"
+
+
+@router.get("/{upload_id}", status_code=status.HTTP_200_OK)
+async def get_upload(
+    upload_id: str,
+    session: AsyncSession = Depends(get_session),
+) -> UploadSessionSchema:
+    """Состояние загрузки."""
+    return _to_schema(await ResumableUploadService(session).get(upload_id))
+
+
+@router.patch(
+    "/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response
+)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    """
+    Дописывает часть файла.
+
+    - **Upload-Offset**: смещение части, должно совпадать с текущим смещением загрузки
+      (иначе `409` с текущим смещением в заголовке `Upload-Offset`).
+    - Тело: байты части, не больше `UPLOAD_CHUNK_MAX_MB`.
+
+    Возвращает новое смещение в заголовке `Upload-Offset`.
+    """
+    offset = await ResumableUploadService(session).append(
+        upload_id, upload_offset, request
+    )
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)}
+    )
+
+
+@router.post(
+    "/{upload_id}/finalize",
+    status_code=status.HTTP_201_CREATED,
+    summary="Завершение загрузки частями",
+)
+async def finalize_upload(
+    upload_id: str,
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, str]:
+    """
+    Завершает загрузку, когда приняты все байты файла: файл проверяется,
+    регистрируется и отправляется в облачное хранилище как при обычной загрузке.
+
+    Возвращает:
+    - **uid**: уникальный идентификатор файла.
+    """
+    file_metadata = await ResumableUploadService(session).finalize(
+        upload_id, _validator()
+    )
+
+    # Таска для Celery записана в outbox вместе с файлом, её отправит диспетчер
+    await UploadFileService.track_stored_files([file_metadata])
+    outbox_dispatcher.notify([file_metadata.file_uid])
+
+    return {"uid": file_metadata.file_uid}
+
+
+@router.delete(
+    "/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response
+)
+async def cancel_upload(
+    upload_id: str,
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    """Отменяет загрузку и удаляет принятые части."""
+    await ResumableUploadService(session).cancel(upload_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def _to_schema(upload) -> UploadSessionSchema:
+    return UploadSessionSchema(
+        upload_id=upload.id,
+        offset=upload.offset,
+        size=upload.upload_length,
+        expires_at=upload.expires_at,
+    )
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 from sqlalchemy.orm import DeclarativeBase
 from pydantic import ConfigDict
@@ -19,8 +21,65 @@ class Settings(BaseSettings):
         RESULT_BACKEND (str): Backend URL for task results (e.g., Redis).
 
         CHUNK_SIZE (int): Default chunk size for file operations in bytes.
-        READ_CHUNK_SIZE (int): Chunk size for reading files in bytes.
+        READ_CHUNK_SIZE (int): Preferred multipart part size for cloud uploads in bytes.
         WRITE_CHUNK_SIZE (int): Chunk size for writing files in bytes.
+        DEDUPLICATE_UPLOADS (bool): Store identical uploads once, addressed by their SHA-256.
+        DIRECT_UPLOAD_THRESHOLD_MB (int): Uploads of this size and larger go straight to the cloud (0 disables).
+        DIRECT_UPLOAD_TEE_LOCAL (bool): Keep a copy of direct uploads in the local cache.
+        S3_UPLOAD_CONCURRENCY (int): Number of multipart parts uploaded in parallel per file.
+        S3_MAX_POOL_CONNECTIONS (int): Connection pool size of the shared S3 client.
+        UPLOAD_WORKER_MAX_FILES (int): Files uploaded to the cloud at once by one Celery worker process.
+        UPLOAD_WORKER_MAX_MB (int): Total size of files uploaded at once by one Celery worker process.
+        UPLOAD_BATCH_MAX_FILES (int): Maximum number of files in one batch upload request.
+        UPLOAD_CHUNK_MAX_MB (int): Maximum size of one chunk of a resumable upload.
+        UPLOAD_SESSION_TTL_HOURS (int): Resumable uploads idle for this long are removed.
+        UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS (int): Interval of the expired uploads cleanup.
+        MIN_FREE_SPACE_MB (int): Free space to keep on the storage volume in megabytes.
+        STORAGE_CAPACITY_SAMPLE_INTERVAL_SECONDS (float): Interval of the storage volume free space sampling.
+        DOWNLOAD_ZERO_COPY (bool): Serve local files via os.sendfile when the ASGI server supports it.
+        DOWNLOAD_PRESIGNED_REDIRECT (bool): Redirect downloads of files in the bucket to presigned URLs.
+        PRESIGNED_URL_TTL_SECONDS (int): Lifetime of presigned download URLs.
+        HTTP_CACHE_MAX_AGE_SECONDS (int): Cache lifetime of downloaded content (immutable once uploaded).
+        HTTP_METADATA_MAX_AGE_SECONDS (int): Cache lifetime of file metadata responses.
+
+        IMAGE_DERIVATIVE_SIZES (list[int]): Allowed width and height of image variants in pixels.
+        IMAGE_DERIVATIVE_FORMATS (list[str]): Allowed formats of image variants.
+        IMAGE_DERIVATIVE_QUALITIES (list[int]): Allowed JPEG/WebP quality of image variants.
+        IMAGE_DERIVATIVE_DEFAULT_QUALITY (int): Quality of image variants requested without one.
+        IMAGE_DERIVATIVE_WORKERS (int): Processes rendering image variants.
+
+        CACHE_MAX_SIZE_MB (int): Byte budget of the local file cache in megabytes.
+        CACHE_HIGH_WATERMARK (float): Cache fill ratio that triggers background eviction.
+        CACHE_LOW_WATERMARK (float): Cache fill ratio that background eviction brings the cache down to.
+        CACHE_EVICTION_INTERVAL_SECONDS (int): Interval of the background cache maintenance.
+
+        DB_GROUP_COMMIT (bool): Batch File inserts of concurrent uploads into shared transactions.
+        DB_GROUP_COMMIT_MAX_ROWS (int): Rows that trigger an immediate flush of the insert batch.
+        DB_GROUP_COMMIT_MAX_LATENCY_MS (float): Longest time an insert waits for its batch to fill.
+
+        OUTBOX_BATCH_SIZE (int): Pending cloud uploads published to the broker per batch.
+        OUTBOX_POLL_INTERVAL_SECONDS (float): Interval of the outbox scan for undelivered uploads.
+        OUTBOX_RECOVERY_SECONDS (int): Delay before any process republishes an undelivered upload.
+        OUTBOX_LEASE_SECONDS (int): Time a published upload waits for the worker's confirmation before it is republished.
+
+        METADATA_CACHE_MAX_ENTRIES (int): File records kept in the in-process metadata cache (0 disables).
+        METADATA_CACHE_TTL_SECONDS (int): Lifetime of cached file records.
+        METADATA_CACHE_NEGATIVE_TTL_SECONDS (int): Lifetime of cached "file not found" results.
+        METADATA_CACHE_REDIS_URL (str | None): Redis URL of the shared metadata cache tier.
+
+        SERVER_HOST (str): Address the production server (python -m src) listens on.
+        SERVER_PORT (int): Port the production server listens on.
+        SERVER_WORKERS (int): Application worker processes (0 uses one per available CPU).
+        SERVER_MAX_REQUESTS (int): Requests after which a worker is replaced by a new one (0 disables).
+        SERVER_MAX_REQUESTS_JITTER (int): Random extra requests per worker so workers do not restart at once.
+        SERVER_GRACEFUL_TIMEOUT_SECONDS (int): Time given to in-flight requests on shutdown.
+
+        WORKER_METRICS_PORT (int | None): Port of the Prometheus exporter started by Celery workers.
+        FLIGHT_RECORDER_CAPACITY (int): Slow request timelines kept for /internal/flight-recorder (0 disables).
+        FLIGHT_RECORDER_SLOW_MS (float): Requests at least this long are recorded.
+        FLIGHT_RECORDER_PROFILE_RATE (float): Fraction of requests run under the sampling profiler.
+        FLIGHT_RECORDER_PROFILE_INTERVAL_MS (float): Sampling interval of the profiler.
+        INTERNAL_API_TOKEN (str | None): Bearer token required by /metrics and /internal/* (unset disables them).
 
         MAX_FILE_SIZE_MB (int): Maximum file size allowed in megabytes.
         ALLOWED_FILE_TYPES (list[str]): List of allowed MIME types for uploaded files.
@@ -48,7 +107,70 @@ class Settings(BaseSettings):
     CHUNK_SIZE: int = 1024 * 1024
     READ_CHUNK_SIZE: int = 10 * 1024 * 1024  # 10 MB
     WRITE_CHUNK_SIZE: int = 10 * 1024 * 1024  # 10 MB
+    DEDUPLICATE_UPLOADS: bool = True
+    DIRECT_UPLOAD_THRESHOLD_MB: int = 0
+    DIRECT_UPLOAD_TEE_LOCAL: bool = True
+    S3_UPLOAD_CONCURRENCY: int = 4
+    S3_MAX_POOL_CONNECTIONS: int = 128
+    UPLOAD_WORKER_MAX_FILES: int = 32
+    UPLOAD_WORKER_MAX_MB: int = 1024
+    UPLOAD_BATCH_MAX_FILES: int = 100
+    UPLOAD_CHUNK_MAX_MB: int = 16
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS: int = 600
     MIN_FREE_SPACE_MB: int = 10 * 1024  # 10 Gb
+    STORAGE_CAPACITY_SAMPLE_INTERVAL_SECONDS: float = 1
+    DOWNLOAD_ZERO_COPY: bool = True
+    DOWNLOAD_PRESIGNED_REDIRECT: bool = False
+    PRESIGNED_URL_TTL_SECONDS: int = 300
+    HTTP_CACHE_MAX_AGE_SECONDS: int = 365 * 24 * 3600  # 1 year
+    HTTP_METADATA_MAX_AGE_SECONDS: int = 3600
+
+    # Image variants
+    IMAGE_DERIVATIVE_SIZES: list[int] = [64, 128, 256, 512, 1024]
+    IMAGE_DERIVATIVE_FORMATS: list[str] = ["jpeg", "png", "webp"]
+    IMAGE_DERIVATIVE_QUALITIES: list[int] = [60, 75, 90]
+    IMAGE_DERIVATIVE_DEFAULT_QUALITY: int = 75
+    IMAGE_DERIVATIVE_WORKERS: int = 2
+
+    # Local file cache
+    CACHE_MAX_SIZE_MB: int = 50 * 1024  # 50 Gb
+    CACHE_HIGH_WATERMARK: float = 0.9
+    CACHE_LOW_WATERMARK: float = 0.8
+    CACHE_EVICTION_INTERVAL_SECONDS: int = 30
+
+    # Group commit of File inserts
+    DB_GROUP_COMMIT: bool = False
+    DB_GROUP_COMMIT_MAX_ROWS: int = 100
+    DB_GROUP_COMMIT_MAX_LATENCY_MS: float = 5
+
+    # Outbox of cloud upload tasks
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 5
+    OUTBOX_RECOVERY_SECONDS: int = 30
+    OUTBOX_LEASE_SECONDS: int = 900
+
+    # File metadata cache
+    METADATA_CACHE_MAX_ENTRIES: int = 10_000
+    METADATA_CACHE_TTL_SECONDS: int = 300
+    METADATA_CACHE_NEGATIVE_TTL_SECONDS: int = 10
+    METADATA_CACHE_REDIS_URL: Optional[str] = None
+
+    # Server
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_MAX_REQUESTS: int = 0
+    SERVER_MAX_REQUESTS_JITTER: int = 0
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+
+    # Metrics
+    WORKER_METRICS_PORT: Optional[int] = 9808
+    FLIGHT_RECORDER_CAPACITY: int = 100
+    FLIGHT_RECORDER_SLOW_MS: float = 1000
+    FLIGHT_RECORDER_PROFILE_RATE: float = 0.0
+    FLIGHT_RECORDER_PROFILE_INTERVAL_MS: float = 5
+    INTERNAL_API_TOKEN: Optional[str] = None
 
     # File validator
     MAX_FILE_SIZE_MB: int = 100
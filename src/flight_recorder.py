@@ -0,0 +1,332 @@
+"""
+Бортовой самописец медленных запросов.
+
+Для каждого запроса собирается хронология: этапы конвейеров, запросы к S3
+и базе, переданные байты. Хронологии запросов дольше порога хранятся
+в кольцевом буфере на последние N записей. Доля запросов может
+профилироваться семплирующим профилировщиком; результат — стеки в формате
+folded (`flamegraph.pl`, speedscope).
+
+События пишутся в хронологию текущего запроса через contextvar, поэтому
+вне запроса (в воркере Celery, в фоновых задачах) запись ничего не стоит.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.config import settings
+
+# Ограничение событий на запрос: долгие загрузки частями не раздувают буфер
+MAX_EVENTS = 1000
+# Длина текста SQL-запроса в хронологии
+MAX_STATEMENT_LENGTH = 200
+
+
+@dataclass
+class Timeline:
+    """Хронология одного запроса. Смещения событий — от начала запроса."""
+
+    method: str
+    path: str
+    # Дешевле uuid4: хронология создаётся на каждый запрос
+    id: str = field(default_factory=lambda: os.urandom(8).hex())
+    started_at: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    route: Optional[str] = None
+    status: Optional[int] = None
+    duration: Optional[float] = None
+    # (вид, имя, начало, длительность) в секундах
+    events: List[Tuple[str, str, float, float]] = field(default_factory=list)
+    dropped_events: int = 0
+    bytes: Dict[str, int] = field(default_factory=dict)
+    profile: Optional[str] = None
+    finished: bool = False
+
+    def add_event(self, kind: str, name: str, start: float, seconds: float) -> None:
+        if len(self.events) >= MAX_EVENTS:
+            self.dropped_events += 1
+            return
+        self.events.append((kind, name, start - self.started, seconds))
+
+    def to_dict(self) -> Dict[str, Any]:
+        db_seconds = sum(e[3] for e in self.events if e[0] == "db")
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": datetime.fromtimestamp(
+                self.started_at, timezone.utc
+            ).isoformat(),
+            "duration_ms": _ms(self.duration or 0),
+            "bytes": self.bytes,
+            "db_calls": sum(1 for e in self.events if e[0] == "db"),
+            "db_ms": _ms(db_seconds),
+            "s3_calls": sum(1 for e in self.events if e[0] == "s3"),
+            "events": [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "start_ms": _ms(start),
+                    "duration_ms": _ms(seconds),
+                }
+                for kind, name, start, seconds in self.events
+            ],
+            "dropped_events": self.dropped_events,
+            "profiled": self.profile is not None,
+        }
+
+
+_current: ContextVar[Optional[Timeline]] = ContextVar("flight_timeline", default=None)
+
+
+def record(kind: str, name: str, start: float, seconds: float) -> None:
+    """
+    Добавляет событие в хронологию текущего запроса.
+
+    :param kind: stage, s3 или db.
+    :param start: Начало события по time.perf_counter().
+    """
+    timeline = _current.get()
+    if timeline is not None and not timeline.finished:
+        timeline.add_event(kind, name, start, seconds)
+
+
+def record_bytes(direction: str, size: int) -> None:
+    """Учитывает байты, переданные в рамках текущего запроса."""
+    timeline = _current.get()
+    if timeline is not None and not timeline.finished:
+        timeline.bytes[direction] = timeline.bytes.get(direction, 0) + size
+
+
+def watch_engine(engine: Engine) -> None:
+    """Отмечает в хронологии запроса каждый SQL-запрос к базе."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        if _current.get() is not None:
+            conn.info.setdefault("flight_recorder_started", []).append(
+                time.perf_counter()
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+        started = conn.info.get("flight_recorder_started")
+        if started:
+            start = started.pop()
+            record(
+                "db",
+                statement[:MAX_STATEMENT_LENGTH],
+                start,
+                time.perf_counter() - start,
+            )
+
+
+class FlightRecorder:
+    """
+    Кольцевой буфер хронологий медленных и профилированных запросов.
+
+    :param capacity: Сколько последних записей хранить (0 — запись выключена).
+    :param slow_seconds: Запросы не короче этого попадают в буфер.
+    :param profile_rate: Доля запросов, которые профилируются (0..1).
+    :param profile_interval: Период снятия стеков профилировщиком в секундах.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        slow_seconds: float,
+        profile_rate: float,
+        profile_interval: float,
+    ):
+        self.capacity = capacity
+        self.slow_seconds = slow_seconds
+        self.profile_rate = profile_rate
+        self.profiler = SamplingProfiler(profile_interval)
+        self._timelines: Deque[Timeline] = deque(maxlen=capacity or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def start(self, method: str, path: str) -> Tuple[Timeline, Any]:
+        """
+        Начинает хронологию запроса в текущем контексте.
+
+        :return: Хронология и токен для finish().
+        """
+        timeline = Timeline(method=method, path=path)
+        return timeline, _current.set(timeline)
+
+    def start_profile(self, timeline: Timeline, root_frame: FrameType) -> bool:
+        """
+        Решает, профилировать ли запрос, и если да — начинает снимать стеки.
+
+        :param root_frame: Кадр, с которого начинается обработка запроса.
+        """
+        if not self.profile_rate or random.random() >= self.profile_rate:
+            return False
+        self.profiler.add(timeline.id, root_frame, asyncio.current_task())
+        return True
+
+    def finish(self, timeline: Timeline, token: Any, profiled: bool) -> None:
+        timeline.duration = time.perf_counter() - timeline.started
+        timeline.finished = True
+        _current.reset(token)
+        if profiled:
+            timeline.profile = self.profiler.remove(timeline.id)
+        if profiled or timeline.duration >= self.slow_seconds:
+            self._timelines.append(timeline)
+
+    def snapshot(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Записи от новых к старым."""
+        timelines = list(reversed(self._timelines))
+        return [timeline.to_dict() for timeline in timelines[:limit]]
+
+    def get_profile(self, timeline_id: str) -> Optional[str]:
+        for timeline in self._timelines:
+            if timeline.id == timeline_id:
+                return timeline.profile
+        return None
+
+    def clear(self) -> None:
+        self._timelines.clear()
+
+
+@dataclass
+class _Target:
+    root_frame: FrameType
+    task: Optional[asyncio.Task]
+    thread_id: int
+    samples: Counter = field(default_factory=Counter)
+
+
+class SamplingProfiler:
+    """
+    Семплирующий профилировщик запросов для асинхронного кода.
+
+    Отдельный поток раз в interval снимает стек потока цикла событий.
+    Если в нём есть кадр профилируемого запроса, стек относится к запросу
+    (работа на CPU). Если запрос в этот момент ждёт ввода-вывода, записывается
+    цепочка await его задачи с пометкой [await] — так в профиль попадает
+    и время ожидания диска, базы и S3. Поток работает, только пока
+    есть профилируемые запросы.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._targets: Dict[str, _Target] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, key: str, root_frame: FrameType, task: Optional[asyncio.Task]) -> None:
+        with self._lock:
+            self._targets[key] = _Target(root_frame, task, threading.get_ident())
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="flight-recorder-profiler", daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, key: str) -> str:
+        """
+        Заканчивает профилирование.
+
+        :return: Стеки в формате folded: `кадр;кадр;кадр число_семплов`.
+        """
+        with self._lock:
+            target = self._targets.pop(key)
+        return "".join(
+            f"{stack} {count}\n" for stack, count in target.samples.most_common()
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                self._sample(sys._current_frames())
+            time.sleep(self.interval)
+
+    def _sample(self, frames: Dict[int, FrameType]) -> None:
+        for target in self._targets.values():
+            try:
+                stack = _running_stack(frames.get(target.thread_id), target.root_frame)
+                if stack is None:
+                    stack = _awaiting_stack(target.task, target.root_frame)
+            except Exception:
+                # Кадры меняются в потоке цикла, пока их читают: семпл пропускается
+                continue
+            if stack:
+                target.samples[";".join(stack)] += 1
+
+
+def _running_stack(
+    frame: Optional[FrameType], root_frame: FrameType
+) -> Optional[List[str]]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame))
+        if frame is root_frame:
+            return stack[::-1]
+        frame = frame.f_back
+    return None
+
+
+def _awaiting_stack(
+    task: Optional[asyncio.Task], root_frame: FrameType
+) -> Optional[List[str]]:
+    if task is None:
+        return None
+    stack: List[str] = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(
+            awaitable, "ag_frame", None
+        )
+        if frame is None:
+            break
+        if frame is root_frame or stack:
+            stack.append(_frame_name(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(
+            awaitable, "ag_await", None
+        )
+    if not stack:
+        return None
+    stack.append("[await]")
+    return stack
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+flight_recorder = FlightRecorder(
+    capacity=settings.FLIGHT_RECORDER_CAPACITY,
+    slow_seconds=settings.FLIGHT_RECORDER_SLOW_MS / 1000,
+    profile_rate=settings.FLIGHT_RECORDER_PROFILE_RATE,
+    profile_interval=settings.FLIGHT_RECORDER_PROFILE_INTERVAL_MS / 1000,
+)
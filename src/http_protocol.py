@@ -0,0 +1,193 @@
+"""
+Протокол HTTP для uvicorn с отдачей файлов через ``os.sendfile``.
+
+Сам uvicorn не поддерживает ASGI-расширение ``http.response.zerocopysend``,
+поэтому ``LocalFileResponse`` под ним читал бы файл генератором. Этот протокол
+(разбор HTTP на httptools) объявляет расширение в scope каждого запроса
+и передаёт диапазон файла из страничного кэша ядра прямо в сокет клиента.
+
+Цикл запроса uvicorn создаёт внутри ``on_headers_complete``, и точки
+расширения для этого нет. Протокол повторяет этот метод uvicorn с фабрикой
+``cycle_class`` вместо ``RequestResponseCycle``, поэтому он привязан к одной
+минорной версии uvicorn: она закреплена в pyproject.toml, а тест сверяет
+исходный код метода uvicorn с ``UPSTREAM_ON_HEADERS_COMPLETE``. С другой
+версией сервер работает на обычном протоколе (``is_supported()``).
+
+Используется продакшен-сервером (``python -m src``), если установлен httptools.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import urllib.parse
+from typing import BinaryIO
+
+import httptools
+import uvicorn
+from uvicorn.protocols.http.flow_control import service_unavailable
+from uvicorn.protocols.http.httptools_impl import HttpToolsProtocol, RequestResponseCycle
+
+from src.services.file_response import ZERO_COPY_EXTENSION
+
+# Версия uvicorn, с которой сверен повторённый on_headers_complete
+SUPPORTED_UVICORN = "0.32."
+# SHA-256 исходного кода HttpToolsProtocol.on_headers_complete этой версии
+UPSTREAM_ON_HEADERS_COMPLETE = "0b1877df5f7e06822fac44701f0946a04ba33be3103dfb7c8fa1627cec35444f"
+
+
+def is_supported() -> bool:
+    """Совместим ли установленный uvicorn с ZeroCopyHttpToolsProtocol."""
+    return uvicorn.__version__.startswith(SUPPORTED_UVICORN)
+
+
+class ZeroCopyCycle(RequestResponseCycle):
+    """Цикл запроса uvicorn, который понимает ``http.response.zerocopysend``."""
+
+    async def send(self, message) -> None:
+        if message["type"] != ZERO_COPY_EXTENSION:
+            await super().send(message)
+            return
+
+        if not self.response_started or self.response_complete:
+            raise RuntimeError(f"Unexpected ASGI message '{ZERO_COPY_EXTENSION}'")
+        if self.flow.write_paused and not self.disconnected:
+            await self.flow.drain()
+        if self.disconnected:
+            return
+
+        if self.scope["method"] != "HEAD":
+            file = message["file"]
+            offset = message.get("offset") or 0
+            count = message.get("count")
+            if count is None:
+                count = os.fstat(file.fileno()).st_size - offset
+            if self.chunked_encoding:
+                raise RuntimeError("Zero-copy response requires Content-Length")
+            if count > self.expected_content_length:
+                raise RuntimeError("Response content longer than Content-Length")
+
+            try:
+                await sendfile(self.transport, file, offset, count)
+            except ConnectionError:
+                self.disconnected = True
+                self.transport.close()
+                return
+            self.expected_content_length -= count
+
+        # Завершение ответа и keep-alive — обычным путём uvicorn
+        await super().send(
+            {
+                "type": "http.response.body",
+                "body": b"",
+                "more_body": message.get("more_body", False),
+            }
+        )
+
+
+class ZeroCopyHttpToolsProtocol(HttpToolsProtocol):
+    cycle_class = ZeroCopyCycle
+
+    def on_message_begin(self) -> None:
+        super().on_message_begin()
+        self.scope["extensions"] = {ZERO_COPY_EXTENSION: {}}
+
+    def on_headers_complete(self) -> None:
+        # HttpToolsProtocol.on_headers_complete из uvicorn 0.32, отличается
+        # только созданием цикла через cycle_class
+        http_version = self.parser.get_http_version()
+        method = self.parser.get_method()
+        self.scope["method"] = method.decode("ascii")
+        if http_version != "1.1":
+            self.scope["http_version"] = http_version
+        if self.parser.should_upgrade() and self._should_upgrade():
+            return
+        parsed_url = httptools.parse_url(self.url)
+        raw_path = parsed_url.path
+        path = raw_path.decode("ascii")
+        if "%" in path:
+            path = urllib.parse.unquote(path)
+        full_path = self.root_path + path
+        full_raw_path = self.root_path.encode("ascii") + raw_path
+        self.scope["path"] = full_path
+        self.scope["raw_path"] = full_raw_path
+        self.scope["query_string"] = parsed_url.query or b""
+
+        # Ответ 503 при превышении limit_concurrency
+        if self.limit_concurrency is not None and (
+            len(self.connections) >= self.limit_concurrency
+            or len(self.tasks) >= self.limit_concurrency
+        ):
+            app = service_unavailable
+            message = "Exceeded concurrency limit."
+            self.logger.warning(message)
+        else:
+            app = self.app
+
+        existing_cycle = self.cycle
+        self.cycle = self.cycle_class(
+            scope=self.scope,
+            transport=self.transport,
+            flow=self.flow,
+            logger=self.logger,
+            access_logger=self.access_logger,
+            access_log=self.access_log,
+            default_headers=self.server_state.default_headers,
+            message_event=asyncio.Event(),
+            expect_100_continue=self.expect_100_continue,
+            keep_alive=http_version != "1.0",
+            on_response=self.on_response_complete,
+        )
+        if existing_cycle is None or existing_cycle.response_complete:
+            # Обычный случай: запрос обрабатывается сразу
+            task = self.loop.create_task(self.cycle.run_asgi(app))
+            task.add_done_callback(self.tasks.discard)
+            self.tasks.add(task)
+        else:
+            # Конвейерные запросы (pipelining) ждут своей очереди
+            self.flow.pause_reading()
+            self.pipeline.appendleft((self.cycle, app))
+
+
+async def sendfile(
+    transport: asyncio.Transport, file: BinaryIO, offset: int, count: int
+) -> None:
+    """
+    Передаёт count байт файла с позиции offset в сокет транспорта.
+
+    Ожидание готовности сокета к записи идёт через цикл событий по копии
+    дескриптора: дескриптор самого сокета занят транспортом (и в asyncio,
+    и в uvloop).
+
+    :raises ConnectionError: Клиент закрыл соединение.
+    """
+    loop = asyncio.get_running_loop()
+    fd = os.dup(transport.get_extra_info("socket").fileno())
+    try:
+        # Заголовки ответа, оставшиеся в буфере транспорта, уходят первыми
+        while transport.get_write_buffer_size():
+            await _writable(loop, fd)
+            await asyncio.sleep(0)
+
+        while count > 0:
+            try:
+                sent = os.sendfile(fd, file.fileno(), offset, count)
+            except BlockingIOError:
+                await _writable(loop, fd)
+                continue
+            if sent == 0:
+                raise RuntimeError("File is shorter than the response")
+            offset += sent
+            count -= sent
+    finally:
+        os.close(fd)
+
+
+async def _writable(loop: asyncio.AbstractEventLoop, fd: int) -> None:
+    ready = loop.create_future()
+    loop.add_writer(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        # До закрытия копии дескриптора, иначе epoll продолжит за ним следить
+        loop.remove_writer(fd)
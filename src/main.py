@@ -1,17 +1,59 @@
+import asyncio
+
 from fastapi import FastAPI
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.api.file_routes import router as files_router
-from src.db_conn import init_db
+from src.api.flight_recorder import FlightRecorderMiddleware
+from src.api.internal_routes import router as internal_router
+from src.api.metrics import MetricsMiddleware
+from src.api.metrics import router as metrics_router
+from src.api.upload_session_routes import router as upload_session_router
+from src.config import settings
+from src.db_conn import engine, init_db
+from src.flight_recorder import watch_engine
+from src.repositories import insert_batcher, metadata_cache
+from src.services import local_cache
+from src.services.image_derivatives import image_derivatives
+from src.services.resumable_upload import run_sweeper
+from src.services.s3 import cloud_provider
+from src.services.storage_capacity import storage_capacity
+from src.tasks.outbox import outbox_dispatcher
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+
+    await cloud_provider.connect()
+    await storage_capacity.open()
+    await local_cache.open()
+    background_tasks = [
+        asyncio.create_task(
+            storage_capacity.run(settings.STORAGE_CAPACITY_SAMPLE_INTERVAL_SECONDS)
+        ),
+        asyncio.create_task(local_cache.run(settings.CACHE_EVICTION_INTERVAL_SECONDS)),
+        asyncio.create_task(run_sweeper(settings.UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS)),
+        asyncio.create_task(outbox_dispatcher.run(settings.OUTBOX_POLL_INTERVAL_SECONDS)),
+        asyncio.create_task(metadata_cache.run()),
+    ]
+
     yield
 
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await insert_batcher.close()
+    await outbox_dispatcher.close()
+    await image_derivatives.close()
+    await local_cache.close()
+    await storage_capacity.close()
+    await metadata_cache.close()
+    await cloud_provider.close()
+
 
 app: FastAPI = FastAPI(
     lifespan=lifespan,
@@ -19,8 +61,10 @@ app: FastAPI = FastAPI(
     description="""
     API для работы с файлами. Поддерживаемые функции:
     - Загрузка файлов
+    - Возобновляемая загрузка файлов частями
     - Получение информации о файле
     - Скачивание файлов
+    - Варианты изображений (миниатюры)
     """,
     version="1.0.0",
 )
@@ -32,6 +76,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(FlightRecorderMiddleware)
+
+watch_engine(engine.sync_engine)
 
 
+app.include_router(upload_session_router, prefix="/files/uploads", tags=["Uploads"])
 app.include_router(files_router, prefix="/files", tags=["Files"])
+app.include_router(internal_router, prefix="/internal", tags=["Internal"])
+app.include_router(metrics_router)
@@ -0,0 +1,149 @@
+"""
+Метрики Prometheus приложения и воркера Celery.
+
+Если задана переменная окружения PROMETHEUS_MULTIPROC_DIR, метрики всех
+процессов (воркеров uvicorn или дочерних процессов Celery) собираются
+через общий каталог, как того требует prometheus_client.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+from src import flight_recorder
+
+# От миллисекунды до двух минут: от проверки места на диске до загрузки большого файла
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)  # fmt: skip
+
+MB = 1024 * 1024
+THROUGHPUT_BUCKETS = tuple(size * MB for size in (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+STAGE_SECONDS = Histogram(
+    "files_stage_duration_seconds",
+    "Duration of upload, download and cloud upload pipeline stages.",
+    ["pipeline", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "files_http_requests_in_progress",
+    "HTTP requests being processed.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "files_http_request_duration_seconds",
+    "HTTP request duration until the response body is sent.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# received — тела загрузок, sent — ответы на скачивание,
+# s3_upload и s3_download — обмен с бакетом
+TRANSFERRED_BYTES = Counter(
+    "files_transferred_bytes_total",
+    "Bytes of file content transferred.",
+    ["direction"],
+)
+
+TRANSFER_THROUGHPUT = Histogram(
+    "files_transfer_throughput_bytes_per_second",
+    "Throughput of a single file transfer.",
+    ["direction"],
+    buckets=THROUGHPUT_BUCKETS,
+)
+
+LOCAL_CACHE_REQUESTS = Counter(
+    "files_local_cache_requests_total",
+    "Downloads served from the local cache (hit) or filled from the bucket (miss).",
+    ["result"],
+)
+
+S3_REQUEST_SECONDS = Histogram(
+    "files_s3_request_duration_seconds",
+    "Duration of S3 API requests, including each multipart part.",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+TASK_QUEUE_WAIT_SECONDS = Histogram(
+    "files_task_queue_wait_seconds",
+    "Time between publishing a Celery task and a worker starting it.",
+    ["task"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def stage(pipeline: str, name: str) -> Iterator[None]:
+    """Замеряет этап конвейера и отмечает его в хронологии запроса."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(pipeline, name).observe(seconds)
+        flight_recorder.record("stage", f"{pipeline}.{name}", start, seconds)
+
+
+@contextmanager
+def s3_request(operation: str) -> Iterator[None]:
+    """Замеряет запрос к S3 и отмечает его в хронологии запроса."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        S3_REQUEST_SECONDS.labels(operation).observe(seconds)
+        flight_recorder.record("s3", operation, start, seconds)
+
+
+def observe_transfer(direction: str, size: int, seconds: Optional[float] = None) -> None:
+    """
+    Учитывает переданные байты и, если известна длительность, скорость передачи.
+
+    :param direction: received, sent, s3_upload или s3_download.
+    """
+    TRANSFERRED_BYTES.labels(direction).inc(size)
+    flight_recorder.record_bytes(direction, size)
+    if seconds:
+        TRANSFER_THROUGHPUT.labels(direction).observe(size / seconds)
+
+
+def _registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    Метрики в текстовом формате Prometheus.
+
+    :return: Тело ответа и его Content-Type.
+    """
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int) -> None:
+    """Отдаёт метрики процесса по HTTP в отдельном потоке (для воркера Celery)."""
+    start_http_server(port, registry=_registry())
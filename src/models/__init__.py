@@ -1,4 +1,35 @@
 from .exceptions import AppExceptions
-from .file import File, FileResponseSchema
+from .file import (
+    Blob,
+    File,
+    FileLookupRequest,
+    FileLookupResponse,
+    FileResponseSchema,
+    LOCAL_STATES,
+    StorageState,
+)
+from .outbox import PendingUpload
+from .upload_session import (
+    DirectUploadCompleteSchema,
+    DirectUploadSchema,
+    UploadSession,
+    UploadSessionCreateSchema,
+    UploadSessionSchema,
+)
 
-__all__ = ["File", "AppExceptions", "FileResponseSchema"]
+__all__ = [
+    "Blob",
+    "File",
+    "AppExceptions",
+    "DirectUploadCompleteSchema",
+    "DirectUploadSchema",
+    "FileLookupRequest",
+    "FileLookupResponse",
+    "FileResponseSchema",
+    "LOCAL_STATES",
+    "PendingUpload",
+    "StorageState",
+    "UploadSession",
+    "UploadSessionCreateSchema",
+    "UploadSessionSchema",
+]
@@ -29,3 +29,86 @@ class AppExceptions:
         return HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+
+    @staticmethod
+    def insufficient_storage() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+            detail="Not enough storage space",
+        )
+
+    @staticmethod
+    def range_not_satisfiable(file_size: int) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"},
+        )
+
+    @staticmethod
+    def upload_not_found() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found"
+        )
+
+    @staticmethod
+    def upload_offset_conflict(offset: int) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload offset does not match",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+    @staticmethod
+    def upload_chunk_too_large(max_size: int) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Chunk exceeds the limit of {max_size} bytes",
+        )
+
+    @staticmethod
+    def upload_parts_mismatch() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Uploaded parts do not match the upload",
+        )
+
+    @staticmethod
+    def derivative_not_allowed(detail: str) -> HTTPException:
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+    @staticmethod
+    def derivatives_unavailable() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Image variants are not available",
+        )
+
+    @staticmethod
+    def request_too_large(max_size: int) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request body exceeds the limit of {max_size} bytes",
+            headers={"Connection": "close"},
+        )
+
+    @staticmethod
+    def profile_not_found() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+
+    @staticmethod
+    def internal_api_disabled() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Internal API is disabled: INTERNAL_API_TOKEN is not set",
+        )
+
+    @staticmethod
+    def internal_token_invalid() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid internal API token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from typing import Optional
+from datetime import datetime, timezone
+from enum import Enum
+from typing import List, Optional
 
-from sqlalchemy import Integer, String
+from sqlalchemy import BigInteger, DateTime, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column
 from src.db_conn import Base
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 
 
@@ -18,12 +20,74 @@ class FileResponseSchema(BaseModel):
     file_format: str
 
 
+# Ограничение размера пакетного запроса метаданных
+MAX_LOOKUP_UIDS = 1000
+
+
+class FileLookupRequest(BaseModel):
+    uids: List[UUID] = Field(max_length=MAX_LOOKUP_UIDS)
+
+
+class FileLookupResponse(BaseModel):
+    files: List[FileResponseSchema]
+    missing: List[UUID]
+
+
+class StorageState(str, Enum):
+    """Где находится содержимое файла."""
+
+    # Запись создана, содержимое ещё не сохранено
+    RECEIVED = "received"
+    # Только в локальном хранилище, ждёт загрузки в облако
+    LOCAL_ONLY = "local_only"
+    # Воркер загружает файл в облако
+    UPLOADING = "uploading"
+    # В облаке, локальная копия может быть в кэше
+    IN_CLOUD = "in_cloud"
+    # Только в облаке: локальная копия вытеснена
+    EVICTED_LOCALLY = "evicted_locally"
+    DELETED = "deleted"
+
+
+# Состояния, в которых содержимого ещё нет в облаке
+LOCAL_STATES = (StorageState.RECEIVED, StorageState.LOCAL_ONLY, StorageState.UPLOADING)
+
+
 class File(Base):
     __tablename__ = "files"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     uid: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
     original_name: Mapped[str] = mapped_column(String, nullable=False)
-    file_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    file_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
     file_format: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     file_extension: Mapped[str] = mapped_column(String, nullable=False)
+    digest: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    storage_key: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+    # Значение StorageState; у записей, созданных до его появления, — NULL
+    storage_state: Mapped[Optional[str]] = mapped_column(
+        String(16), nullable=True, index=True
+    )
+    # Время загрузки; у записей, созданных до его появления, — NULL
+    created_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+    @property
+    def object_key(self) -> str:
+        """Имя файла в хранилище и ключ в бакете."""
+        # Файлы, загруженные до дедупликации, хранятся под своим UID
+        return self.storage_key or f"{self.uid}{self.file_extension}"
+
+
+class Blob(Base):
+    """Содержимое, общее для всех файлов с одинаковым SHA-256."""
+
+    __tablename__ = "blobs"
+
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    storage_key: Mapped[str] = mapped_column(String, nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
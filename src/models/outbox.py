@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+from src.db_conn import Base
+
+
+class PendingUpload(Base):
+    """
+    Задача загрузки содержимого в облако, ещё не подтверждённая воркером.
+
+    Записывается в одной транзакции с записью о файле и удаляется
+    воркером Celery после загрузки содержимого в облако.
+    """
+
+    __tablename__ = "upload_outbox"
+
+    file_uid: Mapped[str] = mapped_column(String, primary_key=True)
+    storage_key: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    # Файлы одного пакетного запроса отправляются одной задачей
+    batch_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # До этого времени запись отправляет только принявший файл процесс;
+    # после — любой диспетчер (процесс упал или брокер был недоступен).
+    # Опубликованная запись ждёт подтверждения воркера до available_at,
+    # а затем публикуется снова
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    # Сколько раз задача публиковалась (и пыталась публиковаться)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
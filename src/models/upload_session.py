@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+from sqlalchemy import BigInteger, DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+from src.db_conn import Base
+
+
+class UploadSessionCreateSchema(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: str
+    size: int = Field(gt=0)
+
+
+class UploadSessionSchema(BaseModel):
+    upload_id: str
+    offset: int
+    size: int
+    expires_at: datetime
+
+
+class DirectUploadPartSchema(BaseModel):
+    part_number: int
+    url: str
+
+
+class DirectUploadSchema(BaseModel):
+    upload_id: str
+    part_size: int
+    parts: List[DirectUploadPartSchema]
+    expires_at: datetime
+
+
+class DirectUploadCompletedPartSchema(BaseModel):
+    part_number: int = Field(ge=1)
+    etag: str = Field(min_length=1)
+
+
+class DirectUploadCompleteSchema(BaseModel):
+    parts: List[DirectUploadCompletedPartSchema] = Field(min_length=1)
+
+
+class UploadSession(Base):
+    """
+    Незавершённая загрузка.
+
+    Возобновляемая загрузка принимается частями по смещению через сервис.
+    Прямая (multipart_upload_id задан) идёт частями в бакет по временным
+    ссылкам, сервис только регистрирует готовый объект.
+    """
+
+    __tablename__ = "upload_sessions"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    filename: Mapped[str] = mapped_column(String, nullable=False)
+    content_type: Mapped[str] = mapped_column(String, nullable=False)
+    upload_length: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # Сколько байт от начала файла уже принято
+    offset: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    # Прямая загрузка в бакет: ключ объекта и Upload ID multipart-загрузки
+    storage_key: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    multipart_upload_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
@@ -1,3 +1,17 @@
-from .file_repository import FileRepository
+from .file_repository import DeletedFile, FileRepository, NewFile
+from .insert_batcher import InsertBatcher, insert_batcher
+from .metadata_cache import MetadataCache, metadata_cache
+from .outbox_repository import OutboxRepository
+from .upload_session_repository import UploadSessionRepository
 
-__all__ = ["FileRepository"]
+__all__ = [
+    "DeletedFile",
+    "FileRepository",
+    "InsertBatcher",
+    "MetadataCache",
+    "NewFile",
+    "OutboxRepository",
+    "UploadSessionRepository",
+    "insert_batcher",
+    "metadata_cache",
+]
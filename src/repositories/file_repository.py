@@ -1,10 +1,43 @@
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.models import File
+from src.config import settings
+from src.models import Blob, File, StorageState
+from src.repositories.metadata_cache import metadata_cache
+from src.repositories.outbox_repository import OutboxRepository
+
+
+@dataclass
+class NewFile:
+    """Данные для создания записи о файле."""
+
+    uid: str
+    original_name: str
+    file_size: int
+    file_extension: str
+    file_format: Optional[str] = None
+    # SHA-256 содержимого и ключ, под которым сохранена эта его копия
+    digest: Optional[str] = None
+    storage_key: Optional[str] = None
+    storage_state: Optional[StorageState] = StorageState.RECEIVED
+    # Общий для файлов одного пакетного запроса: они загружаются в облако одной задачей
+    upload_batch: Optional[str] = None
+
+
+@dataclass
+class DeletedFile:
+    """Результат удаления записи о файле."""
+
+    uid: str
+    # Ключ содержимого, на которое больше нет ссылок: его копии в хранилище
+    # и в облаке можно удалять. None, если содержимое используют другие файлы
+    released_key: Optional[str] = None
 
 
 class FileRepository:
@@ -19,26 +52,88 @@ class FileRepository:
         file_uid: str,
         file_format: Optional[str] = None,
     ) -> str:
+        await self.create_many(
+            [
+                NewFile(
+                    uid=file_uid,
+                    original_name=original_name,
+                    file_size=file_size,
+                    file_extension=file_extension,
+                    file_format=file_format,
+                )
+            ]
+        )
+        return file_uid
+
+    async def create_many(self, files: List[NewFile]) -> List[Tuple[str, bool]]:
+        """
+        Создаёт записи о файлах одной транзакцией.
+
+        В той же транзакции в outbox записываются задачи загрузки в облако
+        для нового содержимого, которое есть только локально.
+
+        :return: Для каждого файла — ключ содержимого в хранилище и признак того,
+            что содержимое новое (для файлов без digest — всегда True).
+        """
         try:
-            new_file = File(
-                uid=file_uid,
-                original_name=original_name,
-                file_size=file_size,
-                file_extension=file_extension,
-                file_format=file_format,
-            )
-            self._session.add(new_file)
+            results = []
+            for file in files:
+                if file.digest is None:
+                    results.append((f"{file.uid}{file.file_extension}", True))
+                    continue
+                storage_key, ref_count = await self._acquire_blob(
+                    file.digest, file.storage_key, file.file_size
+                )
+                results.append((storage_key, ref_count == 1))
+
+            # Состояние содержимого, которое уже хранится, берётся у других его файлов
+            states = {}
+            changed_uids = [file.uid for file in files]
+            records = []
+            for file, (storage_key, created) in zip(files, results):
+                state = file.storage_state
+                if not created:
+                    if storage_key not in states:
+                        states[storage_key] = await self.get_state_by_key(storage_key)
+                    state, reused_uids = await self._reuse_state(
+                        file, storage_key, states[storage_key]
+                    )
+                    changed_uids.extend(reused_uids)
+                states[storage_key] = state
+                records.append(
+                    File(
+                        uid=file.uid,
+                        original_name=file.original_name,
+                        file_size=file.file_size,
+                        file_extension=file.file_extension,
+                        file_format=file.file_format,
+                        digest=file.digest,
+                        storage_key=storage_key,
+                        storage_state=state.value if state is not None else None,
+                    )
+                )
+            self._session.add_all(records)
+
+            outbox = OutboxRepository(self._session)
+            available_at = datetime.now(timezone.utc) + timedelta(
+                seconds=settings.OUTBOX_RECOVERY_SECONDS
+            )
+            for file, (storage_key, created) in zip(files, results):
+                if created and file.storage_state == StorageState.LOCAL_ONLY:
+                    outbox.add(file.uid, storage_key, available_at, file.upload_batch)
             await self._session.commit()
-            return file_uid
 
         except SQLAlchemyError as e:
             await self._session.rollback()
             raise RuntimeError(f"Error occurred while record adding: {e}")
 
+        await metadata_cache.invalidate_many(changed_uids)
+        return results
+
     async def get_by_uid(self, file_uid: str) -> Optional[File]:
         try:
             result = await self._session.execute(
-                select(File).where(File.uid == file_uid)
+                select(File).where(File.uid == file_uid, _not_deleted())
             )
             return result.scalar_one_or_none()
 
@@ -47,17 +142,184 @@ class FileRepository:
                 f"Error occurred while retrieving file with UID {file_uid}: {e}"
             )
 
-    async def delete_by_uid(self, file_uid: str) -> bool:
+    async def get_cached_by_uid(self, file_uid: str) -> Optional[File]:
+        """То же, что get_by_uid, но через кэш метаданных. Объект не привязан к сессии."""
+        return await metadata_cache.get_or_load(
+            file_uid, lambda: self.get_by_uid(file_uid)
+        )
+
+    async def get_by_uids(self, file_uids: List[str]) -> List[File]:
+        """Записи о файлах с данными UID одним запросом. Ненайденные пропускаются."""
+        if not file_uids:
+            return []
+        try:
+            result = await self._session.execute(
+                select(File).where(File.uid.in_(file_uids), _not_deleted())
+            )
+            return list(result.scalars())
+
+        except SQLAlchemyError as e:
+            raise RuntimeError(f"Error occurred while retrieving files: {e}")
+
+    async def get_cached_by_uids(self, file_uids: List[str]) -> List[File]:
+        """То же, что get_by_uids, но через кэш метаданных."""
+        return await metadata_cache.get_many_or_load(file_uids, self.get_by_uids)
+
+    async def delete_by_uid(self, file_uid: str) -> Optional[DeletedFile]:
+        """
+        Помечает файл удалённым и освобождает ссылку на его содержимое.
+
+        Если ссылка была последней, в той же транзакции удаляются задачи
+        загрузки содержимого в облако. Сами копии содержимого удаляет
+        вызывающий (DeleteFileService) после фиксации по released_key.
+
+        :return: None, если файл не найден.
+        """
         try:
             file = await self.get_by_uid(file_uid)
             if file:
-                await self._session.delete(file)
+                if file.digest is not None:
+                    released_key = await self._release_blob(file.digest)
+                else:
+                    # Содержимое без digest принадлежит только этому файлу
+                    released_key = file.object_key
+                if released_key is not None:
+                    await OutboxRepository(self._session).delete_by_key(released_key)
+                file.storage_state = StorageState.DELETED.value
                 await self._session.commit()
-                return True
-            return False
+                await metadata_cache.invalidate(file_uid)
+                return DeletedFile(uid=file_uid, released_key=released_key)
+            return None
 
         except SQLAlchemyError as e:
             await self._session.rollback()
             raise RuntimeError(
                 f"Error occurred while deleting file with UID {file_uid}: {e}"
             )
+
+    async def get_state_by_key(self, storage_key: str) -> Optional[StorageState]:
+        """Состояние содержимого с данным ключом или None, если оно неизвестно."""
+        try:
+            result = await self._session.execute(
+                select(File.storage_state)
+                .where(File.storage_key == storage_key, _not_deleted())
+                .limit(1)
+            )
+            state = result.scalar_one_or_none()
+            return StorageState(state) if state is not None else None
+
+        except SQLAlchemyError as e:
+            raise RuntimeError(
+                f"Error occurred while retrieving state of {storage_key}: {e}"
+            )
+
+    async def set_state_by_key(
+        self,
+        storage_key: str,
+        state: StorageState,
+        only_from: Optional[Iterable[StorageState]] = None,
+    ) -> List[str]:
+        """
+        Меняет состояние всех файлов с данным содержимым.
+
+        :param only_from: Менять только файлы в одном из этих состояний.
+        :return: UID изменённых файлов.
+        """
+        condition = (
+            File.storage_state.in_([s.value for s in only_from])
+            if only_from is not None
+            else _not_deleted()
+        )
+        try:
+            result = await self._session.execute(
+                update(File)
+                .where(File.storage_key == storage_key, condition)
+                .values(storage_state=state.value)
+                .returning(File.uid)
+                .execution_options(synchronize_session=False)
+            )
+            file_uids = list(result.scalars())
+            await self._session.commit()
+
+        except SQLAlchemyError as e:
+            await self._session.rollback()
+            raise RuntimeError(
+                f"Error occurred while updating state of {storage_key}: {e}"
+            )
+
+        await metadata_cache.invalidate_many(file_uids)
+        return file_uids
+
+    async def _reuse_state(
+        self,
+        file: NewFile,
+        storage_key: str,
+        state: Optional[StorageState],
+    ) -> Tuple[Optional[StorageState], List[str]]:
+        # Повторная загрузка с локальной копией возвращает вытесненное
+        # содержимое в локальный кэш (копию переносит UploadFileService).
+        # Возвращаются также UID файлов, состояние которых изменилось
+        returns_local_copy = file.storage_state == StorageState.LOCAL_ONLY
+        if state == StorageState.EVICTED_LOCALLY and returns_local_copy:
+            result = await self._session.execute(
+                update(File)
+                .where(
+                    File.storage_key == storage_key,
+                    File.storage_state == StorageState.EVICTED_LOCALLY.value,
+                )
+                .values(storage_state=StorageState.IN_CLOUD.value)
+                .returning(File.uid)
+                .execution_options(synchronize_session=False)
+            )
+            return StorageState.IN_CLOUD, list(result.scalars())
+        return state, []
+
+    async def _acquire_blob(
+        self, digest: str, storage_key: str, size: int
+    ) -> Tuple[str, int]:
+        # Вставка и увеличение счётчика одним запросом: одновременные загрузки
+        # одного содержимого упорядочиваются по первичному ключу
+        dialect = self._session.bind.dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = (
+            insert(Blob)
+            .values(digest=digest, storage_key=storage_key, size=size, ref_count=1)
+            .on_conflict_do_update(
+                index_elements=[Blob.digest],
+                set_={"ref_count": Blob.ref_count + 1},
+            )
+            .returning(Blob.storage_key, Blob.ref_count)
+        )
+        blob_key, ref_count = (await self._session.execute(stmt)).one()
+        return blob_key, ref_count
+
+    async def _release_blob(self, digest: str) -> Optional[str]:
+        """
+        Уменьшает счётчик ссылок на содержимое.
+
+        :return: Ключ содержимого, если ссылка была последней, иначе None.
+        """
+        result = await self._session.execute(
+            update(Blob)
+            .where(Blob.digest == digest)
+            .values(ref_count=Blob.ref_count - 1)
+            .returning(Blob.storage_key, Blob.ref_count)
+        )
+        row = result.one_or_none()
+        if row is None or row.ref_count > 0:
+            return None
+        # Содержимое больше никем не используется. Загрузка того же содержимого,
+        # ждавшая блокировки строки, создаст Blob заново под ключом своей копии
+        # (UploadFileService._candidate_key), поэтому удаление копий по этому
+        # ключу её не затронет
+        await self._session.execute(
+            delete(Blob).where(Blob.digest == digest, Blob.ref_count == 0)
+        )
+        return row.storage_key
+
+
+def _not_deleted():
+    return or_(
+        File.storage_state.is_(None),
+        File.storage_state != StorageState.DELETED.value,
+    )
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.db_conn import async_session_maker
+from src.repositories.file_repository import FileRepository, NewFile
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    def __init__(self, files: List[NewFile]):
+        self.files = files
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class InsertBatcher:
+    """
+    Групповая фиксация вставок записей о файлах.
+
+    Записи от одновременных запросов копятся до max_rows строк или
+    max_latency секунд с момента первой и вставляются одной транзакцией
+    (ORM отправляет их одним многострочным INSERT). Каждый запрос ждёт
+    результата своей части пакета. Если пакет не вставился, запросы
+    повторяются по одному, чтобы ошибка досталась только виновнику.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_rows: int,
+        max_latency: float,
+    ):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_latency = max_latency
+
+        self._queue: List[_Pending] = []
+        self._rows = 0
+        self._arrived: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Lock] = None
+
+    async def submit(self, files: List[NewFile]) -> List[Tuple[str, bool]]:
+        """
+        Ставит записи в очередь и ждёт их фиксации.
+
+        :return: То же, что FileRepository.create_many.
+        :raises RuntimeError: Если записи не удалось вставить.
+        """
+        self._ensure_started()
+        pending = _Pending(files)
+        self._queue.append(pending)
+        self._rows += len(files)
+        self._arrived.set()
+        if self._rows >= self.max_rows:
+            self._full.set()
+        return await pending.future
+
+    async def close(self) -> None:
+        """Дожидается фиксации поставленных записей и останавливает фоновую задачу."""
+        if self._task is None:
+            return
+        while self._queue and not self._task.done():
+            await asyncio.sleep(self.max_latency)
+        # Под блокировкой задача не держит взятый из очереди пакет
+        async with self._flushing:
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._arrived = asyncio.Event()
+            self._full = asyncio.Event()
+            self._flushing = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self._arrived.wait()
+            # Первая запись пакета ждёт не дольше max_latency
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.max_latency)
+            except asyncio.TimeoutError:
+                pass
+            async with self._flushing:
+                await self._flush(self._take())
+
+    def _take(self) -> List[_Pending]:
+        batch, rows = [], 0
+        while self._queue:
+            if batch and rows + len(self._queue[0].files) > self.max_rows:
+                break
+            pending = self._queue.pop(0)
+            batch.append(pending)
+            rows += len(pending.files)
+        self._rows -= rows
+
+        if not self._queue:
+            self._arrived.clear()
+        if self._rows < self.max_rows:
+            self._full.clear()
+        return batch
+
+    async def _flush(self, batch: List[_Pending]) -> None:
+        if not batch:
+            return
+        try:
+            results = await self._insert([file for p in batch for file in p.files])
+        except Exception as e:
+            if len(batch) == 1:
+                _resolve(batch[0], error=e)
+                return
+            logger.warning(
+                f"Batch insert of {len(batch)} requests failed, retrying one by one: {e}"
+            )
+            for pending in batch:
+                try:
+                    _resolve(pending, await self._insert(pending.files))
+                except Exception as e:
+                    _resolve(pending, error=e)
+            return
+
+        offset = 0
+        for pending in batch:
+            _resolve(pending, results[offset : offset + len(pending.files)])
+            offset += len(pending.files)
+
+    async def _insert(self, files: List[NewFile]) -> List[Tuple[str, bool]]:
+        async with self.session_factory() as session:
+            return await FileRepository(session).create_many(files)
+
+
+def _resolve(
+    pending: _Pending, result=None, error: Optional[BaseException] = None
+) -> None:
+    # Запрос мог быть отменён, пока ждал пакета
+    if pending.future.done():
+        return
+    if error is not None:
+        pending.future.set_exception(error)
+    else:
+        pending.future.set_result(result)
+
+
+insert_batcher = InsertBatcher(
+    session_factory=async_session_maker,
+    max_rows=settings.DB_GROUP_COMMIT_MAX_ROWS,
+    max_latency=settings.DB_GROUP_COMMIT_MAX_LATENCY_MS / 1000,
+)
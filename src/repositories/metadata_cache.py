@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from src.config import settings
+from src.models import File
+
+logger = logging.getLogger(__name__)
+
+# Отметка «такого файла нет» в общем кэше
+_MISSING = "null"
+
+# Канал Redis, по которому процессы сообщают друг другу об изменённых записях
+INVALIDATION_CHANNEL = "files:meta:invalidate"
+
+# Сколько хранится счётчик сбросов записи в Redis. Загрузка из базы должна
+# укладываться в этот срок, иначе её результат может перезаписать сброс.
+_GENERATION_TTL = 24 * 60 * 60
+
+# Записывает значения, только если счётчик сбросов не изменился с момента
+# чтения. KEYS: пары (запись, счётчик); ARGV: тройки (счётчик, TTL, значение).
+_SET_IF_NOT_INVALIDATED = """
+for i = 1, #KEYS, 2 do
+    local j = (i - 1) / 2 * 3
+    if (redis.call('get', KEYS[i + 1]) or '') == ARGV[j + 1] then
+        redis.call('set', KEYS[i], ARGV[j + 3], 'EX', ARGV[j + 2])
+    end
+end
+"""
+
+
+@dataclass
+class MetadataCacheStats:
+    local_hits: int = 0
+    shared_hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+
+class MetadataCache:
+    """
+    Кэш метаданных файлов перед базой данных.
+
+    Первый уровень — ограниченный LRU в памяти процесса с TTL, второй
+    (необязательный) — Redis, общий для всех процессов. Отсутствующие UID
+    тоже кэшируются, но на меньший срок.
+
+    Запись меняется после загрузки: storage_state проходит загрузку в облако,
+    вытеснение и удаление. Каждое такое изменение после фиксации сбрасывает
+    запись через invalidate_many(): в Redis и в памяти своего процесса,
+    а через канал Redis — и в памяти остальных процессов (их слушает run()).
+    Без Redis записи в других процессах (воркеры сервера, Celery) устаревают
+    на срок до TTL; DownloadFileService перечитывает запись из базы, если
+    устаревшее состояние указывает на отсутствующую локальную копию.
+
+    Загрузка из базы могла прочитать запись до изменения, которое сброшено
+    во время загрузки. Такой результат возвращается вызывающему, но в кэш
+    не попадает: в памяти процесса сброс отменяет ожидающую загрузку,
+    а в Redis запись сохраняется, только если счётчик сбросов UID не менялся
+    с момента промаха.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        negative_ttl: float,
+        redis_url: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.redis_url = redis_url
+        self.stats = MetadataCacheStats()
+
+        # uid -> (момент устаревания, колонки записи или None для отсутствующих)
+        self._entries: OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]] = (
+            OrderedDict()
+        )
+        # uid -> метка незавершённой загрузки; сброс записи удаляет метку
+        self._pending: Dict[str, object] = {}
+        self._redis = None
+
+    async def get_or_load(
+        self, file_uid: str, load: Callable[[], Awaitable[Optional[File]]]
+    ) -> Optional[File]:
+        """
+        Возвращает запись о файле из кэша или загружает её через load.
+
+        Возвращается отдельный объект, не привязанный к сессии.
+        """
+        if self.max_entries <= 0:
+            return await load()
+
+        now = time.monotonic()
+        entry = self._entries.get(file_uid)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(file_uid)
+            return self._hit(entry[1], shared=False)
+
+        found, data, generation = await self._get_shared(file_uid)
+        if found:
+            self._put_local(file_uid, data)
+            return self._hit(data, shared=True)
+
+        self.stats.misses += 1
+        tokens = self._start_loads([file_uid])
+        try:
+            file = await load()
+        finally:
+            valid = self._finish_loads(tokens)
+        if not valid:
+            return file
+        data = _to_dict(file) if file is not None else None
+        self._put_local(file_uid, data)
+        await self._set_shared_many({file_uid: data}, {file_uid: generation})
+        return file
+
+    async def get_many_or_load(
+        self,
+        file_uids: List[str],
+        load_many: Callable[[List[str]], Awaitable[List[File]]],
+    ) -> List[File]:
+        """
+        Пакетный вариант get_or_load: промахи загружаются одним вызовом load_many.
+
+        :return: Найденные записи в порядке file_uids, без повторов.
+        """
+        file_uids = list(dict.fromkeys(file_uids))
+        if self.max_entries <= 0:
+            return await load_many(file_uids)
+
+        now = time.monotonic()
+        found: Dict[str, Optional[File]] = {}
+        missed = []
+        for file_uid in file_uids:
+            entry = self._entries.get(file_uid)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(file_uid)
+                found[file_uid] = self._hit(entry[1], shared=False)
+            else:
+                missed.append(file_uid)
+
+        values, generations = await self._get_shared_many(missed)
+        for file_uid, data in zip(missed, values):
+            if data is not None:
+                self._put_local(file_uid, data[0])
+                found[file_uid] = self._hit(data[0], shared=True)
+        missed = [file_uid for file_uid in missed if file_uid not in found]
+
+        if missed:
+            self.stats.misses += len(missed)
+            tokens = self._start_loads(missed)
+            try:
+                loaded = {file.uid: file for file in await load_many(missed)}
+            finally:
+                valid = self._finish_loads(tokens)
+            entries = {}
+            for file_uid in missed:
+                file = loaded.get(file_uid)
+                found[file_uid] = file
+                if file_uid in valid:
+                    entries[file_uid] = _to_dict(file) if file is not None else None
+                    self._put_local(file_uid, entries[file_uid])
+            await self._set_shared_many(entries, generations)
+
+        return [found[uid] for uid in file_uids if found[uid] is not None]
+
+    async def invalidate(self, file_uid: str) -> None:
+        await self.invalidate_many([file_uid])
+
+    async def invalidate_many(self, file_uids: Iterable[str]) -> None:
+        """Сбрасывает записи во всех уровнях и в памяти других процессов."""
+        file_uids = list(file_uids)
+        if not file_uids:
+            return
+        self.stats.invalidations += len(file_uids)
+        self._drop_local(file_uids)
+        redis = self._get_redis()
+        if redis is None:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.delete(*(self._key(file_uid) for file_uid in file_uids))
+                for file_uid in file_uids:
+                    pipe.incr(self._generation_key(file_uid))
+                    pipe.expire(self._generation_key(file_uid), _GENERATION_TTL)
+                pipe.publish(INVALIDATION_CHANNEL, json.dumps(file_uids))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to invalidate metadata in Redis: {e}")
+
+    async def run(self, retry_interval: float = 5.0) -> None:
+        """
+        Фоновая задача: сброс записей в памяти процесса по сообщениям
+        других процессов. Без Redis сразу завершается.
+        """
+        if self.redis_url is None:
+            return
+        while True:
+            try:
+                async with self._get_redis().pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # Пока подписки не было, сообщения могли потеряться
+                    self._entries.clear()
+                    self._pending.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._drop_local(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Metadata invalidation channel failed: {e}")
+                await asyncio.sleep(retry_interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Счётчики и заполненность кэша."""
+        return {
+            **asdict(self.stats),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "shared_tier": self.redis_url is not None,
+        }
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _hit(self, data: Optional[Dict[str, Any]], shared: bool) -> Optional[File]:
+        if data is None:
+            self.stats.negative_hits += 1
+            return None
+        if shared:
+            self.stats.shared_hits += 1
+        else:
+            self.stats.local_hits += 1
+        return _from_dict(data)
+
+    def _drop_local(self, file_uids: Iterable[str]) -> None:
+        for file_uid in file_uids:
+            self._entries.pop(file_uid, None)
+            self._pending.pop(file_uid, None)
+
+    def _start_loads(self, file_uids: List[str]) -> Dict[str, object]:
+        # Более поздняя загрузка того же UID заменяет метку более ранней
+        tokens = {file_uid: object() for file_uid in file_uids}
+        self._pending.update(tokens)
+        return tokens
+
+    def _finish_loads(self, tokens: Dict[str, object]) -> Set[str]:
+        """
+        Снимает метки загрузок.
+
+        :return: UID, которые не сбрасывались во время загрузки.
+        """
+        valid = set()
+        for file_uid, token in tokens.items():
+            if self._pending.get(file_uid) is token:
+                del self._pending[file_uid]
+                valid.add(file_uid)
+        return valid
+
+    def _put_local(self, file_uid: str, data: Optional[Dict[str, Any]]) -> None:
+        ttl = self.ttl if data is not None else self.negative_ttl
+        self._entries[file_uid] = (time.monotonic() + ttl, data)
+        self._entries.move_to_end(file_uid)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # Общий уровень: ошибки Redis не мешают обслуживать запросы из базы
+
+    async def _get_shared(
+        self, file_uid: str
+    ) -> Tuple[bool, Optional[Dict[str, Any]], Optional[bytes]]:
+        values, generations = await self._get_shared_many([file_uid])
+        if values[0] is None:
+            return False, None, generations.get(file_uid)
+        return True, values[0][0], None
+
+    async def _get_shared_many(
+        self, file_uids: List[str]
+    ) -> Tuple[List[Optional[Tuple[Optional[Dict[str, Any]]]]], Dict[str, bytes]]:
+        """
+        Читает записи вместе со счётчиками сбросов.
+
+        :return: Для каждого UID — None при промахе, иначе кортеж из записи
+            (или None); и счётчики сбросов прочитанных UID (b"", если сбросов
+            не было). При ошибке Redis счётчиков нет, и записывать нечего.
+        """
+        redis = self._get_redis()
+        if redis is None or not file_uids:
+            return [None] * len(file_uids), {}
+        keys = [self._key(file_uid) for file_uid in file_uids]
+        keys += [self._generation_key(file_uid) for file_uid in file_uids]
+        try:
+            raw_values = await redis.mget(keys)
+        except Exception as e:
+            logger.warning(f"Failed to read metadata from Redis: {e}")
+            return [None] * len(file_uids), {}
+        values = raw_values[: len(file_uids)]
+        generations = raw_values[len(file_uids) :]
+        return (
+            [(json.loads(raw),) if raw is not None else None for raw in values],
+            {
+                file_uid: generation if generation is not None else b""
+                for file_uid, generation in zip(file_uids, generations)
+            },
+        )
+
+    async def _set_shared_many(
+        self,
+        entries: Dict[str, Optional[Dict[str, Any]]],
+        generations: Dict[str, bytes],
+    ) -> None:
+        redis = self._get_redis()
+        entries = {uid: data for uid, data in entries.items() if uid in generations}
+        if redis is None or not entries:
+            return
+        keys, args = [], []
+        for file_uid, data in entries.items():
+            ttl = self.ttl if data is not None else self.negative_ttl
+            keys += [self._key(file_uid), self._generation_key(file_uid)]
+            args += [
+                generations[file_uid],
+                max(1, int(ttl)),
+                json.dumps(data) if data is not None else _MISSING,
+            ]
+        try:
+            await redis.eval(_SET_IF_NOT_INVALIDATED, len(keys), *keys, *args)
+        except Exception as e:
+            logger.warning(f"Failed to write metadata to Redis: {e}")
+
+    def _get_redis(self):
+        if self.redis_url is None:
+            return None
+        if self._redis is None:
+            from redis import asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    @staticmethod
+    def _key(file_uid: str) -> str:
+        return f"files:meta:{file_uid}"
+
+    @staticmethod
+    def _generation_key(file_uid: str) -> str:
+        return f"files:meta-gen:{file_uid}"
+
+
+def _to_dict(file: File) -> Dict[str, Any]:
+    data = {column.key: getattr(file, column.key) for column in File.__table__.columns}
+    # Запись хранится в Redis как JSON
+    if data["created_at"] is not None:
+        data["created_at"] = data["created_at"].isoformat()
+    return data
+
+
+def _from_dict(data: Dict[str, Any]) -> File:
+    data = dict(data)
+    if data.get("created_at") is not None:
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+    return File(**data)
+
+
+metadata_cache = MetadataCache(
+    max_entries=settings.METADATA_CACHE_MAX_ENTRIES,
+    ttl=settings.METADATA_CACHE_TTL_SECONDS,
+    negative_ttl=settings.METADATA_CACHE_NEGATIVE_TTL_SECONDS,
+    redis_url=settings.METADATA_CACHE_REDIS_URL,
+)
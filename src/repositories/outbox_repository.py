@@ -0,0 +1,106 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import PendingUpload
+
+
+class OutboxRepository:
+    """
+    Outbox задач загрузки в облако.
+
+    Методы не фиксируют транзакцию: записи добавляются в транзакцию
+    записей о файлах. Выбранные для отправки записи берутся в аренду
+    (available_at сдвигается) короткой транзакцией до публикации, а удаляет
+    их воркер после загрузки содержимого в облако.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    def add(
+        self,
+        file_uid: str,
+        storage_key: str,
+        available_at: datetime,
+        batch_id: Optional[str] = None,
+    ) -> None:
+        self._session.add(
+            PendingUpload(
+                file_uid=file_uid,
+                storage_key=storage_key,
+                batch_id=batch_id,
+                available_at=available_at,
+            )
+        )
+
+    async def claim(
+        self,
+        limit: int,
+        now: datetime,
+        lease_until: datetime,
+        file_uids: Optional[List[str]] = None,
+    ) -> List[PendingUpload]:
+        """
+        Берёт записи в аренду до lease_until, пропуская заблокированные
+        другими диспетчерами, и увеличивает счётчик попыток.
+
+        Аренда действует после фиксации транзакции: до lease_until записи
+        не выберет ни один просмотр, и публиковать их можно вне транзакции.
+
+        :param file_uids: Выбрать ещё не публиковавшиеся записи этих файлов
+            независимо от available_at. Без них выбираются записи,
+            чей available_at уже наступил.
+        """
+        condition = (
+            PendingUpload.file_uid.in_(file_uids) & (PendingUpload.attempts == 0)
+            if file_uids is not None
+            else PendingUpload.available_at <= now
+        )
+        try:
+            result = await self._session.execute(
+                select(PendingUpload)
+                .where(condition)
+                .order_by(PendingUpload.created_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            rows = list(result.scalars())
+            for row in rows:
+                row.available_at = lease_until
+                row.attempts += 1
+            await self._session.flush()
+            return rows
+
+        except SQLAlchemyError as e:
+            raise RuntimeError(f"Error occurred while claiming pending uploads: {e}")
+
+    async def delete_by_key(self, storage_key: str) -> None:
+        """Удаляет задачи загрузки содержимого, которое уже в облаке или удалено."""
+        try:
+            await self._session.execute(
+                delete(PendingUpload)
+                .where(PendingUpload.storage_key == storage_key)
+                .execution_options(synchronize_session=False)
+            )
+
+        except SQLAlchemyError as e:
+            raise RuntimeError(f"Error occurred while deleting pending uploads: {e}")
+
+    async def postpone(self, file_uids: List[str], available_at: datetime) -> None:
+        """Откладывает записи, которые не удалось отправить, до available_at."""
+        if not file_uids:
+            return
+        try:
+            await self._session.execute(
+                update(PendingUpload)
+                .where(PendingUpload.file_uid.in_(file_uids))
+                .values(available_at=available_at)
+                .execution_options(synchronize_session=False)
+            )
+
+        except SQLAlchemyError as e:
+            raise RuntimeError(f"Error occurred while postponing pending uploads: {e}")
@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import UploadSession
+
+
+class UploadSessionRepository:
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def create(self, upload: UploadSession) -> None:
+        try:
+            self._session.add(upload)
+            await self._session.commit()
+
+        except SQLAlchemyError as e:
+            await self._session.rollback()
+            raise RuntimeError(f"Error occurred while upload creating: {e}")
+
+    async def get(
+        self, upload_id: str, now: datetime, direct: bool = False
+    ) -> Optional[UploadSession]:
+        """
+        Незавершённая загрузка, срок которой ещё не истёк.
+
+        :param direct: Искать прямую загрузку в бакет, а не возобновляемую.
+        """
+        try:
+            result = await self._session.execute(
+                select(UploadSession).where(
+                    UploadSession.id == upload_id,
+                    UploadSession.expires_at > now,
+                    _is_direct(direct),
+                )
+            )
+            return result.scalar_one_or_none()
+
+        except SQLAlchemyError as e:
+            raise RuntimeError(
+                f"Error occurred while retrieving upload {upload_id}: {e}"
+            )
+
+    async def advance(
+        self,
+        upload_id: str,
+        offset: int,
+        new_offset: int,
+        expires_at: datetime,
+        write: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> bool:
+        """
+        Сдвигает смещение загрузки, если оно всё ещё равно offset.
+
+        :param write: Запись части в промежуточный файл. Выполняется после
+            сдвига, но до фиксации: строка загрузки заблокирована, так что
+            другие запросы с тем же смещением ждут и получают False,
+            а завершение загрузки видит смещение только вместе с данными.
+            Ошибка записи отменяет сдвиг.
+        :return: False, если смещение успел изменить другой запрос.
+        """
+        try:
+            result = await self._session.execute(
+                update(UploadSession)
+                .where(UploadSession.id == upload_id, UploadSession.offset == offset)
+                .values(offset=new_offset, expires_at=expires_at)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                await self._session.rollback()
+                return False
+            if write is not None:
+                await write()
+            await self._session.commit()
+            return True
+
+        except SQLAlchemyError as e:
+            await self._session.rollback()
+            raise RuntimeError(f"Error occurred while updating upload {upload_id}: {e}")
+        except BaseException:
+            await self._session.rollback()
+            raise
+
+    async def delete(self, upload_id: str, direct: bool = False) -> bool:
+        try:
+            result = await self._session.execute(
+                delete(UploadSession).where(
+                    UploadSession.id == upload_id, _is_direct(direct)
+                )
+            )
+            await self._session.commit()
+            return result.rowcount == 1
+
+        except SQLAlchemyError as e:
+            await self._session.rollback()
+            raise RuntimeError(f"Error occurred while deleting upload {upload_id}: {e}")
+
+    async def delete_expired(self, now: datetime) -> List[UploadSession]:
+        """Удаляет просроченные загрузки и возвращает их."""
+        try:
+            result = await self._session.execute(
+                delete(UploadSession)
+                .where(UploadSession.expires_at <= now)
+                .returning(UploadSession)
+            )
+            uploads = list(result.scalars())
+            await self._session.commit()
+            return uploads
+
+        except SQLAlchemyError as e:
+            await self._session.rollback()
+            raise RuntimeError(f"Error occurred while deleting expired uploads: {e}")
+
+
+def _is_direct(direct: bool):
+    if direct:
+        return UploadSession.multipart_upload_id.is_not(None)
+    return UploadSession.multipart_upload_id.is_(None)
@@ -0,0 +1,315 @@
+"""
+Запуск приложения в продакшене: `python -m src`.
+
+Главный процесс один раз импортирует приложение и создаёт таблицы базы,
+открывает слушающий сокет и порождает через fork SERVER_WORKERS воркеров
+uvicorn, которые принимают соединения с этого общего сокета. Загруженный
+до fork код воркеры делят с главным процессом, а соединения с базой, S3
+и брокером каждый воркер открывает сам в lifespan.
+
+Главный процесс следит за воркерами:
+- упавший воркер и воркер, обслуживший SERVER_MAX_REQUESTS запросов,
+  заменяются новыми;
+- по SIGTERM или SIGINT воркеры перестают принимать соединения, дорабатывают
+  начатые запросы (в том числе потоковые скачивания) не дольше
+  SERVER_GRACEFUL_TIMEOUT_SECONDS и выполняют остановку lifespan;
+  повторный сигнал прерывает начатые запросы;
+- если воркер не смог запуститься (ошибка в lifespan), останавливается весь сервер.
+
+Цикл событий uvloop и разбор HTTP на httptools используются, если они
+установлены (`poetry install --extras server`), иначе asyncio и h11. С httptools
+локальные файлы отдаются через os.sendfile (src/http_protocol.py), если версия
+uvicorn совпадает с закреплённой.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+from starlette.types import ASGIApp
+
+from src.config import settings
+
+# Сообщения главного процесса попадают в журнал uvicorn рядом с сообщениями воркеров
+logger = logging.getLogger("uvicorn.error")
+
+# Код выхода воркера, у которого не запустилось приложение (как у uvicorn)
+STARTUP_FAILURE = 3
+
+# Сколько принятое перед остановкой воркера соединение ждёт запроса
+ACCEPTED_GRACE_SECONDS = 0.1
+
+# Время на остановку lifespan воркера сверх ожидания начатых запросов
+SHUTDOWN_MARGIN_SECONDS = 15
+
+SIGNALS = {signal.SIGCHLD, signal.SIGINT, signal.SIGTERM}
+
+
+class PreforkServer:
+    """
+    Главный процесс: общий слушающий сокет и воркеры uvicorn.
+
+    :param app: Импортированное приложение, общее для воркеров.
+    :param workers: Число воркеров.
+    :param max_requests: После скольких запросов заменять воркер (0 — не заменять).
+    :param max_requests_jitter: Наибольшая случайная добавка к max_requests,
+        чтобы воркеры не перезапускались одновременно.
+    :param graceful_timeout: Сколько секунд воркер дорабатывает начатые
+        запросы при остановке.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        host: str,
+        port: int,
+        workers: int,
+        max_requests: int = 0,
+        max_requests_jitter: int = 0,
+        graceful_timeout: int = 30,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+
+        # PID воркера → время запуска
+        self._workers: Dict[int, float] = {}
+        self._socket: Optional[socket.socket] = None
+        self._deadline: Optional[float] = None
+        self._exit_code = 0
+
+    def run(self) -> int:
+        """
+        Запускает воркеры и следит за ними до остановки.
+
+        :return: Код выхода процесса.
+        """
+        config = self._config()
+        self._socket = config.bind_socket()
+        # Сигналы принимаются синхронно (sigtimedwait), без обработчиков
+        signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+        logger.info(
+            "Starting %d workers (event loop: %s, HTTP parser: %s)",
+            self.workers,
+            "uvloop" if _installed("uvloop") else "asyncio",
+            "httptools" if _installed("httptools") else "h11",
+        )
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+
+            while self._workers:
+                if self._deadline is not None and time.monotonic() >= self._deadline:
+                    logger.error("Workers did not stop in time, killing them")
+                    self._kill_workers()
+                    break
+
+                received = signal.sigtimedwait(SIGNALS, self._wait_timeout())
+                if received is not None and received.si_signo != signal.SIGCHLD:
+                    self.stop()
+                self._reap()
+        finally:
+            self._socket.close()
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+        return self._exit_code
+
+    def stop(self, exit_code: int = 0) -> None:
+        """Просит воркеры завершиться; повторный вызов прерывает начатые запросы."""
+        if self._deadline is not None:
+            # uvicorn прерывает запросы по SIGINT во время плавной остановки
+            logger.warning("Forcing workers to stop")
+            self._signal_workers(signal.SIGINT)
+            return
+
+        logger.info("Stopping workers")
+        self._exit_code = exit_code
+        self._deadline = (
+            time.monotonic() + self.graceful_timeout + SHUTDOWN_MARGIN_SECONDS
+        )
+        self._signal_workers(signal.SIGTERM)
+        # Когда сокет закроют и воркеры, новые соединения будут отклоняться,
+        # а не ждать в очереди, которую уже никто не разберёт
+        self._socket.close()
+
+    # Воркеры
+
+    def _spawn(self) -> None:
+        limit = None
+        if self.max_requests:
+            limit = self.max_requests + random.randint(0, self.max_requests_jitter)
+
+        pid = os.fork()
+        if pid:
+            self._workers[pid] = time.monotonic()
+            return
+
+        exit_code = 1
+        try:
+            exit_code = self._serve(limit)
+        except BaseException:
+            logger.exception("Worker [%d] crashed", os.getpid())
+        finally:
+            os._exit(exit_code)
+
+    def _serve(self, limit_max_requests: Optional[int]) -> int:
+        """Тело воркера: uvicorn на общем сокете. Выполняется после fork."""
+        # Своя группа процессов: Ctrl+C из терминала получает только главный
+        # процесс, и воркеры останавливаются один раз, по его SIGTERM
+        os.setpgid(0, 0)
+        signal.pthread_sigmask(signal.SIG_SETMASK, set())
+
+        server = _WorkerServer(self._config(limit_max_requests))
+        server.run(sockets=[self._socket])
+        return 0 if server.started else STARTUP_FAILURE
+
+    def _reap(self) -> None:
+        """Забирает завершившиеся воркеры и при необходимости заменяет их."""
+        while self._workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if self._workers.pop(pid, None) is None:
+                continue
+            _mark_dead(pid)
+            if self._deadline is not None:
+                continue
+
+            exit_code = os.waitstatus_to_exitcode(status)
+            if exit_code == STARTUP_FAILURE:
+                logger.error("Worker [%d] failed to start, shutting down", pid)
+                self.stop(STARTUP_FAILURE)
+                continue
+
+            if exit_code == 0:
+                logger.info("Worker [%d] served its requests, replacing it", pid)
+            else:
+                logger.warning(
+                    "Worker [%d] exited with %d, replacing it", pid, exit_code
+                )
+            self._spawn()
+
+    def _kill_workers(self) -> None:
+        self._signal_workers(signal.SIGKILL)
+        for pid in list(self._workers):
+            os.waitpid(pid, 0)
+            self._workers.pop(pid)
+            _mark_dead(pid)
+
+    def _signal_workers(self, signum: int) -> None:
+        for pid in self._workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _wait_timeout(self) -> float:
+        if self._deadline is None:
+            # Воркеры могут завершиться и без сигнала (SIGCHLD мог слиться)
+            return 1.0
+        return min(max(self._deadline - time.monotonic(), 0), 1.0)
+
+    def _config(self, limit_max_requests: Optional[int] = None) -> uvicorn.Config:
+        http = "auto"
+        if _installed("httptools"):
+            from src import http_protocol
+
+            if http_protocol.is_supported():
+                http = http_protocol.ZeroCopyHttpToolsProtocol
+            else:
+                logger.warning(
+                    f"uvicorn {uvicorn.__version__} is not supported by the zero-copy "
+                    "protocol, local files are sent without sendfile"
+                )
+
+        return uvicorn.Config(
+            self.app,
+            host=self.host,
+            port=self.port,
+            http=http,
+            limit_max_requests=limit_max_requests,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+
+
+class _WorkerServer(uvicorn.Server):
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        # uvicorn закрывает соединения, по которым ещё не разобран запрос, как
+        # простаивающие. Соединение, принятое перед остановкой, успевает
+        # передать запрос, пока воркер уже не принимает новые: иначе клиент
+        # получил бы сброс соединения (например, при замене по max_requests)
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(ACCEPTED_GRACE_SECONDS)
+        await super().shutdown(sockets)
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _mark_dead(pid: int) -> None:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        # Убирает показатели вида livesum завершившегося воркера
+        multiprocess.mark_process_dead(pid)
+
+
+def available_cpus() -> int:
+    """Ядра, доступные процессу (с учётом taskset и cpuset контейнера)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+async def _prepare_database() -> None:
+    from src.db_conn import engine, init_db
+
+    # Таблицы создаются один раз, а не наперегонки из каждого воркера
+    await init_db()
+    # Соединения пула не должны достаться воркерам через fork
+    await engine.dispose()
+
+
+def main() -> int:
+    workers = settings.SERVER_WORKERS or available_cpus()
+
+    metrics_dir = None
+    if workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        # Без общего каталога /metrics отдавал бы метрики одного воркера.
+        # Переменная задаётся до импорта prometheus_client вместе с приложением
+        metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    try:
+        from src.main import app
+
+        asyncio.run(_prepare_database())
+        server = PreforkServer(
+            app,
+            host=settings.SERVER_HOST,
+            port=settings.SERVER_PORT,
+            workers=workers,
+            max_requests=settings.SERVER_MAX_REQUESTS,
+            max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER,
+            graceful_timeout=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        )
+        return server.run()
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -1,10 +1,12 @@
 from .download_file import DownloadFileService
-from .proceed_file import FileMetadata, enough_free_space
+from .local_cache import LocalFileCache, local_cache
+from .proceed_file import FileMetadata
 from .upload_file import UploadFileService
 
 __all__ = [
     "DownloadFileService",
     "FileMetadata",
+    "LocalFileCache",
     "UploadFileService",
-    "enough_free_space",
+    "local_cache",
 ]
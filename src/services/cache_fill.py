@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+import aiofiles
+
+from src.config import settings
+from src.metrics import observe_transfer
+from src.models import StorageState
+from src.services import storage_state
+from src.services.local_cache import local_cache
+from src.services.s3 import CloudStorageProvider
+
+logger = logging.getLogger(__name__)
+
+
+class CacheFill:
+    """
+    Загрузка объекта из облака в локальное хранилище, за которой
+    одновременно следят все запросы этого файла.
+
+    Тело объекта пишется во временный файл рядом с итоговым, читатели
+    отдают клиенту уже записанные байты, не дожидаясь конца загрузки.
+    По завершении файл атомарно переименовывается в итоговый путь.
+    """
+
+    def __init__(self, provider: CloudStorageProvider, file_key: str, save_path: str):
+        self.provider = provider
+        self.file_key = file_key
+        self.save_path = save_path
+        self.part_path = f"{save_path}.{uuid.uuid4().hex}.part"
+
+        self.size: Optional[int] = None
+        self.written: int = 0
+        self.done: bool = False
+        self.error: Optional[BaseException] = None
+
+        self._started = asyncio.Event()
+        self._progress = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def wait_started(self) -> None:
+        """
+        Ждёт ответа облака с размером объекта.
+
+        :raises FileNotFoundError: Если объекта нет в бакете.
+        """
+        await self._started.wait()
+        if self.error is not None:
+            raise self.error
+
+    async def wait_done(self) -> None:
+        """Ждёт, пока файл целиком окажется на диске."""
+        async with self._progress:
+            await self._progress.wait_for(lambda: self.done or self.error)
+        if self.error is not None:
+            raise self.error
+
+    async def stream(self, offset: int, length: int) -> AsyncIterator[bytes]:
+        """Отдаёт length байт с позиции offset по мере их записи на диск."""
+        if self.error is not None:
+            raise self.error
+
+        # Файл открывается синхронно, чтобы переименование не случилось
+        # между выбором пути и открытием.
+        file = open(self.save_path if self.done else self.part_path, "rb")
+        try:
+            position, end = offset, offset + length
+            while position < end:
+                await self._wait_for(position + 1)
+                available = end if self.done else min(end, self.written)
+                chunk_size = min(settings.CHUNK_SIZE, available - position)
+                chunk = await asyncio.to_thread(
+                    os.pread, file.fileno(), chunk_size, position
+                )
+                if not chunk:
+                    break
+                position += len(chunk)
+                yield chunk
+        finally:
+            file.close()
+
+    async def _wait_for(self, written: int) -> None:
+        async with self._progress:
+            await self._progress.wait_for(
+                lambda: self.done or self.error or self.written >= written
+            )
+        if self.error is not None:
+            raise self.error
+
+    async def _notify(self) -> None:
+        async with self._progress:
+            self._progress.notify_all()
+
+    async def _run(self) -> None:
+        start = time.perf_counter()
+        try:
+            async with self.provider.open_stream(self.file_key) as (size, body):
+                self.size = size
+                async with aiofiles.open(self.part_path, mode="wb") as part_file:
+                    self._started.set()
+                    while chunk := await body.read(settings.CHUNK_SIZE):
+                        await part_file.write(chunk)
+                        await part_file.flush()
+                        self.written += len(chunk)
+                        await self._notify()
+
+            os.replace(self.part_path, self.save_path)
+            self.done = True
+            observe_transfer("s3_download", self.written, time.perf_counter() - start)
+        except BaseException as e:
+            self.error = e
+            if not isinstance(e, FileNotFoundError):
+                logger.error(f"Failed to fill local cache for {self.file_key}: {e}")
+            try:
+                os.remove(self.part_path)
+            except FileNotFoundError:
+                pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        finally:
+            _fills.pop(self.save_path, None)
+            self._started.set()
+            await self._notify()
+
+        # Файл получен из облака, значит его можно вытеснять без проверки
+        try:
+            await local_cache.add(
+                os.path.basename(self.save_path), self.written, uploaded=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to register {self.file_key} in local cache: {e}")
+        await storage_state.mark(
+            self.file_key,
+            StorageState.IN_CLOUD,
+            only_from=[StorageState.EVICTED_LOCALLY],
+        )
+
+
+# Загрузки, идущие в этом процессе, по итоговому пути файла
+_fills: Dict[str, CacheFill] = {}
+
+
+def get_or_start_fill(
+    provider: CloudStorageProvider, file_key: str, save_path: str
+) -> CacheFill:
+    """
+    Возвращает идущую загрузку файла или запускает новую.
+
+    Одновременные промахи по одному ключу объединяются в одну загрузку.
+    """
+    fill = _fills.get(save_path)
+    if fill is None:
+        fill = CacheFill(provider, file_key, save_path)
+        _fills[save_path] = fill
+        fill.start()
+    return fill
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+from src.repositories import FileRepository
+from src.services.local_cache import local_cache
+from src.services.s3 import CloudStorageProvider
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteFileService:
+    def __init__(
+        self,
+        provider: CloudStorageProvider,
+        session: AsyncSession,
+    ):
+        self.s3_provider = provider
+        self.file_repository = FileRepository(session)
+
+    async def delete(self, uid: str) -> bool:
+        """
+        Удаляет файл. Если на его содержимое больше нет ссылок, удаляет
+        и копии содержимого: локальный файл и объект в бакете.
+
+        Копии удаляются после фиксации удаления записи, поэтому при сбое
+        остаётся лишний объект, но не запись без содержимого.
+
+        :param uid: UID файла.
+        :return: False, если файл не найден.
+        """
+        deleted = await self.file_repository.delete_by_uid(uid)
+        if deleted is None:
+            return False
+        if deleted.released_key is not None:
+            await self.release(deleted.released_key)
+        return True
+
+    async def release(self, storage_key: str) -> None:
+        """Удаляет копии содержимого, на которое больше нет ссылок."""
+        try:
+            await local_cache.remove(storage_key)
+        except Exception as e:
+            logger.error(f"Failed to remove local copy of {storage_key}: {e}")
+
+        try:
+            await self.s3_provider.delete(storage_key)
+        except Exception as e:
+            logger.error(f"Failed to delete {storage_key} from cloud storage: {e}")
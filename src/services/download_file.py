@@ -1,14 +1,39 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import TYPE_CHECKING, Type
+import secrets
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Optional
 from urllib.parse import quote
 
-import aiofiles
+from fastapi import Response
 from fastapi.responses import StreamingResponse
+from starlette import status
 
 from src.config import settings
+from src.metrics import LOCAL_CACHE_REQUESTS, observe_transfer, stage
+from src.models import LOCAL_STATES, AppExceptions, StorageState
 from src.repositories import FileRepository
+from src.services.cache_fill import CacheFill, get_or_start_fill
+from src.services.file_response import (
+    LocalFileResponse,
+    Segment,
+    segments_length,
+    segments_stream,
+)
+from src.services.http_cache import (
+    http_date,
+    immutable_cache_control,
+    is_not_modified,
+)
+from src.services.http_range import (
+    ByteRange,
+    RangeNotSatisfiable,
+    if_range_matches,
+    parse_range_header,
+)
+from src.services.image_derivatives import DerivativeSpec, image_derivatives
+from src.services.local_cache import local_cache
 from src.services.s3 import CloudStorageProvider
 
 if TYPE_CHECKING:
@@ -18,55 +43,313 @@ if TYPE_CHECKING:
 class DownloadFileService:
     def __init__(
         self,
-        provider: Type[CloudStorageProvider],
+        provider: CloudStorageProvider,
         session: AsyncSession,
     ):
-        self.s3_provider = provider()
+        self.s3_provider = provider
         self.file_repository = FileRepository(session)
 
         self.file_record = None
         self.local_file_path = None
+        # Локальный файл открывается при выборе источника, до начала ответа
+        self.local_file: Optional[BinaryIO] = None
+        self.cache_fill: Optional[CacheFill] = None
+        self.derivative: Optional[DerivativeSpec] = None
 
     async def get_and_set_file_record(self, uid: str) -> bool:
-        self.file_record = await self.file_repository.get_by_uid(uid)
+        with stage("download", "lookup"):
+            self.file_record = await self.file_repository.get_cached_by_uid(uid)
         return True if self.file_record else False
 
+    def not_modified(
+        self,
+        if_none_match: Optional[str],
+        if_modified_since: Optional[str],
+        derivative: Optional[DerivativeSpec] = None,
+    ) -> Optional[Response]:
+        """
+        Ответ 304, если у клиента актуальная копия файла или его варианта.
+
+        Валидаторы строятся только по записи о файле, поэтому ни диск,
+        ни облако для этого не нужны.
+
+        :return: None, если файл нужно отдать.
+        """
+        self.derivative = derivative
+        if not is_not_modified(
+            if_none_match,
+            if_modified_since,
+            self._get_etag(),
+            self.file_record.created_at,
+        ):
+            return None
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": self._get_etag(), **self._get_cache_headers()},
+        )
+
+    async def get_redirect_url(self) -> Optional[str]:
+        """
+        Временная ссылка на файл в бакете, чтобы отдачу взяло на себя хранилище.
+
+        :return: None, если файл нужно отдавать самому сервису.
+        """
+        with stage("download", "presign"):
+            # Файлы в локальных состояниях и без состояния могут ещё не быть в бакете
+            if self._get_state() not in (
+                StorageState.IN_CLOUD,
+                StorageState.EVICTED_LOCALLY,
+            ):
+                return None
+            return await self.s3_provider.presigned_download_url(
+                self._get_file_key(),
+                self.file_record.original_name,
+                settings.PRESIGNED_URL_TTL_SECONDS,
+            )
+
     async def get_file_locally(self) -> bool:
-        self.local_file_path = self._get_local_path()
-        if not os.path.exists(self.local_file_path):
-            try:
-                await self.s3_provider.download(
-                    file_key=self._get_file_key(),
-                    save_path=self.local_file_path,
+        """
+        Выбирает источник файла по его состоянию в базе.
+
+        :return: False, если содержимого нет ни локально, ни в облаке.
+        """
+        with stage("download", "locate"):
+            self.local_file_path = self._get_local_path()
+            state = self._get_state()
+
+            if state in LOCAL_STATES:
+                # Файла ещё нет в облаке: обращаться к нему бессмысленно,
+                # а пока воркер его загружает, можно получить неполный объект.
+                if await self._serve_local():
+                    return True
+                # Запись из кэша метаданных могла устареть: файл уже выгружен и вытеснен
+                self.file_record = await self.file_repository.get_by_uid(
+                    self.file_record.uid
                 )
+                if self.file_record is None or self._get_state() in LOCAL_STATES:
+                    return False
+                state = self._get_state()
+
+            # Вытесненный файл сразу загружается из облака, без проверки диска.
+            # Для записей без состояния сначала проверяется локальная копия.
+            if state != StorageState.EVICTED_LOCALLY and await self._serve_local():
+                return True
+
+            # Промах: файл отдаётся клиенту по мере загрузки из облака,
+            # одновременные запросы того же файла используют одну загрузку.
+            self.cache_fill = get_or_start_fill(
+                self.s3_provider, self._get_file_key(), self.local_file_path
+            )
+            try:
+                await self.cache_fill.wait_started()
             except FileNotFoundError:
                 return False
-        return True
+            LOCAL_CACHE_REQUESTS.labels("miss").inc()
+            return True
+
+    async def get_derivative_locally(self, spec: DerivativeSpec) -> bool:
+        """
+        Находит вариант изображения на диске или в бакете,
+        а если его нет нигде, строит из оригинала.
 
-    async def get_file_stream(self) -> StreamingResponse:
-        # Асинхронное чтение файла
-        async def file_stream(file_path: str):
-            async with aiofiles.open(file_path, mode="rb") as file:
-                while chunk := await file.read(settings.CHUNK_SIZE):
-                    yield chunk
+        :return: False, если нет оригинала.
+        """
+        with stage("download", "derivative"):
+            self.derivative = spec
+            self.local_file_path = self._get_local_path()
+            if await self._serve_local():
+                return True
+
+            # Вариант мог остаться в бакете после вытеснения
+            cache_fill = get_or_start_fill(
+                self.s3_provider, self._get_file_key(), self.local_file_path
+            )
+            try:
+                await cache_fill.wait_started()
+                self.cache_fill = cache_fill
+                LOCAL_CACHE_REQUESTS.labels("miss").inc()
+                return True
+            except FileNotFoundError:
+                pass
+
+            self.derivative = None
+            if not await self.get_file_locally():
+                return False
+            if self.cache_fill is not None:
+                # Оригинал нужен целиком
+                await self.cache_fill.wait_done()
+                self.cache_fill = None
+            if self.local_file is not None:
+                # Оригинал читается по пути при построении варианта
+                self.local_file.close()
+                self.local_file = None
+            source_path = self.local_file_path
+
+            self.derivative = spec
+            self.local_file_path = self._get_local_path()
+            await image_derivatives.create(
+                self.s3_provider, source_path, self.local_file_path, spec
+            )
+            return await self._open_local()
+
+    async def get_file_stream(
+        self,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None,
+    ) -> StreamingResponse:
+        if self.local_file is None and (
+            self.cache_fill is None or self.cache_fill.done
+        ):
+            # Загрузка из облака успела завершиться: файл отдаётся с диска
+            if not await self._open_local():
+                raise AppExceptions.file_not_found()
+        try:
+            return self._build_response(range_header, if_range)
+        except BaseException:
+            if self.local_file is not None:
+                self.local_file.close()
+            raise
+
+    def _build_response(
+        self, range_header: Optional[str], if_range: Optional[str]
+    ) -> StreamingResponse:
+        file_size: int = self._get_file_size()
+        etag: str = self._get_etag()
 
         # Кодировка имени файла для заголовка
-        encoded_filename = quote(self.file_record.original_name)
-
-        # Возврат файла через поток
-        return StreamingResponse(
-            file_stream(self.local_file_path),
-            media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
-            },
+        encoded_filename = quote(self._get_filename())
+        headers = {
+            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            **self._get_cache_headers(),
+        }
+
+        ranges: Optional[List[ByteRange]] = None
+        if if_range_matches(if_range, etag):
+            try:
+                ranges = parse_range_header(range_header, file_size)
+            except RangeNotSatisfiable:
+                raise AppExceptions.range_not_satisfiable(file_size)
+
+        if ranges is None:
+            # Весь файл
+            status_code = status.HTTP_200_OK
+            media_type = self._get_media_type()
+            segments: List[Segment] = [ByteRange(0, file_size - 1)] if file_size else []
+        elif len(ranges) == 1:
+            # Один диапазон
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            media_type = self._get_media_type()
+            segments = [ranges[0]]
+            headers["Content-Range"] = ranges[0].content_range(file_size)
+        else:
+            # Несколько диапазонов: multipart/byteranges
+            boundary = secrets.token_hex(16)
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            media_type = f"multipart/byteranges; boundary={boundary}"
+            segments = multipart_segments(ranges, file_size, boundary)
+
+        content_length = segments_length(segments)
+        headers["Content-Length"] = str(content_length)
+        observe_transfer("sent", content_length)
+
+        if self.cache_fill is not None and not self.cache_fill.done:
+            return StreamingResponse(
+                segments_stream(segments, self.cache_fill.stream),
+                status_code=status_code,
+                headers=headers,
+                media_type=media_type,
+            )
+
+        return LocalFileResponse(
+            self.local_file,
+            segments,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
         )
 
+    async def _serve_local(self) -> bool:
+        """Открывает локальную копию и учитывает попадание в кэш."""
+        if not await self._open_local():
+            return False
+        local_cache.touch(self._get_file_key())
+        LOCAL_CACHE_REQUESTS.labels("hit").inc()
+        return True
+
+    async def _open_local(self) -> bool:
+        """
+        Открывает локальный файл в потоке.
+
+        :return: False, если файла нет (например, его уже вытеснили).
+        """
+        try:
+            self.local_file = await asyncio.to_thread(open, self.local_file_path, "rb")
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _get_file_size(self) -> int:
+        if self.cache_fill is not None and not self.cache_fill.done:
+            return self.cache_fill.size
+        if self.derivative is None and self._get_state() is not None:
+            return self.file_record.file_size
+        return os.fstat(self.local_file.fileno()).st_size
+
+    def _get_state(self) -> Optional[StorageState]:
+        state = self.file_record.storage_state
+        return StorageState(state) if state is not None else None
+
     def _get_local_path(self) -> str:
-        return os.path.join(
-            settings.STORAGE_PATH,
-            f"{self.file_record.uid}{self.file_record.file_extension}",
-        )
+        return os.path.join(settings.STORAGE_PATH, self._get_file_key())
 
     def _get_file_key(self) -> str:
-        return f"{self.file_record.uid}{self.file_record.file_extension}"
+        if self.derivative is not None:
+            return self.derivative.key_for(self.file_record.object_key)
+        return self.file_record.object_key
+
+    def _get_filename(self) -> str:
+        if self.derivative is not None:
+            stem, _ = os.path.splitext(self.file_record.original_name)
+            return f"{stem}{self.derivative.extension}"
+        return self.file_record.original_name
+
+    def _get_media_type(self) -> str:
+        if self.derivative is not None:
+            return self.derivative.media_type
+        return "application/octet-stream"
+
+    def _get_cache_headers(self) -> Dict[str, str]:
+        headers = {
+            "Cache-Control": immutable_cache_control(
+                settings.HTTP_CACHE_MAX_AGE_SECONDS
+            )
+        }
+        if self.file_record.created_at is not None:
+            headers["Last-Modified"] = http_date(self.file_record.created_at)
+        return headers
+
+    def _get_etag(self) -> str:
+        # Файлы неизменяемы после загрузки, поэтому UID — стабильный валидатор
+        if self.derivative is not None:
+            return f'"{self.file_record.uid}-{self.derivative.suffix}"'
+        return f'"{self.file_record.uid}"'
+
+
+def multipart_segments(
+    ranges: List[ByteRange], file_size: int, boundary: str
+) -> List[Segment]:
+    """Собирает тело multipart/byteranges из заголовков частей и диапазонов."""
+    segments: List[Segment] = []
+    for byte_range in ranges:
+        segments.append(
+            (
+                f"\r\n--{boundary}\r\n"
+                "Content-Type: application/octet-stream\r\n"
+                f"Content-Range: {byte_range.content_range(file_size)}\r\n\r\n"
+            ).encode()
+        )
+        segments.append(byte_range)
+    segments.append(f"\r\n--{boundary}--\r\n".encode())
+    return segments
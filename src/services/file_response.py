@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from functools import partial
+from typing import AsyncIterator, BinaryIO, Callable, List, Mapping, Optional, Union
+
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from src.config import settings
+from src.services.http_range import ByteRange
+
+# Тело ответа: готовые байты (заголовки частей multipart) или диапазон файла
+Segment = Union[bytes, ByteRange]
+# Чтение length байт с позиции offset
+RangeReader = Callable[[int, int], AsyncIterator[bytes]]
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+PATHSEND_EXTENSION = "http.response.pathsend"
+
+
+class LocalFileResponse(StreamingResponse):
+    """
+    Ответ с содержимым открытого локального файла.
+
+    Файл открывает вызывающий до начала ответа (DownloadFileService): если
+    файла уже нет, можно выбрать другой источник или ответить 404, а после
+    заголовков вытеснение из кэша ответ не оборвёт — открытый дескриптор
+    держит содержимое до конца передачи. Ответ закрывает файл сам.
+
+    Если ASGI-сервер поддерживает расширение ``http.response.zerocopysend``
+    (uvicorn с протоколом из ``src/http_protocol.py``, см. ``python -m src``),
+    диапазоны файла передаются через ``os.sendfile`` без копирования в Python.
+    Для целого файла подходит и ``http.response.pathsend``. В остальных
+    случаях файл читается в потоке, не блокируя цикл событий.
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        segments: List[Segment],
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        self.file = file
+        self.segments = segments
+        super().__init__(
+            segments_stream(segments, partial(file_stream, file)),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get("extensions") or {}
+
+        try:
+            if settings.DOWNLOAD_ZERO_COPY and ZERO_COPY_EXTENSION in extensions:
+                await self._send_zero_copy(send)
+            elif (
+                settings.DOWNLOAD_ZERO_COPY
+                and PATHSEND_EXTENSION in extensions
+                and self._is_whole_file()
+            ):
+                await self._send_path(send)
+            else:
+                await super().__call__(scope, receive, send)
+        finally:
+            self.file.close()
+
+    async def _send_zero_copy(self, send: Send) -> None:
+        await self._send_start(send)
+
+        if not self.segments:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        for index, segment in enumerate(self.segments):
+            more_body = index < len(self.segments) - 1
+            if isinstance(segment, ByteRange):
+                await send(
+                    {
+                        "type": ZERO_COPY_EXTENSION,
+                        "file": self.file,
+                        "offset": segment.start,
+                        "count": segment.length,
+                        "more_body": more_body,
+                    }
+                )
+            else:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": segment,
+                        "more_body": more_body,
+                    }
+                )
+
+    async def _send_path(self, send: Send) -> None:
+        await self._send_start(send)
+        await send({"type": PATHSEND_EXTENSION, "path": self.file.name})
+
+    async def _send_start(self, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+
+    def _is_whole_file(self) -> bool:
+        if len(self.segments) != 1 or not isinstance(self.segments[0], ByteRange):
+            return False
+        segment = self.segments[0]
+        size = os.fstat(self.file.fileno()).st_size
+        return segment.start == 0 and segment.length == size
+
+
+def segments_length(segments: List[Segment]) -> int:
+    """Точный размер тела ответа для заголовка Content-Length."""
+    return sum(
+        segment.length if isinstance(segment, ByteRange) else len(segment)
+        for segment in segments
+    )
+
+
+async def segments_stream(
+    segments: List[Segment], read_range: RangeReader
+) -> AsyncIterator[bytes]:
+    for segment in segments:
+        if isinstance(segment, ByteRange):
+            async for chunk in read_range(segment.start, segment.length):
+                yield chunk
+        else:
+            yield segment
+
+
+async def file_stream(file: BinaryIO, offset: int, length: int) -> AsyncIterator[bytes]:
+    """Читает length байт открытого файла, начиная с offset, в потоке."""
+    fd = file.fileno()
+    remaining = length
+    while remaining > 0:
+        chunk = await asyncio.to_thread(
+            os.pread, fd, min(settings.CHUNK_SIZE, remaining), offset
+        )
+        if not chunk:
+            break
+        offset += len(chunk)
+        remaining -= len(chunk)
+        yield chunk
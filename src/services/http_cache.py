@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+
+def immutable_cache_control(max_age: int) -> str:
+    """Cache-Control для содержимого, которое не меняется после загрузки."""
+    return f"public, max-age={max_age}, immutable"
+
+
+def http_date(moment: datetime) -> str:
+    """Дата в формате HTTP (IMF-fixdate)."""
+    return format_datetime(_as_utc(moment), usegmt=True)
+
+
+def is_not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    etag: str,
+    last_modified: Optional[datetime],
+) -> bool:
+    """
+    Проверяет условия If-None-Match и If-Modified-Since (RFC 9110, раздел 13).
+
+    If-Modified-Since учитывается, только если If-None-Match не передан.
+
+    :return: True, если у клиента актуальная копия и можно ответить 304.
+    """
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Точность даты в HTTP — секунда
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Слабое сравнение ETag из If-None-Match, как того требует RFC 9110."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _opaque(etag)
+    return any(_opaque(tag) == opaque for tag in if_none_match.split(","))
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # SQLite возвращает время без часового пояса; записи хранятся в UTC
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+# Больше диапазонов в одном запросе не обслуживаем — отдаём файл целиком.
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """Ни один из запрошенных диапазонов не пересекается с файлом."""
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    start: int
+    end: int  # включительно
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+    def content_range(self, size: int) -> str:
+        return f"bytes {self.start}-{self.end}/{size}"
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[List[ByteRange]]:
+    """
+    Разбирает заголовок Range (RFC 9110, раздел 14).
+
+    :param header: Значение заголовка Range.
+    :param size: Полный размер файла в байтах.
+    :return: Отсортированные и склеенные диапазоны или None,
+        если заголовок нужно проигнорировать и отдать файл целиком.
+    :raises RangeNotSatisfiable: Если ни один диапазон не попадает в файл.
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges: List[ByteRange] = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+
+        first, sep, last = item.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or not (first.isdigit() or last.isdigit()):
+            return None
+        if (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if not first:
+            # Суффиксный диапазон: последние N байт
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            ranges.append(ByteRange(max(size - suffix, 0), size - 1))
+            continue
+
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = min(int(last), size - 1) if last else size - 1
+        ranges.append(ByteRange(start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges = _coalesce(ranges)
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    return ranges
+
+
+def _coalesce(ranges: List[ByteRange]) -> List[ByteRange]:
+    """Склеивает пересекающиеся и соседние диапазоны."""
+    ranges = sorted(ranges, key=lambda r: r.start)
+    merged = [ranges[0]]
+    for current in ranges[1:]:
+        last = merged[-1]
+        if current.start <= last.end + 1:
+            merged[-1] = ByteRange(last.start, max(last.end, current.end))
+        else:
+            merged.append(current)
+    return merged
+
+
+def if_range_matches(if_range: Optional[str], etag: str) -> bool:
+    """
+    Проверяет условие If-Range.
+
+    Слабые ETag и даты не считаются совпадением — в этом случае
+    Range игнорируется и файл отдаётся целиком.
+    """
+    if if_range is None:
+        return True
+    return if_range.strip() == etag
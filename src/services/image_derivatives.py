@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from src.config import settings
+from src.models import AppExceptions
+from src.services.local_cache import local_cache
+from src.services.s3 import CloudStorageProvider
+
+logger = logging.getLogger(__name__)
+
+# Pillow — необязательная зависимость (poetry install --extras images)
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# Исходные форматы, из которых строятся варианты
+SOURCE_FORMATS = {"image/jpeg": "jpeg", "image/png": "png"}
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+
+@dataclass(frozen=True)
+class DerivativeSpec:
+    """
+    Вариант изображения: вписывается в width x height (0 — без ограничения)
+    с сохранением пропорций и сохраняется в format с качеством quality.
+    """
+
+    width: int
+    height: int
+    format: str
+    quality: int
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.format]
+
+    @property
+    def extension(self) -> str:
+        return ".jpg" if self.format == "jpeg" else f".{self.format}"
+
+    @property
+    def suffix(self) -> str:
+        return f"{self.width}x{self.height}-q{self.quality}{self.extension}"
+
+    def key_for(self, object_key: str) -> str:
+        """Ключ варианта рядом с оригиналом, локально и в бакете."""
+        return f"{object_key}.{self.suffix}"
+
+
+def parse_spec(
+    file_format: Optional[str],
+    width: Optional[int],
+    height: Optional[int],
+    format: Optional[str],
+    quality: Optional[int],
+) -> Optional[DerivativeSpec]:
+    """
+    Проверяет параметры варианта по разрешённым наборам.
+
+    Размеры, форматы и качество ограничены списками из настроек, так что
+    у файла не может появиться больше вариантов, чем их комбинаций.
+
+    :param file_format: MIME-тип оригинала.
+    :return: None, если вариант не запрошен.
+    :raises HTTPException: Если параметры не разрешены или оригинал — не изображение.
+    """
+    if width is None and height is None and format is None and quality is None:
+        return None
+    if not PILLOW_AVAILABLE:
+        raise AppExceptions.derivatives_unavailable()
+    if file_format not in SOURCE_FORMATS:
+        raise AppExceptions.derivative_not_allowed(
+            f"Variants are available only for {', '.join(SOURCE_FORMATS)}"
+        )
+
+    for name, value in (("width", width), ("height", height)):
+        if value is not None and value not in settings.IMAGE_DERIVATIVE_SIZES:
+            raise AppExceptions.derivative_not_allowed(
+                f"Unsupported {name}: {value}. Allowed: "
+                f"{', '.join(map(str, settings.IMAGE_DERIVATIVE_SIZES))}"
+            )
+    if format is not None and format not in settings.IMAGE_DERIVATIVE_FORMATS:
+        raise AppExceptions.derivative_not_allowed(
+            f"Unsupported format: {format}. Allowed: "
+            f"{', '.join(settings.IMAGE_DERIVATIVE_FORMATS)}"
+        )
+    if quality is not None and quality not in settings.IMAGE_DERIVATIVE_QUALITIES:
+        raise AppExceptions.derivative_not_allowed(
+            f"Unsupported quality: {quality}. Allowed: "
+            f"{', '.join(map(str, settings.IMAGE_DERIVATIVE_QUALITIES))}"
+        )
+
+    format = format or SOURCE_FORMATS[file_format]
+    if format == "png":
+        # PNG сжимается без потерь: качество не используется и не плодит варианты
+        quality = 0
+    elif quality is None:
+        quality = settings.IMAGE_DERIVATIVE_DEFAULT_QUALITY
+    return DerivativeSpec(
+        width=width or 0, height=height or 0, format=format, quality=quality
+    )
+
+
+def render(source_path: str, target_path: str, spec: DerivativeSpec) -> int:
+    """
+    Строит вариант изображения. Выполняется в процессе пула.
+
+    :return: Размер варианта в байтах.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if spec.width or spec.height:
+            image.thumbnail(
+                (spec.width or image.width, spec.height or image.height),
+                Image.Resampling.LANCZOS,
+            )
+        if spec.format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        options = {"optimize": True}
+        if spec.format != "png":
+            options["quality"] = spec.quality
+        image.save(target_path, format=spec.format.upper(), **options)
+    return os.path.getsize(target_path)
+
+
+class ImageDerivatives:
+    """
+    Построение вариантов изображений в пуле процессов.
+
+    Одновременные запросы одного варианта ждут одного построения.
+    Готовый вариант учитывается в локальном кэше и в фоне загружается
+    в бакет, откуда его можно вернуть после вытеснения.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Идущие построения по пути варианта
+        self._renders: Dict[str, asyncio.Future] = {}
+        self._uploads: Set[asyncio.Task] = set()
+
+    async def create(
+        self,
+        provider: CloudStorageProvider,
+        source_path: str,
+        target_path: str,
+        spec: DerivativeSpec,
+    ) -> None:
+        """
+        Строит вариант в target_path, если его ещё никто не строит.
+
+        :raises HTTPException: Если оригинал не удалось прочитать как изображение.
+        """
+        future = self._renders.get(target_path)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._create(provider, source_path, target_path, spec)
+            )
+            self._renders[target_path] = future
+            future.add_done_callback(lambda _: self._renders.pop(target_path, None))
+        await asyncio.shield(future)
+
+    async def close(self) -> None:
+        """Дожидается фоновых загрузок и останавливает пул."""
+        if self._uploads:
+            await asyncio.gather(*self._uploads, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _create(
+        self,
+        provider: CloudStorageProvider,
+        source_path: str,
+        target_path: str,
+        spec: DerivativeSpec,
+    ) -> None:
+        part_path = f"{target_path}.{uuid.uuid4().hex}.part"
+        try:
+            size = await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), render, source_path, part_path, spec
+            )
+            os.replace(part_path, target_path)
+        except Exception as e:
+            logger.warning(f"Failed to render {target_path}: {e}")
+            try:
+                os.remove(part_path)
+            except FileNotFoundError:
+                pass
+            raise AppExceptions.invalid_file_data()
+
+        key = os.path.basename(target_path)
+        await local_cache.add(key, size)
+        task = asyncio.create_task(self._upload(provider, key, target_path))
+        self._uploads.add(task)
+        task.add_done_callback(self._uploads.discard)
+
+    @staticmethod
+    async def _upload(provider: CloudStorageProvider, key: str, path: str) -> None:
+        try:
+            await provider.upload(key, path)
+        except Exception as e:
+            # Вариант остаётся только локально и не вытесняется, пока не попадёт
+            # в бакет: кэш проверит это сам при вытеснении
+            logger.error(f"Failed to upload derivative {key}: {e}")
+            return
+        await local_cache.mark_uploaded(key)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Запуск через spawn: дочерние процессы не наследуют потоки и цикл событий
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+
+image_derivatives = ImageDerivatives(max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, Request
+
+from src.config import settings
+from src.models import AppExceptions
+from src.services.s3 import CloudStorageProvider
+from src.services.sniff import SNIFF_BYTES, effective_type, sniff_type
+
+if TYPE_CHECKING:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+
+    from src.services.proceed_file import FileValidator
+else:
+    try:
+        import python_multipart as multipart
+        from python_multipart.multipart import parse_options_header
+    except ModuleNotFoundError:
+        import multipart
+        from multipart.multipart import parse_options_header
+
+
+@dataclass
+class IngestedFile:
+    """Файл из тела multipart-запроса, уже записанный в хранилище."""
+
+    file_uid: str
+    filename: str
+    content_type: str
+    file_path: str
+    size: int
+    digest: Optional[str] = None
+    stored_locally: bool = True
+    in_cloud: bool = False
+    # Тип, определённый по первым байтам содержимого
+    sniffed_type: Optional[str] = None
+
+
+class IngestSink(ABC):
+    """Куда пишется содержимое одного файла из запроса."""
+
+    @abstractmethod
+    async def write(self, data: memoryview) -> None: ...
+
+    @abstractmethod
+    async def commit(self) -> None:
+        """Файл принят целиком."""
+
+    @abstractmethod
+    async def discard(self) -> None:
+        """Удаляет всё записанное, в том числе после commit()."""
+
+
+class LocalFileSink(IngestSink):
+    """Пишет файл в .part рядом с итоговым путём и переименовывает при commit()."""
+
+    def __init__(self, file: IngestedFile):
+        self.file_path = file.file_path
+        self.part_path = f"{file.file_path}.part"
+        self._out = None
+
+    async def write(self, data: memoryview) -> None:
+        if self._out is None:
+            self._out = await aiofiles.open(self.part_path, mode="wb")
+        await self._out.write(data)
+
+    async def commit(self) -> None:
+        if self._out is None:
+            self._out = await aiofiles.open(self.part_path, mode="wb")
+        await self._out.close()
+        self._out = None
+        os.replace(self.part_path, self.file_path)
+
+    async def discard(self) -> None:
+        if self._out is not None:
+            await self._out.close()
+            self._out = None
+        for path in (self.part_path, self.file_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class CloudSink(IngestSink):
+    """Отправляет файл в облако multipart-загрузкой по мере приёма."""
+
+    def __init__(self, provider: CloudStorageProvider, file: IngestedFile, size_hint: int):
+        self.provider = provider
+        self.file_key = os.path.basename(file.file_path)
+        self._upload = provider.start_upload(self.file_key, size_hint)
+        self._committed = False
+
+    async def write(self, data: memoryview) -> None:
+        await self._upload.write(data)
+
+    async def commit(self) -> None:
+        await self._upload.complete()
+        self._committed = True
+
+    async def discard(self) -> None:
+        if self._committed:
+            await self.provider.delete(self.file_key)
+        else:
+            await self._upload.abort()
+
+
+class TeeSink(IngestSink):
+    """Пишет один поток сразу в несколько мест."""
+
+    def __init__(self, *sinks: IngestSink):
+        self.sinks = sinks
+
+    async def write(self, data: memoryview) -> None:
+        for sink in self.sinks:
+            await sink.write(data)
+
+    async def commit(self) -> None:
+        for sink in self.sinks:
+            await sink.commit()
+
+    async def discard(self) -> None:
+        for sink in self.sinks:
+            await sink.discard()
+
+
+class UploadedObjectSink(IngestSink):
+    """Объект, который клиент сам загрузил в облако: его можно только удалить."""
+
+    def __init__(self, provider: CloudStorageProvider, file: IngestedFile):
+        self.provider = provider
+        self.file_key = os.path.basename(file.file_path)
+
+    async def write(self, data: memoryview) -> None:
+        raise RuntimeError(f"Object {self.file_key} is already uploaded")
+
+    async def commit(self) -> None:
+        pass
+
+    async def discard(self) -> None:
+        await self.provider.delete(self.file_key)
+
+
+class StoredFiles:
+    """Файлы, уже лежащие в хранилище, с тем же способом отмены, что у MultipartIngestor."""
+
+    def __init__(
+        self,
+        files: List[IngestedFile],
+        sink_factory: Callable[[IngestedFile], IngestSink] = LocalFileSink,
+    ):
+        self.files = list(files)
+        self._sinks: List[IngestSink] = [sink_factory(file) for file in files]
+
+    async def discard(self) -> None:
+        for sink in self._sinks:
+            await sink.discard()
+        self.files, self._sinks = [], []
+
+    async def discard_file(self, file: IngestedFile) -> None:
+        index = self.files.index(file)
+        await self._sinks[index].discard()
+        del self.files[index], self._sinks[index]
+
+
+class _Part:
+    def __init__(self):
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.header_field = bytearray()
+        self.header_value = bytearray()
+
+
+class MultipartIngestor:
+    """
+    Разбирает multipart/form-data прямо из потока ASGI-запроса
+    и пишет файловые поля в хранилище без промежуточного спулинга.
+
+    Данные копятся в одном переиспользуемом буфере размером WRITE_CHUNK_SIZE
+    и передаются приёмнику (по умолчанию — файл в хранилище) крупными
+    блоками. Размер и, при необходимости, SHA-256 считаются на лету.
+
+    Тип файла определяется по первым байтам, а не со слов клиента. С валидатором
+    тип и размер проверяются по ходу приёма: неподходящий файл прерывает
+    чтение тела сразу, и соединение закрывается без дочитывания остатка.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        destination: str,
+        compute_digest: bool = False,
+        max_files: int = 1,
+        sink_factory: Callable[[IngestedFile], IngestSink] = LocalFileSink,
+        validator: Optional[FileValidator] = None,
+    ):
+        self.request = request
+        self.destination = destination
+        self.compute_digest = compute_digest
+        self.max_files = max_files
+        self.sink_factory = sink_factory
+        self.validator = validator
+
+        self.files: List[IngestedFile] = []
+        self._sinks: List[IngestSink] = []
+
+        self._buffer = bytearray(settings.WRITE_CHUNK_SIZE)
+        self._buffered = 0
+        self._events: List[tuple] = []
+        self._part: Optional[_Part] = None
+
+        self._current: Optional[IngestedFile] = None
+        self._sink: Optional[IngestSink] = None
+        self._hash = None
+        self._head = bytearray()
+        self._typed = False
+        self._body_read = False
+
+    async def ingest(self) -> List[IngestedFile]:
+        """
+        Читает тело запроса до конца.
+
+        :return: Записанные файлы в порядке следования в запросе.
+        :raises HTTPException: Если тело не является корректным multipart
+            или файл не прошёл проверку валидатором.
+        """
+        boundary = self._get_boundary()
+        parser = multipart.MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+        try:
+            async for chunk in self.request.stream():
+                try:
+                    parser.write(chunk)
+                except multipart.exceptions.MultipartParseError:
+                    raise AppExceptions.invalid_file_data()
+                await self._process_events()
+            self._body_read = True
+            parser.finalize()
+            await self._process_events()
+
+            if self._current is not None or not self.files:
+                raise AppExceptions.invalid_file_data()
+        except HTTPException as e:
+            await self.discard()
+            if not self._body_read:
+                # Остаток тела не читается: соединение после ответа закрывается
+                e.headers = {**(e.headers or {}), "Connection": "close"}
+            raise
+        except BaseException:
+            await self.discard()
+            raise
+
+        return self.files
+
+    async def discard(self) -> None:
+        """Удаляет всё, что успело записаться."""
+        sinks = self._sinks + ([self._sink] if self._sink else [])
+        for sink in sinks:
+            await sink.discard()
+        self._current, self._sink = None, None
+        self.files, self._sinks = [], []
+
+    async def discard_file(self, file: IngestedFile) -> None:
+        """Удаляет один из уже принятых файлов."""
+        index = self.files.index(file)
+        await self._sinks[index].discard()
+        del self.files[index], self._sinks[index]
+
+    def _get_boundary(self) -> bytes:
+        content_type = self.request.headers.get("content-type", "")
+        media_type, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise AppExceptions.invalid_file_data()
+        return boundary
+
+    # Колбэки парсера синхронные: события копятся и обрабатываются после write()
+
+    def _on_part_begin(self) -> None:
+        self._part = _Part()
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._part.header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._part.header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._part.headers.append(
+            (bytes(self._part.header_field).lower(), bytes(self._part.header_value))
+        )
+        self._part.header_field.clear()
+        self._part.header_value.clear()
+
+    def _on_headers_finished(self) -> None:
+        self._events.append(("begin", dict(self._part.headers)))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self._events.append(("data", memoryview(data)[start:end]))
+
+    def _on_part_end(self) -> None:
+        self._events.append(("end", None))
+
+    async def _process_events(self) -> None:
+        events, self._events = self._events, []
+        for kind, payload in events:
+            if kind == "begin":
+                await self._begin_file(payload)
+            elif kind == "data" and self._current is not None:
+                await self._write(payload)
+            elif kind == "end" and self._current is not None:
+                await self._end_file()
+
+    async def _begin_file(self, headers: dict) -> None:
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        if filename is None:
+            # Обычное поле формы
+            return
+
+        if len(self.files) >= self.max_files:
+            raise AppExceptions.invalid_file_data()
+
+        filename = filename.decode("utf-8", errors="replace")
+        file_uid = str(uuid.uuid4())
+        _, file_extension = os.path.splitext(filename)
+        self._current = IngestedFile(
+            file_uid=file_uid,
+            filename=filename,
+            content_type=headers.get(b"content-type", b"").decode("latin-1"),
+            file_path=os.path.join(self.destination, f"{file_uid}{file_extension}"),
+            size=0,
+        )
+        self._hash = hashlib.sha256() if self.compute_digest else None
+        self._head.clear()
+        self._typed = False
+        self._sink = self.sink_factory(self._current)
+
+    async def _write(self, data: memoryview) -> None:
+        self._current.size += len(data)
+        if self.validator is not None:
+            self.validator.check_size(self._current.size)
+        if not self._typed:
+            self._head += data[: SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._detect_type()
+        if self._hash is not None:
+            self._hash.update(data)
+
+        while data:
+            free = len(self._buffer) - self._buffered
+            taken = data[:free]
+            self._buffer[self._buffered : self._buffered + len(taken)] = taken
+            self._buffered += len(taken)
+            data = data[len(taken) :]
+            if self._buffered == len(self._buffer):
+                await self._flush()
+
+    async def _flush(self) -> None:
+        if self._buffered:
+            await self._sink.write(memoryview(self._buffer)[: self._buffered])
+            self._buffered = 0
+
+    def _detect_type(self) -> None:
+        self._typed = True
+        head = bytes(self._head)
+        self._current.sniffed_type = sniff_type(head)
+        self._current.content_type = effective_type(head, self._current.content_type)
+        if self.validator is not None:
+            self.validator.check_type(self._current.content_type)
+
+    async def _end_file(self) -> None:
+        if not self._typed:
+            # Файл короче SNIFF_BYTES
+            self._detect_type()
+        await self._flush()
+        await self._sink.commit()
+
+        if self._hash is not None:
+            self._current.digest = self._hash.hexdigest()
+
+        self.files.append(self._current)
+        self._sinks.append(self._sink)
+        self._current, self._sink = None, None
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.services import storage_state
+from src.services.storage_capacity import (
+    Reservation,
+    StorageCapacity,
+    storage_capacity,
+)
+
+logger = logging.getLogger(__name__)
+
+# Недописанные файлы старше этого возраста считаются брошенными
+STALE_PART_SECONDS = 60 * 60
+
+
+class LocalFileCache:
+    """
+    Локальное хранилище файлов как LRU-кэш перед облаком.
+
+    Индекс (размер, время последнего обращения, число обращений и признак
+    загрузки в облако) хранится в SQLite-файле внутри хранилища, поэтому
+    переживает перезапуск и общий для всех процессов приложения.
+    Удаляются только файлы, наличие которых в облаке подтверждено.
+    Место на томе учитывает capacity: под принимаемый файл оно
+    резервируется до конца записи.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int,
+        high_watermark: float,
+        low_watermark: float,
+        capacity: StorageCapacity,
+        confirm_uploaded: Callable[[str], Awaitable[bool]],
+        on_evicted: Optional[Callable[[str], Awaitable[None]]] = None,
+        index_name: str = ".cache_index.sqlite3",
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.capacity = capacity
+        self.confirm_uploaded = confirm_uploaded
+        self.on_evicted = on_evicted
+        self.index_name = index_name
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Обращения копятся в памяти и сбрасываются в индекс фоновой задачей
+        self._pending_touches: Dict[str, Tuple[float, int]] = {}
+        self._wakeup = asyncio.Event()
+
+    # Жизненный цикл
+
+    async def open(self) -> None:
+        await asyncio.to_thread(self._open)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def run(self, interval: float) -> None:
+        """Фоновая задача: сброс обращений в индекс и вытеснение по watermark."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+                if await self.used_bytes() > self.max_bytes * self.high_watermark:
+                    await self.evict(int(self.max_bytes * self.low_watermark))
+            except Exception as e:
+                logger.error(f"Local cache maintenance failed: {e}")
+
+    # Учёт файлов
+
+    async def add(self, name: str, size: int, uploaded: bool = False) -> None:
+        # Повторно сохранённый файл с тем же содержимым остаётся выгруженным
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO entries (name, size, last_access, hits, uploaded) "
+            "VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT (name) DO UPDATE SET size = excluded.size, "
+            "last_access = excluded.last_access, hits = hits + 1, "
+            "uploaded = MAX(uploaded, excluded.uploaded)",
+            (name, size, time.time(), int(uploaded)),
+        )
+        if await self.used_bytes() > self.max_bytes * self.high_watermark:
+            self._wakeup.set()
+
+    def touch(self, name: str) -> None:
+        _, hits = self._pending_touches.get(name, (0.0, 0))
+        self._pending_touches[name] = (time.time(), hits + 1)
+
+    async def mark_uploaded(self, name: str) -> None:
+        await asyncio.to_thread(
+            self._execute, "UPDATE entries SET uploaded = 1 WHERE name = ?", (name,)
+        )
+
+    async def remove(self, name: str) -> None:
+        """Удаляет файл, содержимое которого больше не нужно, вместе с записью индекса."""
+        self._pending_touches.pop(name, None)
+        await asyncio.to_thread(self._remove, name)
+
+    async def flush(self) -> None:
+        if not self._pending_touches:
+            return
+        touches, self._pending_touches = self._pending_touches, {}
+        await asyncio.to_thread(
+            self._executemany,
+            "UPDATE entries SET last_access = ?, hits = hits + ? WHERE name = ?",
+            [(at, hits, name) for name, (at, hits) in touches.items()],
+        )
+
+    async def used_bytes(self) -> int:
+        rows = await asyncio.to_thread(
+            self._query, "SELECT COALESCE(SUM(size), 0) FROM entries", ()
+        )
+        return rows[0][0] if rows else 0
+
+    # Вытеснение
+
+    async def make_room(self, nbytes: int) -> Optional[Reservation]:
+        """
+        Освобождает место под файл размером nbytes и резервирует его.
+
+        Учитывается и бюджет кэша, и реальный остаток тома за вычетом
+        мест, зарезервированных идущими загрузками.
+        :return: Резерв, который нужно освободить по окончании записи,
+            или None, если места не хватит даже после вытеснения.
+        """
+        used = await self.used_bytes()
+        reservation = await self.capacity.reserve(nbytes, self.max_bytes - used)
+        if reservation is not None:
+            return reservation
+
+        available, reserved = await self.capacity.usage()
+        overflow = max(used + reserved + nbytes - self.max_bytes, nbytes - available)
+        freed = await self.evict(used - overflow)
+        if freed >= overflow:
+            # Вытесненные файлы освободили место на томе
+            await self.capacity.sample()
+            reservation = await self.capacity.reserve(
+                nbytes, self.max_bytes - used + freed
+            )
+        if reservation is None:
+            logger.warning("Not enough free space to save the file")
+        return reservation
+
+    async def evict(self, target_bytes: int) -> int:
+        """
+        Удаляет давно не использованные файлы, пока объём кэша не станет
+        не больше target_bytes.
+
+        :return: Сколько байт освобождено.
+        """
+        await self.flush()
+        used = await self.used_bytes()
+        if used <= target_bytes:
+            return 0
+
+        candidates = await asyncio.to_thread(
+            self._query,
+            "SELECT name, size, uploaded FROM entries ORDER BY last_access",
+            (),
+        )
+
+        freed = 0
+        for name, size, uploaded in candidates:
+            if used - freed <= target_bytes:
+                break
+
+            if not uploaded:
+                try:
+                    uploaded = await self.confirm_uploaded(name)
+                except Exception as e:
+                    logger.warning(f"Failed to check {name} in cloud storage: {e}")
+                    continue
+                if not uploaded:
+                    continue
+                await self.mark_uploaded(name)
+
+            await asyncio.to_thread(self._remove, name)
+            freed += size
+            if self.on_evicted is not None:
+                await self.on_evicted(name)
+
+        if freed:
+            logger.info(f"Evicted {freed} bytes from local cache")
+        return freed
+
+    # Работа с индексом (выполняется в потоках)
+
+    def _open(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(self.root, self.index_name),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "name TEXT PRIMARY KEY, "
+            "size INTEGER NOT NULL, "
+            "last_access REAL NOT NULL, "
+            "hits INTEGER NOT NULL DEFAULT 0, "
+            "uploaded INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+        )
+        self._reconcile()
+
+    def _reconcile(self) -> None:
+        """Сверяет индекс с содержимым каталога после перезапуска."""
+        indexed = {name for (name,) in self._query("SELECT name FROM entries", ())}
+        present = set()
+        now = time.time()
+
+        with os.scandir(self.root) as it:
+            for entry in it:
+                # Служебные файлы (индекс, .gitkeep) в кэш не входят
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith(".part"):
+                    if now - stat.st_mtime > STALE_PART_SECONDS:
+                        os.remove(entry.path)
+                    continue
+
+                present.add(entry.name)
+                if entry.name not in indexed:
+                    self._execute(
+                        "INSERT OR IGNORE INTO entries (name, size, last_access) "
+                        "VALUES (?, ?, ?)",
+                        (entry.name, stat.st_size, max(stat.st_atime, stat.st_mtime)),
+                    )
+
+        self._executemany(
+            "DELETE FROM entries WHERE name = ?",
+            [(name,) for name in indexed - present],
+        )
+
+    def _remove(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+        self._execute("DELETE FROM entries WHERE name = ?", (name,))
+
+    # Пока индекс не открыт (lifespan не запускался), кэш ничего не учитывает
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def _executemany(self, sql: str, params: List[tuple]) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, params)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple) -> List[tuple]:
+        if self._conn is None:
+            return []
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+local_cache = LocalFileCache(
+    root=settings.STORAGE_PATH,
+    max_bytes=settings.CACHE_MAX_SIZE_MB * 1024 * 1024,
+    high_watermark=settings.CACHE_HIGH_WATERMARK,
+    low_watermark=settings.CACHE_LOW_WATERMARK,
+    capacity=storage_capacity,
+    confirm_uploaded=storage_state.confirm_in_cloud,
+    on_evicted=storage_state.mark_evicted,
+)
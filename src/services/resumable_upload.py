@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+import asyncio
+import glob
+import hashlib
+import logging
+import math
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import aiofiles
+from fastapi import Request
+from starlette.requests import ClientDisconnect
+
+from src.config import settings
+from src.db_conn import async_session_maker
+from src.models import AppExceptions, UploadSession
+from src.repositories import UploadSessionRepository
+from src.services.ingest import IngestedFile, StoredFiles, UploadedObjectSink
+from src.services.local_cache import local_cache
+from src.services.proceed_file import FileMetadata, FileValidator
+from src.services.s3 import CloudStorageProvider, cloud_provider
+from src.services.sniff import SNIFF_BYTES, effective_type, sniff_type
+from src.services.upload_file import UploadFileService
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Наибольший срок действия временной ссылки S3 (Signature V4)
+MAX_PRESIGN_SECONDS = 7 * 24 * 3600
+
+
+class ResumableUploadService:
+    """
+    Загрузка файла частями с возможностью продолжить после обрыва.
+
+    Части дописываются в промежуточный файл в STORAGE_PATH по смещению,
+    которое хранится в базе: каждая часть принимается в отдельный файл
+    и переносится на место, пока смещение заблокировано в базе. Имя промежуточного файла начинается с точки,
+    поэтому локальный кэш его не учитывает. После завершения файл проходит
+    тот же путь, что и обычная загрузка.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.repository = UploadSessionRepository(session)
+
+    async def create(
+        self,
+        filename: str,
+        content_type: str,
+        size: int,
+        validator: FileValidator,
+    ) -> UploadSession:
+        """
+        Начинает загрузку файла размером size.
+
+        :raises HTTPException: Если тип или размер файла недопустимы.
+        """
+        upload_id = uuid.uuid4().hex
+        # Размер и тип известны заранее, так что заведомо неподходящий файл
+        # отклоняется до передачи данных
+        validator.validate(
+            IngestedFile(
+                file_uid=upload_id,
+                filename=filename,
+                content_type=content_type,
+                file_path=staging_path(upload_id),
+                size=size,
+            )
+        )
+
+        upload = UploadSession(
+            id=upload_id,
+            filename=filename,
+            content_type=content_type,
+            upload_length=size,
+            offset=0,
+            expires_at=_expires_at(),
+        )
+        async with aiofiles.open(staging_path(upload_id), mode="wb"):
+            pass
+        try:
+            await self.repository.create(upload)
+        except RuntimeError:
+            _remove(staging_path(upload_id))
+            raise AppExceptions.internal_error()
+        return upload
+
+    async def get(self, upload_id: str) -> UploadSession:
+        upload = await self.repository.get(upload_id, _now())
+        if upload is None:
+            raise AppExceptions.upload_not_found()
+        return upload
+
+    async def append(self, upload_id: str, offset: int, request: Request) -> int:
+        """
+        Дописывает тело запроса с позиции offset.
+
+        Если клиент оборвал соединение, принятая часть всё равно засчитывается.
+
+        :return: Новое смещение загрузки.
+        :raises HTTPException: Если offset не совпадает с текущим смещением,
+            часть выходит за размер файла или лимит UPLOAD_CHUNK_MAX_MB
+            или для неё нет места на диске.
+        """
+        upload = await self.get(upload_id)
+        if offset != upload.offset:
+            raise AppExceptions.upload_offset_conflict(upload.offset)
+
+        max_chunk = min(
+            settings.UPLOAD_CHUNK_MAX_MB * 1024 * 1024, upload.upload_length - offset
+        )
+        content_length = request.headers.get("content-length")
+        if content_length is None:
+            raise AppExceptions.content_length_missing()
+        if not content_length.isdigit():
+            raise AppExceptions.invalid_file_data()
+        if int(content_length) > max_chunk:
+            raise AppExceptions.upload_chunk_too_large(max_chunk)
+
+        reservation = await local_cache.make_room(int(content_length))
+        if reservation is None:
+            raise AppExceptions.insufficient_storage()
+
+        # Часть сначала пишется в свой файл: параллельный запрос с тем же
+        # смещением не может испортить принятые данные, даже если проиграет
+        part_path = f"{staging_path(upload_id)}.{uuid.uuid4().hex}.part"
+        written = 0
+        disconnected = False
+        advanced = False
+        async with reservation:
+            try:
+                try:
+                    async with aiofiles.open(part_path, mode="wb") as part:
+                        async for chunk in request.stream():
+                            if written + len(chunk) > max_chunk:
+                                raise AppExceptions.upload_chunk_too_large(max_chunk)
+                            await part.write(chunk)
+                            written += len(chunk)
+                except ClientDisconnect:
+                    disconnected = True
+
+                new_offset = offset + written
+                advanced = await self.repository.advance(
+                    upload_id,
+                    offset,
+                    new_offset,
+                    _expires_at(),
+                    write=partial(
+                        asyncio.to_thread,
+                        _splice,
+                        part_path,
+                        staging_path(upload_id),
+                        offset,
+                    ),
+                )
+            except FileNotFoundError:
+                raise AppExceptions.upload_not_found()
+            except RuntimeError:
+                raise AppExceptions.internal_error()
+            finally:
+                reservation.keep(written if advanced else 0)
+                _remove(part_path)
+
+        if not advanced:
+            # Ту же часть параллельно записал другой запрос
+            upload = await self.get(upload_id)
+            raise AppExceptions.upload_offset_conflict(upload.offset)
+        if disconnected:
+            raise ClientDisconnect()
+        return new_offset
+
+    async def finalize(self, upload_id: str, validator: FileValidator) -> FileMetadata:
+        """
+        Завершает загрузку: файл проверяется и регистрируется как обычный.
+
+        :raises HTTPException: Если приняты не все байты файла.
+        """
+        upload = await self.get(upload_id)
+        if upload.offset != upload.upload_length:
+            raise AppExceptions.upload_offset_conflict(upload.offset)
+
+        file_uid = str(uuid.uuid4())
+        _, file_extension = os.path.splitext(upload.filename)
+        file_path = os.path.join(settings.STORAGE_PATH, f"{file_uid}{file_extension}")
+        try:
+            os.replace(staging_path(upload_id), file_path)
+        except FileNotFoundError:
+            # Загрузку уже завершил другой запрос
+            raise AppExceptions.upload_not_found()
+
+        # Заявленный при создании тип сверяется с содержимым
+        async with aiofiles.open(file_path, mode="rb") as stored:
+            head = await stored.read(SNIFF_BYTES)
+        file = IngestedFile(
+            file_uid=file_uid,
+            filename=upload.filename,
+            content_type=effective_type(head, upload.content_type),
+            file_path=file_path,
+            size=os.path.getsize(file_path),
+            sniffed_type=sniff_type(head),
+        )
+        if settings.DEDUPLICATE_UPLOADS:
+            file.digest = await asyncio.to_thread(_sha256, file_path)
+
+        try:
+            [file_metadata] = await UploadFileService.register_files(
+                [file], StoredFiles([file]), self.session, validator
+            )
+        finally:
+            await self.repository.delete(upload_id)
+        return file_metadata
+
+    async def cancel(self, upload_id: str) -> None:
+        if not await self.repository.delete(upload_id):
+            raise AppExceptions.upload_not_found()
+        _remove(staging_path(upload_id))
+
+
+class DirectUploadService:
+    """
+    Загрузка файла клиентом напрямую в бакет.
+
+    Сервис начинает multipart-загрузку и выдаёт временные ссылки на части,
+    клиент отправляет части в хранилище сам, после чего сервис завершает
+    загрузку и регистрирует файл. Идентификатор загрузки становится UID файла.
+    """
+
+    def __init__(self, provider: CloudStorageProvider, session: AsyncSession):
+        self.provider = provider
+        self.session = session
+        self.repository = UploadSessionRepository(session)
+
+    async def create(
+        self,
+        filename: str,
+        content_type: str,
+        size: int,
+        validator: FileValidator,
+    ) -> Tuple[UploadSession, int, List[str]]:
+        """
+        Начинает прямую загрузку файла размером size.
+
+        :return: Загрузка, размер части и ссылки на части по порядку номеров.
+        :raises HTTPException: Если тип или размер файла недопустимы.
+        """
+        file_uid = str(uuid.uuid4())
+        _, file_extension = os.path.splitext(filename)
+        storage_key = f"{file_uid}{file_extension}"
+        validator.validate(
+            IngestedFile(
+                file_uid=file_uid,
+                filename=filename,
+                content_type=content_type,
+                file_path=os.path.join(settings.STORAGE_PATH, storage_key),
+                size=size,
+            )
+        )
+
+        upload = UploadSession(
+            id=file_uid,
+            filename=filename,
+            content_type=content_type,
+            upload_length=size,
+            offset=0,
+            expires_at=_expires_at(),
+            storage_key=storage_key,
+        )
+        part_size = self.provider.part_size(size)
+        try:
+            upload.multipart_upload_id = await self.provider.create_multipart_upload(
+                storage_key
+            )
+            # Ссылки действуют, пока жива загрузка
+            part_urls = await self.provider.presigned_part_urls(
+                storage_key,
+                upload.multipart_upload_id,
+                math.ceil(size / part_size),
+                min(settings.UPLOAD_SESSION_TTL_HOURS * 3600, MAX_PRESIGN_SECONDS),
+            )
+            await self.repository.create(upload)
+        except Exception as e:
+            logger.error(f"Failed to start direct upload of {storage_key}: {e}")
+            if upload.multipart_upload_id is not None:
+                await self.provider.abort_multipart_upload(
+                    storage_key, upload.multipart_upload_id
+                )
+            raise AppExceptions.internal_error()
+        return upload, part_size, part_urls
+
+    async def complete(
+        self, upload_id: str, parts: Dict[int, str], validator: FileValidator
+    ) -> FileMetadata:
+        """
+        Собирает объект из отправленных частей и регистрирует файл.
+
+        :param parts: ETag частей по их номерам.
+        :raises HTTPException: Если части не совпадают с принятыми хранилищем
+            или собранный файл не прошёл проверку.
+        """
+        upload = await self.repository.get(upload_id, _now(), direct=True)
+        if upload is None:
+            raise AppExceptions.upload_not_found()
+
+        try:
+            await self.provider.complete_multipart_upload(
+                upload.storage_key,
+                upload.multipart_upload_id,
+                [
+                    {"PartNumber": part_number, "ETag": etag}
+                    for part_number, etag in sorted(parts.items())
+                ],
+            )
+        except FileNotFoundError:
+            raise AppExceptions.upload_parts_mismatch()
+
+        # Проверяются фактические размер и тип: клиент мог отправить не то,
+        # что заявил. Отклонённый объект удаляется из бакета при регистрации
+        size = await self.provider.object_size(upload.storage_key)
+        if size is None:
+            raise AppExceptions.upload_not_found()
+        try:
+            head = await self.provider.read_head(upload.storage_key, SNIFF_BYTES)
+        except FileNotFoundError:
+            raise AppExceptions.upload_not_found()
+        file = IngestedFile(
+            file_uid=upload.id,
+            filename=upload.filename,
+            content_type=effective_type(head, upload.content_type),
+            file_path=os.path.join(settings.STORAGE_PATH, upload.storage_key),
+            size=size,
+            stored_locally=False,
+            in_cloud=True,
+            sniffed_type=sniff_type(head),
+        )
+
+        try:
+            [file_metadata] = await UploadFileService.register_files(
+                [file],
+                StoredFiles([file], partial(UploadedObjectSink, self.provider)),
+                self.session,
+                validator,
+            )
+        finally:
+            await self.repository.delete(upload_id, direct=True)
+        return file_metadata
+
+    async def abort(self, upload_id: str) -> None:
+        upload = await self.repository.get(upload_id, _now(), direct=True)
+        if upload is None or not await self.repository.delete(upload_id, direct=True):
+            raise AppExceptions.upload_not_found()
+        await self.provider.abort_multipart_upload(
+            upload.storage_key, upload.multipart_upload_id
+        )
+
+
+def staging_path(upload_id: str) -> str:
+    return os.path.join(settings.STORAGE_PATH, f".upload-{upload_id}")
+
+
+async def sweep_expired() -> List[str]:
+    """
+    Удаляет просроченные загрузки вместе с промежуточными файлами
+    и частями прямых загрузок в бакете.
+    """
+    async with async_session_maker() as session:
+        uploads = await UploadSessionRepository(session).delete_expired(_now())
+    for upload in uploads:
+        if upload.multipart_upload_id is None:
+            # Части остаются, только если процесс упал во время их приёма
+            path = staging_path(upload.id)
+            for part_path in [path, *glob.glob(f"{glob.escape(path)}.*.part")]:
+                _remove(part_path)
+            continue
+        try:
+            await cloud_provider.abort_multipart_upload(
+                upload.storage_key, upload.multipart_upload_id
+            )
+        except Exception as e:
+            logger.warning(f"Failed to abort direct upload {upload.id}: {e}")
+    if uploads:
+        logger.info(f"Removed {len(uploads)} expired uploads")
+    return [upload.id for upload in uploads]
+
+
+async def run_sweeper(interval: float) -> None:
+    """Фоновая задача: периодическое удаление просроченных загрузок."""
+    while True:
+        try:
+            await sweep_expired()
+        except Exception as e:
+            logger.error(f"Failed to remove expired uploads: {e}")
+        await asyncio.sleep(interval)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _expires_at() -> datetime:
+    return _now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _splice(source: str, target: str, offset: int) -> None:
+    """Переносит принятую часть в промежуточный файл загрузки с позиции offset."""
+    with open(source, "rb") as part, open(target, "r+b") as staging:
+        staging.seek(offset)
+        shutil.copyfileobj(part, staging, settings.CHUNK_SIZE)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(settings.CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -1,4 +1,4 @@
 from .storage_interface import CloudStorageProvider
-from .yandex_s3 import YandexCloudProvider
+from .yandex_s3 import YandexCloudProvider, cloud_provider
 
-__all__ = ["YandexCloudProvider", "CloudStorageProvider"]
+__all__ = ["YandexCloudProvider", "CloudStorageProvider", "cloud_provider"]
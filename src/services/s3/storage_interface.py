@@ -1,7 +1,34 @@
 from abc import ABC, abstractmethod
+from contextlib import AbstractAsyncContextManager
+from typing import Any, Dict, List, Optional, Tuple
 
 class CloudStorageProvider(ABC):
     @abstractmethod
     async def upload(self, file_path: str, destination_name: str) -> None: ...
     @abstractmethod
     async def download(self, file_key: str, save_path: str) -> None: ...
+    @abstractmethod
+    def start_upload(self, filename_key: str, size_hint: int = 0) -> Any: ...
+    @abstractmethod
+    async def delete(self, file_key: str) -> None: ...
+    @abstractmethod
+    async def exists(self, file_key: str) -> bool: ...
+    @abstractmethod
+    def open_stream(self, file_key: str) -> AbstractAsyncContextManager[Tuple[int, Any]]: ...
+    @staticmethod
+    @abstractmethod
+    def part_size(file_size: int) -> int: ...
+    @abstractmethod
+    async def object_size(self, file_key: str) -> Optional[int]: ...
+    @abstractmethod
+    async def read_head(self, file_key: str, length: int) -> bytes: ...
+    @abstractmethod
+    async def presigned_download_url(self, file_key: str, filename: str, expires_in: int) -> str: ...
+    @abstractmethod
+    async def create_multipart_upload(self, file_key: str) -> str: ...
+    @abstractmethod
+    async def presigned_part_urls(self, file_key: str, upload_id: str, parts_count: int, expires_in: int) -> List[str]: ...
+    @abstractmethod
+    async def complete_multipart_upload(self, file_key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None: ...
+    @abstractmethod
+    async def abort_multipart_upload(self, file_key: str, upload_id: str) -> None: ...
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from aiobotocore.client import AioBaseClient
+
+from src.config import settings
+from src.metrics import s3_request
+
+if TYPE_CHECKING:
+    from src.services.s3.yandex_s3 import YandexCloudProvider
+
+
+class StreamingUpload:
+    """
+    Загрузка в облако из потока данных заранее неизвестной длины.
+
+    Данные копятся до размера части, после чего часть уходит в облако
+    в фоне. Одновременно загружается не больше S3_UPLOAD_CONCURRENCY частей:
+    write() ждёт свободного слота, так что память ограничена.
+    Если всё тело уместилось в одну часть, используется один PutObject.
+    """
+
+    def __init__(self, provider: YandexCloudProvider, filename_key: str, part_size: int):
+        self.provider = provider
+        self.filename_key = filename_key
+        self.part_size = part_size
+        self.size = 0
+
+        self._buffer = bytearray()
+        self._client: Optional[AioBaseClient] = None
+        self._exit_stack = AsyncExitStack()
+        self._upload_id: Optional[str] = None
+        self._slots = asyncio.Semaphore(settings.S3_UPLOAD_CONCURRENCY)
+        self._tasks: List[asyncio.Task] = []
+
+    async def write(self, data: memoryview | bytes) -> None:
+        self.size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            await self._start_part(part)
+
+    async def complete(self) -> None:
+        """Дозагружает остаток и завершает загрузку объекта."""
+        try:
+            client = await self._get_client()
+            if self._upload_id is None:
+                with s3_request("put_object"):
+                    await client.put_object(
+                        Body=bytes(self._buffer),
+                        Key=self.filename_key,
+                        Bucket=settings.BUCKET_NAME,
+                    )
+                return
+
+            if self._buffer:
+                await self._start_part(bytes(self._buffer))
+                self._buffer.clear()
+
+            parts_info: List[Dict[str, Any]] = list(await asyncio.gather(*self._tasks))
+            await self.provider._complete_multipart_upload(
+                client, self.filename_key, self._upload_id, parts_info
+            )
+        except BaseException:
+            await self.abort()
+            raise
+        await self._exit_stack.aclose()
+
+    async def abort(self) -> None:
+        """Отменяет загрузку и освобождает клиент."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._buffer.clear()
+
+        if self._upload_id is not None:
+            await self.provider._abort_multipart_upload(
+                self._client, self.filename_key, self._upload_id
+            )
+            self._upload_id = None
+        await self._exit_stack.aclose()
+
+    async def _get_client(self) -> AioBaseClient:
+        if self._client is None:
+            self._client = await self._exit_stack.enter_async_context(
+                self.provider._get_client()
+            )
+        return self._client
+
+    async def _start_part(self, part: bytes) -> None:
+        # Ошибка уже отправленной части прерывает загрузку сразу
+        for task in self._tasks:
+            if task.done() and task.exception() is not None:
+                raise task.exception()
+
+        client = await self._get_client()
+        if self._upload_id is None:
+            self._upload_id = await self.provider._initiate_multipart_upload(
+                client, self.filename_key
+            )
+
+        await self._slots.acquire()
+        part_number = len(self._tasks) + 1
+        self._tasks.append(
+            asyncio.create_task(self._upload_part(client, part_number, part))
+        )
+
+    async def _upload_part(
+        self, client: AioBaseClient, part_number: int, part: bytes
+    ) -> Dict[str, Any]:
+        try:
+            with s3_request("upload_part"):
+                response = await client.upload_part(
+                    Body=part,
+                    UploadId=self._upload_id,
+                    PartNumber=part_number,
+                    Key=self.filename_key,
+                    Bucket=settings.BUCKET_NAME,
+                )
+        finally:
+            self._slots.release()
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
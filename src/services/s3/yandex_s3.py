@@ -1,4 +1,11 @@
-from typing import Any, Dict, List
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
 
 import aiobotocore
 import aiobotocore.client
@@ -6,9 +13,19 @@ import aiobotocore.session
 from botocore.exceptions import ClientError
 import aiofiles
 from aiobotocore.client import AioBaseClient
+from aiobotocore.config import AioConfig
 
 from src.config import settings
+from src.metrics import observe_transfer, s3_request, stage
 from src.services.s3.storage_interface import CloudStorageProvider
+from src.services.s3.streaming_upload import StreamingUpload
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Ограничения S3 на Multipart Upload
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10_000
 
 
 class YandexCloudProvider(CloudStorageProvider):
@@ -18,25 +35,138 @@ class YandexCloudProvider(CloudStorageProvider):
             "aws_secret_access_key": settings.AWS_SECRET_ACCESS_KEY,
             "aws_access_key_id": settings.AWS_ACCESS_KEY_ID,
             "endpoint_url": settings.AWS_S3_ENDPOINT_URL,
+            "config": AioConfig(max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS),
         }
 
+        self._client: Optional[AioBaseClient] = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+
+    async def connect(self) -> None:
+        """
+        Открывает долгоживущий клиент S3 с пулом соединений.
+
+        Вызывается один раз на процесс: в lifespan приложения и при старте
+        воркера Celery. Без подключения каждая операция создаёт свой клиент.
+        """
+        if self._client is not None:
+            return
+
+        exit_stack = AsyncExitStack()
+        session = aiobotocore.session.AioSession()
+        self._client = await exit_stack.enter_async_context(
+            session.create_client("s3", **self.s3_config)
+        )
+        self._exit_stack = exit_stack
+
+    async def close(self) -> None:
+        """Закрывает клиент и соединения пула."""
+        if self._exit_stack is None:
+            return
+
+        exit_stack, self._exit_stack, self._client = self._exit_stack, None, None
+        await exit_stack.aclose()
+
+    @asynccontextmanager
+    async def _get_client(self) -> AsyncIterator[AioBaseClient]:
+        if self._client is not None:
+            yield self._client
+            return
+
+        session = aiobotocore.session.AioSession()
+        async with session.create_client("s3", **self.s3_config) as client:
+            yield client
+
     async def upload(self, filename_key: str, file_path: str) -> None:
         """
-        Загружает файл в облако Яндекс S3 с использованием Multipart Upload.
+        Загружает файл в облако Яндекс S3.
+
+        Файлы не больше одной части отправляются одним PutObject,
+        остальные — через Multipart Upload с параллельной загрузкой частей.
 
         :param filename_key: Имя файла в облаке (ключ).
         :param file_path: Локальный путь к файлу.
         """
-        session = aiobotocore.session.AioSession()
+        file_size = os.path.getsize(file_path)
+        part_size = self.part_size(file_size)
+        start = time.perf_counter()
+        with stage("cloud_upload", "s3_upload"):
+            async with self._get_client() as client:
+                if file_size <= part_size:
+                    await self._put_object(client, filename_key, file_path)
+                else:
+                    await self._upload_multipart(
+                        client, filename_key, file_path, file_size, part_size
+                    )
+        observe_transfer("s3_upload", file_size, time.perf_counter() - start)
 
-        async with session.create_client("s3", **self.s3_config) as client:
-            upload_id = await self._initiate_multipart_upload(client, filename_key)
+    async def _upload_multipart(
+        self,
+        client: AioBaseClient,
+        filename_key: str,
+        file_path: str,
+        file_size: int,
+        part_size: int,
+    ) -> None:
+        upload_id = await self._initiate_multipart_upload(client, filename_key)
+        try:
             parts_info = await self._upload_parts(
-                client, filename_key, upload_id, file_path
+                client, filename_key, upload_id, file_path, file_size, part_size
             )
             await self._complete_multipart_upload(
                 client, filename_key, upload_id, parts_info
             )
+        except BaseException:
+            await self._abort_multipart_upload(client, filename_key, upload_id)
+            raise
+
+    def start_upload(self, filename_key: str, size_hint: int = 0) -> StreamingUpload:
+        """
+        Начинает загрузку в облако из потока данных.
+
+        :param filename_key: Имя файла в облаке (ключ).
+        :param size_hint: Ожидаемый размер (например, из Content-Length)
+            для выбора размера части.
+        """
+        return StreamingUpload(self, filename_key, self.part_size(size_hint))
+
+    @staticmethod
+    def part_size(file_size: int) -> int:
+        """
+        Подбирает размер части под размер файла.
+
+        Берётся READ_CHUNK_SIZE, но не меньше минимальной части S3 (5 MB)
+        и не меньше, чем нужно, чтобы уложиться в 10 000 частей.
+
+        :param file_size: Размер файла в байтах.
+        :return: Размер части в байтах, кратный мегабайту.
+        """
+        part_size = max(
+            settings.READ_CHUNK_SIZE,
+            MIN_PART_SIZE,
+            math.ceil(file_size / MAX_PARTS),
+        )
+        return math.ceil(part_size / MB) * MB
+
+    @staticmethod
+    async def _put_object(
+        client: AioBaseClient, filename_key: str, file_path: str
+    ) -> None:
+        """
+        Загружает небольшой файл одним запросом.
+
+        :param client: Клиент S3.
+        :param filename_key: Имя файла в облаке (ключ).
+        :param file_path: Путь к локальному файлу для загрузки.
+        """
+        async with aiofiles.open(file_path, mode="rb") as file:
+            contents = await file.read()
+
+        with s3_request("put_object"):
+            await client.put_object(
+                Body=contents,
+                Key=filename_key,
+                Bucket=settings.BUCKET_NAME,
+            )
 
     @staticmethod
     async def _initiate_multipart_upload(
@@ -49,50 +179,62 @@ class YandexCloudProvider(CloudStorageProvider):
         :param filename_key: Имя файла в облаке (ключ).
         :return: Идентификатор загрузки (Upload ID).
         """
-        response = await client.create_multipart_upload(
-            Key=filename_key,
-            Bucket=settings.BUCKET_NAME,
-        )
+        with s3_request("create_multipart_upload"):
+            response = await client.create_multipart_upload(
+                Key=filename_key,
+                Bucket=settings.BUCKET_NAME,
+            )
         return response["UploadId"]
 
     @staticmethod
     async def _upload_parts(
-        client: AioBaseClient, filename_key: str, upload_id: str, file_path: str
+        client: AioBaseClient,
+        filename_key: str,
+        upload_id: str,
+        file_path: str,
+        file_size: int,
+        part_size: int,
     ) -> List[Dict[str, Any]]:
         """
-        Загружает файл по частям.
+        Загружает файл по частям параллельно.
+
+        Одновременно в памяти находится не больше S3_UPLOAD_CONCURRENCY частей:
+        часть читается с диска только после получения слота.
 
         :param client: Клиент S3.
         :param filename_key: Имя файла в облаке (ключ).
         :param upload_id: Идентификатор загрузки (Upload ID).
         :param file_path: Путь к локальному файлу для загрузки.
+        :param file_size: Размер файла в байтах.
+        :param part_size: Размер части в байтах.
         :return: Информация о загруженных частях.
         """
-        parts_info = []
-        part_number = 0
+        slots = asyncio.Semaphore(settings.S3_UPLOAD_CONCURRENCY)
 
-        async with aiofiles.open(file_path, mode="rb") as file:
-            while True:
-                contents = await file.read(settings.READ_CHUNK_SIZE)
-                if not contents:
-                    break
-
-                part_number += 1
-                response = await client.upload_part(
-                    Body=contents,
-                    UploadId=upload_id,
-                    PartNumber=part_number,
-                    Key=filename_key,
-                    Bucket=settings.BUCKET_NAME,
-                )
-                parts_info.append(
-                    {
-                        "PartNumber": part_number,
-                        "ETag": response["ETag"],
-                    }
+        async def upload_part(fd: int, part_number: int) -> Dict[str, Any]:
+            async with slots:
+                contents = await asyncio.to_thread(
+                    os.pread, fd, part_size, (part_number - 1) * part_size
                 )
+                with s3_request("upload_part"):
+                    response = await client.upload_part(
+                        Body=contents,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Key=filename_key,
+                        Bucket=settings.BUCKET_NAME,
+                    )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        parts_count = math.ceil(file_size / part_size)
+        with open(file_path, mode="rb") as file:
+            async with asyncio.TaskGroup() as group:
+                tasks = [
+                    group.create_task(upload_part(file.fileno(), part_number))
+                    for part_number in range(1, parts_count + 1)
+                ]
 
-        return parts_info
+        return [task.result() for task in tasks]
 
     async def _complete_multipart_upload(
         self,
@@ -109,21 +251,230 @@ class YandexCloudProvider(CloudStorageProvider):
         :param upload_id: Идентификатор загрузки (Upload ID).
         :param parts_info: Информация о загруженных частях.
         """
-        await client.complete_multipart_upload(
-            UploadId=upload_id,
-            Key=filename_key,
-            Bucket=settings.BUCKET_NAME,
-            MultipartUpload={"Parts": parts_info},
-        )
+        with s3_request("complete_multipart_upload"):
+            await client.complete_multipart_upload(
+                UploadId=upload_id,
+                Key=filename_key,
+                Bucket=settings.BUCKET_NAME,
+                MultipartUpload={"Parts": parts_info},
+            )
+
+    @staticmethod
+    async def _abort_multipart_upload(
+        client: AioBaseClient, filename_key: str, upload_id: str
+    ) -> None:
+        """
+        Отменяет multipart-загрузку, чтобы бакет не хранил брошенные части.
+
+        :param client: Клиент S3.
+        :param filename_key: Имя файла в облаке (ключ).
+        :param upload_id: Идентификатор загрузки (Upload ID).
+        """
+        try:
+            with s3_request("abort_multipart_upload"):
+                await client.abort_multipart_upload(
+                    UploadId=upload_id,
+                    Key=filename_key,
+                    Bucket=settings.BUCKET_NAME,
+                )
+        except ClientError as e:
+            logger.warning(f"Failed to abort multipart upload {upload_id}: {e}")
 
     async def download(self, file_key: str, save_path: str) -> None:
-        session = aiobotocore.session.AioSession()
+        async with self.open_stream(file_key) as (_, body):
+            async with aiofiles.open(save_path, mode="wb") as local_file:
+                while chunk := await body.read(settings.CHUNK_SIZE):
+                    await local_file.write(chunk)
 
-        async with session.create_client("s3", **self.s3_config) as client:
+    async def delete(self, file_key: str) -> None:
+        """
+        Удаляет объект из бакета.
+
+        :param file_key: Имя файла в облаке (ключ).
+        """
+        async with self._get_client() as client:
+            with s3_request("delete_object"):
+                await client.delete_object(Bucket=settings.BUCKET_NAME, Key=file_key)
+
+    async def exists(self, file_key: str) -> bool:
+        """
+        Проверяет, что объект уже лежит в бакете.
+
+        :param file_key: Имя файла в облаке (ключ).
+        """
+        async with self._get_client() as client:
+            try:
+                with s3_request("head_object"):
+                    await client.head_object(Bucket=settings.BUCKET_NAME, Key=file_key)
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    return False
+                raise
+        return True
+
+    async def object_size(self, file_key: str) -> Optional[int]:
+        """
+        Размер объекта в бакете.
+
+        :param file_key: Имя файла в облаке (ключ).
+        :return: Размер в байтах или None, если объекта нет.
+        """
+        async with self._get_client() as client:
             try:
-                response = await client.get_object(
-                    Bucket=settings.BUCKET_NAME, Key=file_key
+                with s3_request("head_object"):
+                    response = await client.head_object(
+                        Bucket=settings.BUCKET_NAME, Key=file_key
+                    )
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    return None
+                raise
+        return response["ContentLength"]
+
+    async def read_head(self, file_key: str, length: int) -> bytes:
+        """
+        Первые length байт объекта (запрос GET с Range).
+
+        :param file_key: Имя файла в облаке (ключ).
+        :return: Начало объекта; короче length, если короче сам объект.
+        :raises FileNotFoundError: Если объекта нет в бакете.
+        """
+        async with self._get_client() as client:
+            try:
+                with s3_request("get_object"):
+                    response = await client.get_object(
+                        Bucket=settings.BUCKET_NAME,
+                        Key=file_key,
+                        Range=f"bytes=0-{length - 1}",
+                    )
+                    async with response["Body"] as body:
+                        return await body.read()
+            except ClientError as e:
+                error_code = e.response["Error"]["Code"]
+                if error_code == "NoSuchKey":
+                    raise FileNotFoundError(
+                        f"Файл {file_key} не найден в бакете {settings.BUCKET_NAME}."
+                    )
+                if error_code == "InvalidRange":
+                    # Пустой объект: диапазону нечего вернуть
+                    return b""
+                raise
+
+    async def presigned_download_url(
+        self, file_key: str, filename: str, expires_in: int
+    ) -> str:
+        """
+        Временная ссылка на скачивание объекта напрямую из бакета.
+
+        Хранилище отдаёт объект с Content-Disposition, в котором указано
+        исходное имя файла.
+
+        :param file_key: Имя файла в облаке (ключ).
+        :param filename: Имя, под которым клиент сохранит файл.
+        :param expires_in: Срок действия ссылки в секундах.
+        """
+        async with self._get_client() as client:
+            return await client.generate_presigned_url(
+                "get_object",
+                Params={
+                    "Bucket": settings.BUCKET_NAME,
+                    "Key": file_key,
+                    "ResponseContentDisposition": (
+                        f"attachment; filename*=UTF-8''{quote(filename)}"
+                    ),
+                    "ResponseContentType": "application/octet-stream",
+                },
+                ExpiresIn=expires_in,
+            )
+
+    async def create_multipart_upload(self, file_key: str) -> str:
+        """
+        Начинает multipart-загрузку, части которой клиент отправит сам.
+
+        :param file_key: Имя файла в облаке (ключ).
+        :return: Идентификатор загрузки (Upload ID).
+        """
+        async with self._get_client() as client:
+            return await self._initiate_multipart_upload(client, file_key)
+
+    async def presigned_part_urls(
+        self, file_key: str, upload_id: str, parts_count: int, expires_in: int
+    ) -> List[str]:
+        """
+        Временные ссылки для загрузки частей запросами PUT.
+
+        :param file_key: Имя файла в облаке (ключ).
+        :param upload_id: Идентификатор загрузки (Upload ID).
+        :param parts_count: Число частей.
+        :param expires_in: Срок действия ссылок в секундах.
+        :return: Ссылки в порядке номеров частей, начиная с первой.
+        """
+        async with self._get_client() as client:
+            return [
+                await client.generate_presigned_url(
+                    "upload_part",
+                    Params={
+                        "Bucket": settings.BUCKET_NAME,
+                        "Key": file_key,
+                        "UploadId": upload_id,
+                        "PartNumber": part_number,
+                    },
+                    ExpiresIn=expires_in,
+                )
+                for part_number in range(1, parts_count + 1)
+            ]
+
+    async def complete_multipart_upload(
+        self, file_key: str, upload_id: str, parts: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Завершает multipart-загрузку, части которой отправил клиент.
+
+        :param file_key: Имя файла в облаке (ключ).
+        :param upload_id: Идентификатор загрузки (Upload ID).
+        :param parts: Номера частей и их ETag.
+        :raises FileNotFoundError: Если загрузки нет или части не совпадают.
+        """
+        async with self._get_client() as client:
+            try:
+                await self._complete_multipart_upload(
+                    client, file_key, upload_id, parts
                 )
+            except ClientError as e:
+                error_code = e.response["Error"]["Code"]
+                if error_code in ("NoSuchUpload", "InvalidPart", "InvalidPartOrder"):
+                    raise FileNotFoundError(
+                        f"Загрузка {upload_id} файла {file_key} не найдена "
+                        f"или не совпадает с частями: {error_code}."
+                    )
+                raise
+
+    async def abort_multipart_upload(self, file_key: str, upload_id: str) -> None:
+        """
+        Отменяет multipart-загрузку и удаляет принятые части.
+
+        :param file_key: Имя файла в облаке (ключ).
+        :param upload_id: Идентификатор загрузки (Upload ID).
+        """
+        async with self._get_client() as client:
+            await self._abort_multipart_upload(client, file_key, upload_id)
+
+    @asynccontextmanager
+    async def open_stream(self, file_key: str) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Открывает объект из бакета для потокового чтения.
+
+        :param file_key: Имя файла в облаке (ключ).
+        :return: Размер объекта и поток с его содержимым.
+        :raises FileNotFoundError: Если объекта нет в бакете.
+        """
+        async with self._get_client() as client:
+            try:
+                # До получения заголовков ответа, без чтения тела
+                with s3_request("get_object"):
+                    response = await client.get_object(
+                        Bucket=settings.BUCKET_NAME, Key=file_key
+                    )
             except ClientError as e:
                 error_code = e.response["Error"]["Code"]
                 if error_code == "NoSuchKey":
@@ -133,6 +484,9 @@ class YandexCloudProvider(CloudStorageProvider):
                 else:
                     raise
 
-            async with aiofiles.open(save_path, mode="wb") as local_file:
-                while chunk := await response["Body"].read(settings.CHUNK_SIZE):
-                    await local_file.write(chunk)
+            async with response["Body"] as body:
+                yield response["ContentLength"], body
+
+
+# Общий провайдер процесса: подключается в lifespan и в воркерах Celery
+cloud_provider = YandexCloudProvider()
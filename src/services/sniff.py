@@ -0,0 +1,51 @@
+from typing import Optional
+
+# Сколько первых байт файла нужно для определения типа
+SNIFF_BYTES = 16
+
+# Сигнатуры в начале файла: (смещение, байты) -> MIME-тип
+SIGNATURES = [
+    ((0, b"\xff\xd8\xff"), "image/jpeg"),
+    ((0, b"\x89PNG\r\n\x1a\n"), "image/png"),
+    ((0, b"GIF87a"), "image/gif"),
+    ((0, b"GIF89a"), "image/gif"),
+    ((8, b"WEBP"), "image/webp"),
+    ((0, b"%PDF-"), "application/pdf"),
+    ((0, b"PK\x03\x04"), "application/zip"),
+    ((0, b"\x1f\x8b"), "application/gzip"),
+]
+
+# Типы, которые можно распознать по сигнатуре
+SNIFFABLE_TYPES = {content_type for _, content_type in SIGNATURES}
+
+
+def sniff_type(head: bytes) -> Optional[str]:
+    """
+    Определяет тип содержимого по первым байтам файла.
+
+    :param head: Начало файла (не меньше SNIFF_BYTES байт, если файл не короче).
+    :return: MIME-тип или None, если сигнатура не известна.
+    """
+    for (offset, magic), content_type in SIGNATURES:
+        if head[offset : offset + len(magic)] == magic:
+            # WEBP — частный случай RIFF
+            if content_type == "image/webp" and not head.startswith(b"RIFF"):
+                continue
+            return content_type
+    return None
+
+
+def effective_type(head: bytes, declared: str) -> str:
+    """
+    Тип файла, которому можно доверять.
+
+    Заявленный клиентом тип принимается, только если его нельзя проверить
+    по сигнатуре; иначе берётся определённый по содержимому.
+    """
+    sniffed = sniff_type(head)
+    if sniffed is not None:
+        return sniffed
+    if declared in SNIFFABLE_TYPES:
+        # Заявлен тип с сигнатурой, но содержимое ей не соответствует
+        return "application/octet-stream"
+    return declared
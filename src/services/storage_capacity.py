@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+from typing import Callable, Optional, Tuple, TypeVar
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Reservation:
+    """
+    Место на томе хранилища, зарезервированное под запись файлов.
+
+    Освобождается при выходе из `async with`: записанные и оставшиеся
+    на диске байты (keep) учитываются как занятые до следующего замера.
+    """
+
+    def __init__(
+        self, capacity: StorageCapacity, reservation_id: Optional[int], size: int
+    ):
+        self.capacity = capacity
+        self.reservation_id = reservation_id
+        self.size = size
+        self.kept = 0
+
+    def keep(self, nbytes: int) -> None:
+        """Сколько байт из зарезервированных осталось на диске после записи."""
+        self.kept = nbytes
+
+    async def release(self) -> None:
+        if self.reservation_id is None:
+            return
+        reservation_id, self.reservation_id = self.reservation_id, None
+        await self.capacity.release(reservation_id, self.kept)
+
+    async def __aenter__(self) -> Reservation:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.release()
+
+
+class StorageCapacity:
+    """
+    Учёт свободного места на томе хранилища с резервированием под загрузки.
+
+    Свободное место замеряет фоновая задача (statvfs), а загрузка перед
+    приёмом атомарно резервирует объём тела запроса против остатка:
+    замер минус записанное после него, резервы других загрузок
+    и min_free_bytes. Резервы хранятся в SQLite-файле внутри хранилища
+    и общие для всех процессов приложения; резервы завершившихся
+    процессов снимаются при замере.
+
+    Байты, записанные во время замера, учитываются дважды (в замере
+    и в резерве или в записанном), так что до следующего замера
+    оценка остатка консервативна.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        min_free_bytes: int,
+        index_name: str = ".capacity.sqlite3",
+    ):
+        self.root = root
+        self.min_free_bytes = min_free_bytes
+        self.index_name = index_name
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._host = socket.gethostname()
+
+    # Жизненный цикл
+
+    async def open(self) -> None:
+        await asyncio.to_thread(self._open)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def run(self, interval: float) -> None:
+        """Фоновая задача: замер свободного места на томе."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.error(f"Failed to sample free space of {self.root}: {e}")
+
+    # Резервирование
+
+    async def reserve(
+        self, nbytes: int, limit: Optional[int] = None
+    ) -> Optional[Reservation]:
+        """
+        Резервирует nbytes, если их вмещает остаток тома.
+
+        :param limit: Дополнительный предел суммы всех резервов
+            (остаток бюджета локального кэша).
+        :return: None, если места не хватает.
+        """
+        if nbytes <= 0:
+            return Reservation(self, None, 0)
+        fits, reservation_id = await asyncio.to_thread(self._reserve, nbytes, limit)
+        return Reservation(self, reservation_id, nbytes) if fits else None
+
+    async def release(self, reservation_id: int, kept: int) -> None:
+        if self._conn is None:
+            return
+        await asyncio.to_thread(
+            self._transaction, lambda conn: self._release(conn, reservation_id, kept)
+        )
+
+    async def usage(self) -> Tuple[int, int]:
+        """
+        :return: Остаток тома, доступный для новых резервов,
+            и сумма действующих резервов.
+        """
+        if self._conn is None:
+            return await asyncio.to_thread(self._disk_free) - self.min_free_bytes, 0
+        return await asyncio.to_thread(self._transaction, self._usage)
+
+    async def sample(self) -> None:
+        """Замеряет свободное место и снимает резервы завершившихся процессов."""
+        if self._conn is None:
+            return
+        await asyncio.to_thread(self._transaction, self._sample)
+
+    # Работа с файлом учёта (выполняется в потоках)
+
+    def _open(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(self.root, self.index_name),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Резервы не нужны после перезапуска, так что fsync на фиксацию лишний
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "host TEXT NOT NULL, "
+            "pid INTEGER NOT NULL, "
+            "size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS volume ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), "
+            "free INTEGER NOT NULL, "
+            "written INTEGER NOT NULL)"
+        )
+        # После перезапуска контейнера PID (часто 1) совпадает с прежним
+        self._conn.execute(
+            "DELETE FROM reservations WHERE host = ? AND pid = ?",
+            (self._host, os.getpid()),
+        )
+        self._transaction(self._sample)
+
+    def _reserve(
+        self, nbytes: int, limit: Optional[int]
+    ) -> Tuple[bool, Optional[int]]:
+        if self._conn is None:
+            # Пока файл учёта не открыт (lifespan не запускался), место
+            # проверяется замером без резерва
+            free = self._disk_free() - self.min_free_bytes
+            return nbytes <= free and (limit is None or nbytes <= limit), None
+
+        def reserve(conn: sqlite3.Connection) -> Tuple[bool, Optional[int]]:
+            available, reserved = self._usage(conn)
+            if nbytes > available or (limit is not None and reserved + nbytes > limit):
+                return False, None
+            cursor = conn.execute(
+                "INSERT INTO reservations (host, pid, size) VALUES (?, ?, ?)",
+                (self._host, os.getpid(), nbytes),
+            )
+            return True, cursor.lastrowid
+
+        return self._transaction(reserve)
+
+    def _release(self, conn: sqlite3.Connection, reservation_id: int, kept: int) -> None:
+        conn.execute("DELETE FROM reservations WHERE id = ?", (reservation_id,))
+        conn.execute("UPDATE volume SET written = written + ?", (kept,))
+
+    def _usage(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        free, written = conn.execute("SELECT free, written FROM volume").fetchone()
+        (reserved,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM reservations"
+        ).fetchone()
+        return free - written - reserved - self.min_free_bytes, reserved
+
+    def _sample(self, conn: sqlite3.Connection) -> None:
+        # Под блокировкой записи резервы не снимаются, пока идёт замер
+        conn.execute(
+            "INSERT INTO volume (id, free, written) VALUES (1, ?, 0) "
+            "ON CONFLICT (id) DO UPDATE SET free = excluded.free, written = 0",
+            (self._disk_free(),),
+        )
+        pids = conn.execute(
+            "SELECT DISTINCT pid FROM reservations WHERE host = ?", (self._host,)
+        ).fetchall()
+        for (pid,) in pids:
+            if not _is_alive(pid):
+                conn.execute(
+                    "DELETE FROM reservations WHERE host = ? AND pid = ?",
+                    (self._host, pid),
+                )
+
+    def _disk_free(self) -> int:
+        stats = os.statvfs(self.root)
+        return stats.f_bavail * stats.f_frsize
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        with self._lock:
+            # IMMEDIATE сразу берёт блокировку записи: проверка остатка
+            # и резерв атомарны между процессами
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+storage_capacity = StorageCapacity(
+    root=settings.STORAGE_PATH,
+    min_free_bytes=settings.MIN_FREE_SPACE_MB * 1024 * 1024,
+)
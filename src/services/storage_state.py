@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import logging
+from typing import Iterable, Optional
+
+from src.db_conn import async_session_maker
+from src.models import LOCAL_STATES, StorageState
+from src.repositories import FileRepository
+from src.services.s3 import cloud_provider
+
+logger = logging.getLogger(__name__)
+
+
+async def mark(
+    storage_key: str,
+    state: StorageState,
+    only_from: Optional[Iterable[StorageState]] = None,
+) -> None:
+    """
+    Записывает состояние содержимого для всех его файлов.
+
+    Состояние — подсказка для выбора источника, поэтому ошибка базы
+    только логируется и не прерывает операцию с самим файлом.
+    """
+    try:
+        async with async_session_maker() as session:
+            await FileRepository(session).set_state_by_key(storage_key, state, only_from)
+    except Exception as e:
+        logger.error(f"Failed to mark {storage_key} as {state.value}: {e}")
+
+
+async def is_uploaded(storage_key: str) -> bool:
+    """
+    Отмечено ли содержимое в базе как загруженное в облако.
+
+    Ошибка базы, как и в mark(), только логируется: содержимое
+    считается не загруженным.
+    """
+    try:
+        async with async_session_maker() as session:
+            state = await FileRepository(session).get_state_by_key(storage_key)
+    except Exception as e:
+        logger.error(f"Failed to read state of {storage_key}: {e}")
+        return False
+    return state in (StorageState.IN_CLOUD, StorageState.EVICTED_LOCALLY)
+
+
+async def confirm_in_cloud(storage_key: str) -> bool:
+    """
+    Есть ли содержимое в облаке.
+
+    Решение принимается по состоянию в базе; запрос к облаку делается
+    только для файлов, состояние которых неизвестно.
+    """
+    async with async_session_maker() as session:
+        state = await FileRepository(session).get_state_by_key(storage_key)
+    if state in LOCAL_STATES:
+        return False
+    if state in (StorageState.IN_CLOUD, StorageState.EVICTED_LOCALLY):
+        return True
+    return await cloud_provider.exists(storage_key)
+
+
+async def mark_evicted(storage_key: str) -> None:
+    await mark(
+        storage_key, StorageState.EVICTED_LOCALLY, only_from=[StorageState.IN_CLOUD]
+    )
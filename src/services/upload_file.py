@@ -1,47 +1,230 @@
-from fastapi import UploadFile, Request, HTTPException
+import os
+import time
+import uuid
+from typing import List, Optional
+
+from fastapi import Request, HTTPException
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from src.models import AppExceptions
-from src.repositories import FileRepository
+from src.config import settings
+from src.metrics import observe_transfer, stage
+from src.models import StorageState
+from src.repositories import FileRepository, NewFile, insert_batcher
 from src.services import FileMetadata
+from src.services.ingest import (
+    CloudSink,
+    IngestedFile,
+    IngestSink,
+    LocalFileSink,
+    MultipartIngestor,
+    StoredFiles,
+    TeeSink,
+)
+from src.services.local_cache import local_cache
+from src.services.proceed_file import FileValidator
+from src.services.s3 import cloud_provider
 
 
 class UploadFileService:
     @staticmethod
     async def proceed_file(
-        file: UploadFile, request: Request, session: AsyncSession
+        request: Request,
+        session: AsyncSession,
+        validator: FileValidator,
+        direct: bool = False,
     ) -> FileMetadata:
-        # Проверяем наличие заголовка Content-Length
-        content_length = request.headers.get("content-length")
-        if not content_length:
-            raise AppExceptions.content_length_missing()
+        """
+        Принимает файл из тела запроса и регистрирует его в базе.
+
+        :param direct: Отправлять файл в облако прямо во время приёма
+            (с копией в локальном кэше, если включён DIRECT_UPLOAD_TEE_LOCAL).
+        """
+        [file_metadata] = await UploadFileService.proceed_files(
+            request, session, validator, direct=direct
+        )
+        return file_metadata
+
+    @staticmethod
+    async def proceed_files(
+        request: Request,
+        session: AsyncSession,
+        validator: FileValidator,
+        direct: bool = False,
+        max_files: int = 1,
+    ) -> List[FileMetadata]:
+        """
+        Принимает до max_files файлов из тела запроса и регистрирует их
+        в базе одной транзакцией. Если хотя бы один файл не прошёл проверку,
+        не сохраняется ни один.
+
+        :param direct: Отправлять файлы в облако прямо во время приёма.
+        """
+        # Разбираем тело запроса сразу в хранилище
+        ingestor = MultipartIngestor(
+            request,
+            settings.STORAGE_PATH,
+            compute_digest=settings.DEDUPLICATE_UPLOADS,
+            max_files=max_files,
+            sink_factory=UploadFileService._sink_factory(
+                direct, int(request.headers.get("content-length", 0))
+            ),
+            validator=validator,
+        )
+        start = time.perf_counter()
+        with stage("upload", "ingest"):
+            files = await ingestor.ingest()
+        observe_transfer(
+            "received", sum(file.size for file in files), time.perf_counter() - start
+        )
 
+        return await UploadFileService.register_files(files, ingestor, session, validator)
+
+    @staticmethod
+    async def register_files(
+        files: List[IngestedFile],
+        ingestor: MultipartIngestor | StoredFiles,
+        session: AsyncSession,
+        validator: FileValidator,
+    ) -> List[FileMetadata]:
+        """
+        Проверяет уже записанные файлы и регистрирует их в базе одной транзакцией.
+
+        :param ingestor: Через него удаляются файлы, не прошедшие проверку,
+            и копии уже хранимого содержимого.
+        """
         try:
-            # Генерируем метаданные файла
-            file_metadata = await FileMetadata.from_upload_file(
-                file=file,
-                content_length=content_length,
-            )
-        except ValueError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File metadata generate error",
-            )
+            for file in files:
+                validator.validate(file)
+        except HTTPException:
+            await ingestor.discard()
+            raise
+
+        # Генерируем метаданные файлов
+        files_metadata = [FileMetadata.from_ingested(file) for file in files]
 
         try:
-            # Сохраняем метаданные файла в базе данных
-            await FileRepository(session).create(
-                original_name=file.filename,
-                file_size=file_metadata.file_size,
-                file_extension=file_metadata.file_extension,
-                file_uid=file_metadata.file_uid,
-                file_format=file_metadata.file_format,
+            # Сохраняем метаданные файлов в базе данных
+            create_many = (
+                insert_batcher.submit
+                if settings.DB_GROUP_COMMIT
+                else FileRepository(session).create_many
             )
-        except SQLAlchemyError:
+            upload_batch = uuid.uuid4().hex if len(files) > 1 else None
+            with stage("upload", "db_insert"):
+                results = await create_many(
+                    [
+                        NewFile(
+                            uid=file_metadata.file_uid,
+                            original_name=file.filename,
+                            file_size=file_metadata.file_size,
+                            file_extension=file_metadata.file_extension,
+                            file_format=file_metadata.file_format,
+                            digest=file.digest,
+                            storage_key=UploadFileService._candidate_key(file),
+                            storage_state=UploadFileService._initial_state(file),
+                            upload_batch=upload_batch,
+                        )
+                        for file, file_metadata in zip(files, files_metadata)
+                    ]
+                )
+        except (SQLAlchemyError, RuntimeError):
+            await ingestor.discard()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        return file_metadata
+        for file, file_metadata, (storage_key, created) in zip(
+            list(files), files_metadata, results
+        ):
+            if file.digest is not None:
+                await UploadFileService._link_blob(
+                    ingestor, file, file_metadata, storage_key, created
+                )
+
+        return files_metadata
+
+    @staticmethod
+    async def track_stored_files(files_metadata: List[FileMetadata]) -> int:
+        """
+        Учитывает сохранённые файлы в локальном кэше.
+
+        :return: Сколько байт файлов осталось на локальном диске.
+        """
+        stored = 0
+        for file_metadata in files_metadata:
+            if file_metadata.stored_locally:
+                await local_cache.add(
+                    file_metadata.file_unique_name,
+                    file_metadata.file_size,
+                    uploaded=file_metadata.in_cloud,
+                )
+                stored += file_metadata.file_size
+        return stored
+
+    @staticmethod
+    def _initial_state(file: IngestedFile) -> StorageState:
+        if not file.in_cloud:
+            return StorageState.LOCAL_ONLY
+        if file.stored_locally:
+            return StorageState.IN_CLOUD
+        return StorageState.EVICTED_LOCALLY
+
+    @staticmethod
+    def _candidate_key(file: IngestedFile) -> Optional[str]:
+        if file.digest is None:
+            return None
+        # Новое содержимое хранится под ключом принятой копии (UID файла):
+        # копия уже на месте до фиксации записей, а содержимое, загруженное
+        # заново после удаления, не совпадает по ключу с удаляемой копией
+        return os.path.basename(file.file_path)
+
+    @staticmethod
+    async def _link_blob(
+        ingestor: MultipartIngestor | StoredFiles,
+        file: IngestedFile,
+        file_metadata: FileMetadata,
+        storage_key: str,
+        created: bool,
+    ) -> None:
+        """
+        Оставляет принятую копию как содержимое файла
+        или удаляет её, если такое содержимое уже хранится.
+        """
+        blob_path = os.path.join(settings.STORAGE_PATH, storage_key)
+
+        if created:
+            # Копия уже лежит под ключом содержимого
+            pass
+        elif (
+            file.stored_locally
+            and not file.in_cloud
+            and not os.path.exists(blob_path)
+        ):
+            # Хранимое содержимое вытеснено из локального кэша, и копия
+            # возвращает его туда. Содержимое уже в облаке, поэтому сбой
+            # до переноса приводит лишь к промаху кэша
+            os.replace(file.file_path, blob_path)
+        else:
+            await ingestor.discard_file(file)
+            file_metadata.stored_locally = False
+
+        file_metadata.file_unique_name = storage_key
+        file_metadata.file_path = blob_path
+        file_metadata.deduplicated = not created
+
+    @staticmethod
+    def _sink_factory(direct: bool, size_hint: int):
+        if not direct:
+            return LocalFileSink
+
+        def factory(file: IngestedFile) -> IngestSink:
+            cloud_sink = CloudSink(cloud_provider, file, size_hint)
+            file.in_cloud = True
+            file.stored_locally = settings.DIRECT_UPLOAD_TEE_LOCAL
+            if file.stored_locally:
+                return TeeSink(LocalFileSink(file), cloud_sink)
+            return cloud_sink
+
+        return factory
@@ -1,3 +1,4 @@
-from .upload_to_cloud import upload_file_to_cloud
+from . import metrics  # noqa: F401  сигналы Celery для метрик
+from .upload_to_cloud import upload_file_to_cloud, upload_files_to_cloud
 
-__all__ = ["upload_file_to_cloud"]
+__all__ = ["upload_file_to_cloud", "upload_files_to_cloud"]
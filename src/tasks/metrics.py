@@ -0,0 +1,36 @@
+import logging
+import time
+
+from celery.signals import before_task_publish, task_prerun, worker_init
+
+from src.config import settings
+from src.metrics import TASK_QUEUE_WAIT_SECONDS, start_exporter
+
+logger = logging.getLogger(__name__)
+
+
+@before_task_publish.connect
+def _stamp_published_at(headers=None, **kwargs) -> None:
+    # Отметка в заголовках сообщения доходит до воркера как task.request.published_at
+    if headers is not None:
+        headers["published_at"] = time.time()
+
+
+@task_prerun.connect
+def _observe_queue_wait(task=None, **kwargs) -> None:
+    published_at = task.request.get("published_at") if task is not None else None
+    if published_at is not None:
+        TASK_QUEUE_WAIT_SECONDS.labels(task.name).observe(
+            max(0.0, time.time() - published_at)
+        )
+
+
+@worker_init.connect
+def _start_exporter(**kwargs) -> None:
+    if not settings.WORKER_METRICS_PORT:
+        return
+    try:
+        start_exporter(settings.WORKER_METRICS_PORT)
+    except OSError as e:
+        # Порт занят другим воркером на этом же хосте: задачи важнее метрик
+        logger.warning(f"Failed to start metrics exporter: {e}")
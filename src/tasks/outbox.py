@@ -0,0 +1,199 @@
+"""
+Отправка задач загрузки в облако из outbox в брокер.
+
+Запрос на загрузку не обращается к брокеру: задача записывается в таблицу
+upload_outbox в одной транзакции с записью о файле (FileRepository.create_many),
+а диспетчер в фоне публикует записи пачками. Записи пачки берутся в аренду
+короткой транзакцией, а публикация выполняется уже после её фиксации
+в отдельном потоке, так что ни блокировки строк, ни цикл событий не ждут брокер.
+
+Запись живёт, пока воркер не подтвердит загрузку содержимого в облако
+(удалит запись). Если подтверждения нет за OUTBOX_LEASE_SECONDS (загрузка
+не удалась, воркер упал, сообщение потерялось), задача публикуется снова.
+Записи своего процесса диспетчер отправляет сразу по notify(). Записи,
+не отправленные за OUTBOX_RECOVERY_SECONDS (процесс упал, брокер был
+недоступен), подбирает любой диспетчер при периодическом просмотре.
+Задача может быть доставлена повторно, поэтому воркер пропускает уже
+загруженные файлы.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.db_conn import async_session_maker
+from src.metrics import stage
+from src.models import PendingUpload
+from src.repositories import OutboxRepository
+from src.tasks.celery_app import app as celery
+from src.tasks.upload_to_cloud import upload_file_to_cloud, upload_files_to_cloud
+
+logger = logging.getLogger(__name__)
+
+# Задача, её аргументы и UID файлов, которые она загружает
+Message = Tuple[Any, Dict[str, Any], List[str]]
+
+
+class OutboxDispatcher:
+    """
+    Диспетчер outbox задач загрузки в облако.
+
+    :param batch_size: Сколько записей публиковать за один раз.
+    :param recovery_delay: Через сколько секунд неотправленную запись
+        подбирает любой диспетчер и повторяется неудачная публикация.
+    :param lease: Сколько секунд опубликованная задача ждёт подтверждения
+        воркера, прежде чем будет опубликована снова.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        batch_size: int,
+        recovery_delay: float,
+        lease: float,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.recovery_delay = recovery_delay
+        self.lease = lease
+
+        self._ready: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self, file_uids: Iterable[str]) -> None:
+        """
+        Просит отправить задачи файлов, записи о которых зафиксированы.
+
+        Файлы без задачи в outbox (уже в облаке, повторное содержимое)
+        просто не находятся. Без запущенного run() записи дождутся
+        периодического просмотра.
+        """
+        if self._wakeup is None:
+            return
+        self._ready.update(file_uids)
+        self._wakeup.set()
+
+    async def run(self, interval: float) -> None:
+        """Фоновая задача: отправка по notify() и просмотр просроченных записей."""
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+                try:
+                    while self._ready:
+                        await self.dispatch(self._take_ready())
+                    while await self.dispatch() == self.batch_size:
+                        pass
+                except Exception as e:
+                    logger.error(f"Outbox dispatch failed: {e}")
+        finally:
+            self._wakeup = None
+
+    async def close(self) -> None:
+        """Отправляет задачи, о которых успели сообщить до остановки."""
+        try:
+            while self._ready:
+                await self.dispatch(self._take_ready())
+        except Exception as e:
+            logger.error(f"Outbox dispatch failed: {e}")
+
+    async def dispatch(self, file_uids: Optional[List[str]] = None) -> int:
+        """
+        Публикует одну пачку записей.
+
+        :param file_uids: Записи этих файлов; без них — записи,
+            чей available_at уже наступил.
+        :return: Сколько записей выбрано (отправленных и отложенных).
+        """
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as session:
+            rows = await OutboxRepository(session).claim(
+                self.batch_size, now, now + timedelta(seconds=self.lease), file_uids
+            )
+            await session.commit()
+        if not rows:
+            return 0
+
+        # Аренда зафиксирована, так что другие диспетчеры записи пропустят,
+        # а строки не заблокированы на время обращения к брокеру
+        with stage("outbox", "publish"):
+            published = await asyncio.to_thread(_publish, _messages(rows))
+
+        failed = [row.file_uid for row in rows if row.file_uid not in published]
+        if failed:
+            async with self.session_factory() as session:
+                await OutboxRepository(session).postpone(
+                    failed, now + timedelta(seconds=self.recovery_delay)
+                )
+                await session.commit()
+        return len(rows)
+
+    def _take_ready(self) -> List[str]:
+        return [self._ready.pop() for _ in range(min(len(self._ready), self.batch_size))]
+
+
+def _messages(rows: List[PendingUpload]) -> List[Message]:
+    messages: List[Message] = []
+    batches: Dict[str, List[PendingUpload]] = {}
+    for row in rows:
+        if row.batch_id is None:
+            messages.append(
+                (upload_file_to_cloud, _task_kwargs(row), [row.file_uid])
+            )
+        else:
+            batches.setdefault(row.batch_id, []).append(row)
+
+    for batch in batches.values():
+        messages.append(
+            (
+                upload_files_to_cloud,
+                {"files": [_task_kwargs(row) for row in batch]},
+                [row.file_uid for row in batch],
+            )
+        )
+    return messages
+
+
+def _task_kwargs(row: PendingUpload) -> Dict[str, str]:
+    return {
+        "file_path": os.path.join(settings.STORAGE_PATH, row.storage_key),
+        "destination_name": row.storage_key,
+    }
+
+
+def _publish(messages: List[Message]) -> Set[str]:
+    """
+    Публикует задачи через одно соединение с брокером. Выполняется в потоке.
+
+    :return: UID файлов, задачи которых опубликованы. Остальные
+        не отправлены из-за ошибки брокера.
+    """
+    published: Set[str] = set()
+    try:
+        with celery.producer_or_acquire() as producer:
+            for task, kwargs, file_uids in messages:
+                task.apply_async(kwargs=kwargs, producer=producer)
+                published.update(file_uids)
+    except Exception as e:
+        logger.warning(f"Failed to publish cloud uploads, retrying later: {e}")
+    return published
+
+
+outbox_dispatcher = OutboxDispatcher(
+    session_factory=async_session_maker,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    recovery_delay=settings.OUTBOX_RECOVERY_SECONDS,
+    lease=settings.OUTBOX_LEASE_SECONDS,
+)
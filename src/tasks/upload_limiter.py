@@ -0,0 +1,39 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class UploadLimiter:
+    """
+    Ограничивает число файлов и суммарный объём, одновременно
+    загружаемых в облако одним процессом воркера.
+
+    Файл больше всего бюджета байт допускается, когда он загружается один.
+    """
+
+    def __init__(self, max_files: int, max_bytes: int):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+        self.files = 0
+        self.bytes = 0
+        self._changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def acquire(self, nbytes: int) -> AsyncIterator[None]:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._fits(nbytes))
+            self.files += 1
+            self.bytes += nbytes
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.files -= 1
+                self.bytes -= nbytes
+                self._changed.notify_all()
+
+    def _fits(self, nbytes: int) -> bool:
+        if self.files >= self.max_files:
+            return False
+        return self.files == 0 or self.bytes + nbytes <= self.max_bytes
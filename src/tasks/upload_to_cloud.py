@@ -1,15 +1,97 @@
 import asyncio
-from typing import Type
+import logging
+import os
+import time
+from typing import Dict, List
 
-from src.services.s3 import YandexCloudProvider, CloudStorageProvider
+from src.config import settings
+from src.db_conn import async_session_maker
+from src.metrics import STAGE_SECONDS
+from src.models import LOCAL_STATES, StorageState
+from src.repositories import OutboxRepository
+from src.services import storage_state
+from src.services.s3 import cloud_provider
+from src.tasks import worker_loop
 from src.tasks.celery_app import app as celery
+from src.tasks.upload_limiter import UploadLimiter
+
+logger = logging.getLogger(__name__)
+
+# Живёт в цикле воркера, общий для всех задач процесса
+upload_limiter = UploadLimiter(
+    max_files=settings.UPLOAD_WORKER_MAX_FILES,
+    max_bytes=settings.UPLOAD_WORKER_MAX_MB * 1024 * 1024,
+)
 
 
 @celery.task(name="upload_file_to_cloud")
 def upload_file_to_cloud(*args, **kwargs):
-    asyncio.run(_upload_file_to_cloud(*args, **kwargs))
+    worker_loop.run(_upload_file_to_cloud(*args, **kwargs))
 
 
 async def _upload_file_to_cloud(file_path: str, destination_name: str) -> None:
-    provider = YandexCloudProvider()
-    await provider.upload(destination_name, file_path)
+    # Outbox доставляет задачу не менее одного раза: повтор пропускается
+    if await storage_state.is_uploaded(destination_name):
+        await _confirm(destination_name)
+        return
+
+    try:
+        size = os.path.getsize(file_path)
+    except FileNotFoundError:
+        # Файл удалили до загрузки: повторять задачу незачем
+        logger.warning(f"{file_path} is gone, dropping its cloud upload")
+        await _confirm(destination_name)
+        return
+
+    start = time.perf_counter()
+    async with upload_limiter.acquire(size):
+        STAGE_SECONDS.labels("cloud_upload", "limiter_wait").observe(
+            time.perf_counter() - start
+        )
+        await storage_state.mark(
+            destination_name,
+            StorageState.UPLOADING,
+            only_from=[StorageState.RECEIVED, StorageState.LOCAL_ONLY],
+        )
+        try:
+            await cloud_provider.upload(destination_name, file_path)
+        except BaseException:
+            await storage_state.mark(
+                destination_name,
+                StorageState.LOCAL_ONLY,
+                only_from=[StorageState.UPLOADING],
+            )
+            raise
+        await storage_state.mark(
+            destination_name, StorageState.IN_CLOUD, only_from=LOCAL_STATES
+        )
+    await _confirm(destination_name)
+
+
+async def _confirm(storage_key: str) -> None:
+    """
+    Удаляет задачу из outbox. Без подтверждения outbox опубликует задачу снова
+    через OUTBOX_LEASE_SECONDS, в том числе после неудачной загрузки.
+    """
+    try:
+        async with async_session_maker() as session:
+            await OutboxRepository(session).delete_by_key(storage_key)
+            await session.commit()
+    except Exception as e:
+        # Повторная задача пропустит уже загруженное содержимое
+        logger.error(f"Failed to confirm cloud upload of {storage_key}: {e}")
+
+
+@celery.task(name="upload_files_to_cloud")
+def upload_files_to_cloud(files: List[Dict[str, str]]):
+    """Загрузка нескольких файлов одним сообщением брокера."""
+    worker_loop.run(_upload_files_to_cloud(files))
+
+
+async def _upload_files_to_cloud(files: List[Dict[str, str]]) -> None:
+    results = await asyncio.gather(
+        *(_upload_file_to_cloud(**file) for file in files), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+
+from src.services.s3 import cloud_provider
+
+T = TypeVar("T")
+
+# Событийный цикл процесса воркера работает в отдельном потоке и живёт
+# между задачами: клиент S3 и его пул соединений создаются один раз,
+# а задачи из потоков пула Celery выполняются в нём одновременно.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="worker-event-loop", daemon=True
+            )
+            thread.start()
+            asyncio.run_coroutine_threadsafe(cloud_provider.connect(), loop).result()
+            _loop, _thread = loop, thread
+        return _loop
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    """Выполняет корутину задачи в постоянном цикле процесса и ждёт результат."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+def shutdown() -> None:
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(cloud_provider.close(), _loop).result()
+        _loop.call_soon_threadsafe(_loop.stop)
+        _thread.join()
+        _loop.close()
+        _loop, _thread = None, None
+
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs) -> None:
+    get_loop()
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**kwargs) -> None:
+    shutdown()
+
+
+@worker_shutdown.connect
+def _shutdown_worker(**kwargs) -> None:
+    shutdown()
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.config import settings
+from src.db_conn import Base, get_session
+from src.main import app
+from src.models import PendingUpload
+from src.services import local_cache
+from src.services.storage_capacity import storage_capacity
+
+
+@pytest.fixture
+def session_maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}")
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def client(session_maker, tmp_path, monkeypatch):
+    storage = tmp_path / "storage"
+    storage.mkdir()
+    monkeypatch.setattr(settings, "STORAGE_PATH", str(storage))
+    monkeypatch.setattr(local_cache, "root", str(storage))
+    monkeypatch.setattr(storage_capacity, "root", str(storage))
+    monkeypatch.setattr(storage_capacity, "min_free_bytes", 0)
+
+    async def override_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_session
+    monkeypatch.setattr("src.services.storage_state.async_session_maker", session_maker)
+    monkeypatch.setattr("src.tasks.upload_to_cloud.async_session_maker", session_maker)
+    yield TestClient(app), storage
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def internal_headers(monkeypatch):
+    """Заголовки запросов к служебным маршрутам (/metrics, /internal/*)."""
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", "test-token")
+    return {"Authorization": "Bearer test-token"}
+
+
+@pytest.fixture
+def pending_uploads(session_maker):
+    """Задачи загрузки в облако, записанные в outbox, в порядке записи."""
+
+    async def query():
+        async with session_maker() as session:
+            result = await session.execute(
+                select(PendingUpload).order_by(PendingUpload.created_at)
+            )
+            return list(result.scalars())
+
+    return lambda: asyncio.run(query())
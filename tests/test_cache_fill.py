@@ -0,0 +1,88 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from src.models import StorageState
+from src.services.cache_fill import get_or_start_fill
+
+CONTENT = b"x" * 1000 + b"y" * 1000
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def read(self, size: int) -> bytes:
+        await asyncio.sleep(0.01)
+        chunk, self._data = self._data[:500], self._data[500:]
+        return chunk
+
+
+class FakeProvider:
+    def __init__(self):
+        self.calls = 0
+
+    @asynccontextmanager
+    async def open_stream(self, file_key):
+        self.calls += 1
+        if file_key == "missing":
+            raise FileNotFoundError(file_key)
+        yield len(CONTENT), FakeBody(CONTENT)
+
+
+@pytest.fixture(autouse=True)
+def marks(monkeypatch):
+    calls = []
+
+    async def mark(storage_key, state, only_from=None):
+        calls.append((storage_key, state))
+
+    monkeypatch.setattr("src.services.storage_state.mark", mark)
+    return calls
+
+
+async def _read(fill, offset, length):
+    await fill.wait_started()
+    return b"".join([chunk async for chunk in fill.stream(offset, length)])
+
+
+def test_concurrent_misses_share_one_fill(tmp_path, marks):
+    provider = FakeProvider()
+    save_path = str(tmp_path / "file.pdf")
+
+    async def run():
+        fills = [get_or_start_fill(provider, "file.pdf", save_path) for _ in range(3)]
+        results = await asyncio.gather(
+            _read(fills[0], 0, len(CONTENT)),
+            _read(fills[1], 1500, 500),
+            _read(fills[2], 0, 10),
+        )
+        await fills[0]._task
+        return results
+
+    full, tail, head = asyncio.run(run())
+
+    assert provider.calls == 1
+    assert full == CONTENT
+    assert tail == CONTENT[1500:]
+    assert head == CONTENT[:10]
+    assert (tmp_path / "file.pdf").read_bytes() == CONTENT
+    assert [p.name for p in tmp_path.iterdir()] == ["file.pdf"]
+    assert marks == [("file.pdf", StorageState.IN_CLOUD)]
+
+
+def test_fill_of_missing_object_raises(tmp_path):
+    provider = FakeProvider()
+
+    async def run():
+        fill = get_or_start_fill(provider, "missing", str(tmp_path / "missing"))
+        await fill.wait_started()
+
+    try:
+        asyncio.run(run())
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError("FileNotFoundError expected")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,198 @@
+import asyncio
+
+from src.models import Blob, StorageState
+from src.repositories import FileRepository, NewFile
+from src.services.delete_file import DeleteFileService
+from src.services.local_cache import local_cache
+
+PDF = b"%PDF-1.4\n" + b"1" * 5000
+
+
+def test_identical_uploads_share_one_blob(client, pending_uploads):
+    client, storage = client
+
+    uids = []
+    for name in ("a.pdf", "b.pdf"):
+        response = client.post(
+            "/files/upload", files={"file": (name, PDF, "application/pdf")}
+        )
+        assert response.status_code == 201
+        uids.append(response.json()["uid"])
+
+    # Содержимое сохранено и отправлено в облако один раз
+    [stored] = list(storage.iterdir())
+    assert stored.read_bytes() == PDF
+    # Содержимое хранится под ключом первой копии
+    assert stored.name == f"{uids[0]}.pdf"
+    [pending] = pending_uploads()
+    assert (pending.file_uid, pending.storage_key) == (uids[0], stored.name)
+
+    for uid in uids:
+        response = client.get(f"/files/download/{uid}")
+        assert response.status_code == 200
+        assert response.content == PDF
+
+
+def test_delete_releases_blob_reference(session_maker):
+    async def scenario():
+        async with session_maker() as session:
+            repository = FileRepository(session)
+            results = []
+            for uid, key in (("uid-1", "first"), ("uid-2", "second")):
+                new_file = NewFile(
+                    uid=uid,
+                    original_name="a.pdf",
+                    file_size=10,
+                    file_extension=".pdf",
+                    digest="d" * 64,
+                    storage_key=key,
+                )
+                results += await repository.create_many([new_file])
+            assert results == [("first", True), ("first", False)]
+
+            await repository.delete_by_uid("uid-1")
+            assert (await session.get(Blob, "d" * 64)).ref_count == 1
+
+            await repository.delete_by_uid("uid-2")
+            session.expunge_all()
+            assert await session.get(Blob, "d" * 64) is None
+
+    asyncio.run(scenario())
+
+
+class DeletingProvider:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete(self, key):
+        self.deleted.append(key)
+
+
+def test_delete_of_last_reference_frees_storage(client, session_maker, pending_uploads):
+    client, storage = client
+    provider = DeletingProvider()
+
+    uids = [
+        client.post(
+            "/files/upload", files={"file": (name, PDF, "application/pdf")}
+        ).json()["uid"]
+        for name in ("a.pdf", "b.pdf")
+    ]
+    [stored] = list(storage.iterdir())
+
+    async def delete(uid):
+        async with session_maker() as session:
+            return await DeleteFileService(provider, session).delete(uid)
+
+    # Содержимое ещё используется вторым файлом
+    assert asyncio.run(delete(uids[0]))
+    assert stored.exists() and provider.deleted == []
+    assert client.get(f"/files/download/{uids[1]}").content == PDF
+
+    assert asyncio.run(delete(uids[1]))
+    assert not stored.exists()
+    assert provider.deleted == [stored.name]
+    assert pending_uploads() == []
+    assert asyncio.run(local_cache.used_bytes()) == 0
+
+    assert not asyncio.run(delete(uids[1]))
+
+
+def test_reupload_during_delete_keeps_new_copy(client, session_maker):
+    client, storage = client
+    provider = DeletingProvider()
+
+    def upload():
+        return client.post(
+            "/files/upload", files={"file": ("a.pdf", PDF, "application/pdf")}
+        ).json()["uid"]
+
+    async def delete(uid):
+        async with session_maker() as session:
+            return await FileRepository(session).delete_by_uid(uid)
+
+    async def release(storage_key):
+        async with session_maker() as session:
+            await DeleteFileService(provider, session).release(storage_key)
+
+    first = upload()
+    deleted = asyncio.run(delete(first))
+    # То же содержимое загружено после удаления записи, но до удаления копий
+    second = upload()
+    asyncio.run(release(deleted.released_key))
+
+    assert provider.deleted == [deleted.released_key]
+    assert [path.name for path in storage.iterdir()] == [f"{second}.pdf"]
+    assert client.get(f"/files/download/{second}").content == PDF
+
+
+def test_reupload_returns_evicted_content(client, session_maker):
+    client, storage = client
+
+    def upload():
+        return client.post(
+            "/files/upload", files={"file": ("a.pdf", PDF, "application/pdf")}
+        ).json()["uid"]
+
+    async def evict(storage_key):
+        async with session_maker() as session:
+            await FileRepository(session).set_state_by_key(
+                storage_key, StorageState.EVICTED_LOCALLY
+            )
+
+    async def state(uid):
+        async with session_maker() as session:
+            return (await FileRepository(session).get_by_uid(uid)).storage_state
+
+    first = upload()
+    [stored] = list(storage.iterdir())
+    asyncio.run(evict(stored.name))
+    stored.unlink()
+
+    upload()
+    assert list(storage.iterdir()) == [stored]
+    assert stored.read_bytes() == PDF
+    assert asyncio.run(state(first)) == StorageState.IN_CLOUD
+
+
+def test_batch_upload_and_lookup(client, pending_uploads):
+    client, storage = client
+
+    response = client.post(
+        "/files/upload/batch",
+        files=[
+            ("files", ("a.pdf", PDF, "application/pdf")),
+            ("files", ("b.pdf", PDF + b"2", "application/pdf")),
+            ("files", ("c.pdf", PDF, "application/pdf")),
+        ],
+    )
+    assert response.status_code == 201
+    uids = response.json()["uids"]
+    assert len(uids) == 3
+
+    # Одна задача на два разных содержимых
+    first, second = pending_uploads()
+    assert first.batch_id is not None and first.batch_id == second.batch_id
+    assert len(list(storage.iterdir())) == 2
+
+    unknown = "00000000-0000-0000-0000-000000000000"
+    response = client.post("/files/lookup", json={"uids": [uids[2], unknown, uids[0]]})
+    assert response.status_code == 200
+    body = response.json()
+    assert [file["original_name"] for file in body["files"]] == ["c.pdf", "a.pdf"]
+    assert body["missing"] == [unknown]
+
+
+def test_batch_upload_is_all_or_nothing(client, pending_uploads):
+    client, storage = client
+
+    response = client.post(
+        "/files/upload/batch",
+        files=[
+            ("files", ("a.pdf", PDF, "application/pdf")),
+            ("files", ("notes.txt", b"hello", "text/plain")),
+        ],
+    )
+    assert response.status_code == 400
+    assert pending_uploads() == []
+    assert list(storage.iterdir()) == []
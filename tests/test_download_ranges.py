@@ -0,0 +1,149 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.config import settings
+from src.main import app
+from src.models import File
+from src.services.download_file import DownloadFileService
+from src.services.file_response import LocalFileResponse
+from src.services.http_range import ByteRange, RangeNotSatisfiable, parse_range_header
+
+client = TestClient(app)
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def stored_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_PATH", str(tmp_path))
+    uid = str(uuid4())
+    (tmp_path / f"{uid}.pdf").write_bytes(CONTENT)
+    record = File(
+        uid=uid,
+        original_name="doc.pdf",
+        file_size=len(CONTENT),
+        file_extension=".pdf",
+        file_format="application/pdf",
+    )
+    with patch(
+        "src.repositories.FileRepository.get_by_uid",
+        new_callable=AsyncMock,
+        return_value=record,
+    ):
+        yield uid
+
+
+def test_parse_range_header():
+    assert parse_range_header("bytes=0-9", 100) == [ByteRange(0, 9)]
+    assert parse_range_header("bytes=-10", 100) == [ByteRange(90, 99)]
+    assert parse_range_header("bytes=90-", 100) == [ByteRange(90, 99)]
+    assert parse_range_header("bytes=0-4,5-9,50-", 100) == [
+        ByteRange(0, 9),
+        ByteRange(50, 99),
+    ]
+    assert parse_range_header("items=0-9", 100) is None
+    assert parse_range_header("bytes=9-0", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=100-", 100)
+
+
+def test_download_single_range(stored_file):
+    response = client.get(
+        f"/files/download/{stored_file}", headers={"Range": "bytes=10-19"}
+    )
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+    assert response.headers["content-length"] == "10"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_download_multiple_ranges(stored_file):
+    response = client.get(
+        f"/files/download/{stored_file}", headers={"Range": "bytes=0-1,-2"}
+    )
+
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert CONTENT[:2] in response.content
+    assert CONTENT[-2:] in response.content
+
+
+def test_download_if_range_mismatch_returns_full_file(stored_file):
+    response = client.get(
+        f"/files/download/{stored_file}",
+        headers={"Range": "bytes=0-9", "If-Range": '"stale"'},
+    )
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_download_range_not_satisfiable(stored_file):
+    response = client.get(
+        f"/files/download/{stored_file}", headers={"Range": "bytes=5000-"}
+    )
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_local_file_response_uses_zero_copy_extension(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(CONTENT)
+    response = LocalFileResponse(open(path, "rb"), [b"head", ByteRange(10, 19)])
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "extensions": {"http.response.zerocopysend": {}},
+    }
+    messages = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            message = {**message, "file": message["file"].fileno()}
+        messages.append(message)
+
+    asyncio.run(response(scope, None, send))
+
+    assert [m["type"] for m in messages] == [
+        "http.response.start",
+        "http.response.body",
+        "http.response.zerocopysend",
+    ]
+    assert messages[2]["offset"] == 10
+    assert messages[2]["count"] == 10
+    assert messages[2]["more_body"] is False
+
+
+def test_file_evicted_after_lookup_is_sent_whole(stored_file, tmp_path):
+    async def scenario():
+        service = DownloadFileService(provider=None, session=None)
+        assert await service.get_and_set_file_record(stored_file)
+        assert await service.get_file_locally()
+        # Файл вытеснен после выбора источника, но до ответа
+        (tmp_path / f"{stored_file}.pdf").unlink()
+        response = await service.get_file_stream()
+
+        messages = []
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        await response({"type": "http", "method": "GET"}, receive, send)
+        return response, messages
+
+    response, messages = asyncio.run(scenario())
+    assert messages[0]["status"] == 200
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    assert body == CONTENT
+    assert response.file.closed
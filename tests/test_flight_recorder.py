@@ -0,0 +1,98 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from src.flight_recorder import SamplingProfiler, flight_recorder, watch_engine
+
+PDF = b"%PDF-1.4\n" + b"9" * 5000
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    monkeypatch.setattr(flight_recorder, "slow_seconds", 0)
+    flight_recorder.clear()
+    yield flight_recorder
+    flight_recorder.clear()
+
+
+def test_slow_requests_are_recorded_with_timeline(
+    client, session_maker, recorder, internal_headers
+):
+    client, storage = client
+    # В тестах приложение работает с отдельным движком SQLite
+    watch_engine(session_maker.kw["bind"].sync_engine)
+    uid = client.post(
+        "/files/upload", files={"file": ("doc.pdf", PDF, "application/pdf")}
+    ).json()["uid"]
+    client.get(f"/files/download/{uid}")
+
+    download, upload = client.get(
+        "/internal/flight-recorder?limit=2", headers=internal_headers
+    ).json()
+    assert download["route"] == "/files/download/{uid}"
+    assert download["status"] == 200
+    assert download["bytes"] == {"sent": len(PDF)}
+    stages = [e["name"] for e in download["events"] if e["kind"] == "stage"]
+    assert stages == ["download.lookup", "download.locate"]
+    assert download["db_calls"] >= 1
+
+    assert upload["route"] == "/files/upload"
+    assert upload["bytes"] == {"received": len(PDF)}
+    stages = [e["name"] for e in upload["events"] if e["kind"] == "stage"]
+    assert stages == ["upload.prepare", "upload.ingest", "upload.db_insert", "upload.enqueue"]
+    assert upload["profiled"] is False
+
+
+def test_fast_requests_are_not_kept(client, monkeypatch, internal_headers):
+    client, storage = client
+    flight_recorder.clear()
+    monkeypatch.setattr(flight_recorder, "slow_seconds", 60)
+    client.get("/files/00000000-0000-0000-0000-000000000000")
+    assert client.get("/internal/flight-recorder", headers=internal_headers).json() == []
+
+
+def test_profiled_request_exposes_folded_stacks(
+    client, recorder, monkeypatch, internal_headers
+):
+    client, storage = client
+    monkeypatch.setattr(flight_recorder, "profile_rate", 1.0)
+    client.get("/files/00000000-0000-0000-0000-000000000000")
+    monkeypatch.setattr(flight_recorder, "profile_rate", 0.0)
+
+    [timeline] = client.get(
+        "/internal/flight-recorder?limit=1", headers=internal_headers
+    ).json()
+    assert timeline["profiled"] is True
+    response = client.get(
+        f"/internal/flight-recorder/{timeline['id']}/profile", headers=internal_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    response = client.get(
+        "/internal/flight-recorder/unknown/profile", headers=internal_headers
+    )
+    assert response.status_code == 404
+
+
+def test_profiler_samples_cpu_and_awaits():
+    profiler = SamplingProfiler(interval=0.001)
+
+    async def busy():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+
+    async def handle():
+        profiler.add("request", sys._getframe(), asyncio.current_task())
+        await busy()
+        await asyncio.sleep(0.1)
+        return profiler.remove("request")
+
+    folded = asyncio.run(handle())
+    stacks = [line.rsplit(" ", 1)[0] for line in folded.splitlines()]
+    busy_frame = f"busy (test_flight_recorder.py:{busy.__code__.co_firstlineno})"
+    assert any(stack.endswith(busy_frame) for stack in stacks)
+    assert any(stack.endswith("[await]") for stack in stacks)
+    assert all(stack.startswith("test_profiler_samples_cpu_and_awaits.<locals>.handle") for stack in stacks)
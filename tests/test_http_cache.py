@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+from src.services.http_cache import http_date, is_not_modified
+
+PDF = b"%PDF-1.4\n" + b"7" * 5000
+
+
+class UntouchableProvider:
+    def __getattr__(self, name):
+        raise AssertionError(f"provider.{name} must not be used")
+
+
+def upload(client):
+    response = client.post(
+        "/files/upload", files={"file": ("doc.pdf", PDF, "application/pdf")}
+    )
+    return response.json()["uid"]
+
+
+def test_is_not_modified():
+    uploaded = datetime(2024, 5, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+    assert is_not_modified('"a"', None, '"a"', None)
+    assert is_not_modified('"b", W/"a"', None, '"a"', None)
+    assert is_not_modified("*", None, '"a"', None)
+    assert not is_not_modified('"b"', None, '"a"', None)
+    # If-None-Match важнее If-Modified-Since
+    assert not is_not_modified('"b"', http_date(uploaded), '"a"', uploaded)
+
+    assert is_not_modified(None, http_date(uploaded), '"a"', uploaded)
+    earlier = http_date(uploaded - timedelta(seconds=1))
+    assert not is_not_modified(None, earlier, '"a"', uploaded)
+    assert not is_not_modified(None, "yesterday", '"a"', uploaded)
+    assert not is_not_modified(None, http_date(uploaded), '"a"', None)
+
+
+def test_download_revalidation_touches_neither_disk_nor_bucket(client, monkeypatch):
+    client, storage = client
+    uid = upload(client)
+
+    response = client.get(f"/files/download/{uid}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+
+    # Содержимого больше нет ни на диске, ни в облаке
+    for path in storage.iterdir():
+        path.unlink()
+    monkeypatch.setattr("src.api.file_routes.cloud_provider", UntouchableProvider())
+
+    response = client.get(f"/files/download/{uid}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get(
+        f"/files/download/{uid}", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+    # Без совпадения файл нужно отдавать, а его нет
+    response = client.get(f"/files/download/{uid}", headers={"If-None-Match": '"x"'})
+    assert response.status_code != 304
+
+
+def test_metadata_revalidation(client):
+    client, storage = client
+    uid = upload(client)
+
+    response = client.get(f"/files/{uid}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=3600"
+    etag = response.headers["etag"]
+    assert "last-modified" in response.headers
+
+    response = client.get(f"/files/{uid}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert client.get(f"/files/{uid}", headers={"If-None-Match": '"x"'}).json()["uid"] == uid
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import http.client
+import importlib.util
+import inspect
+import os
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+pytest.importorskip("httptools")
+
+from uvicorn.protocols.http.httptools_impl import HttpToolsProtocol  # noqa: E402
+
+from src import http_protocol  # noqa: E402
+from src.http_protocol import ZeroCopyCycle, ZeroCopyHttpToolsProtocol  # noqa: E402
+from src.services.file_response import (  # noqa: E402
+    LocalFileResponse,
+    segments_length,
+)
+from src.services.http_range import ByteRange  # noqa: E402
+
+CONTENT = os.urandom(3 * 1024 * 1024)
+
+
+@pytest.fixture(
+    params=[
+        "asyncio",
+        pytest.param(
+            "uvloop",
+            marks=pytest.mark.skipif(
+                importlib.util.find_spec("uvloop") is None,
+                reason="uvloop is not installed",
+            ),
+        ),
+    ]
+)
+def serve(request):
+    """Запускает uvicorn с протоколом ZeroCopyHttpToolsProtocol в потоке."""
+    servers = []
+
+    def start(app):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(
+            uvicorn.Config(
+                app,
+                host="127.0.0.1",
+                port=port,
+                http=ZeroCopyHttpToolsProtocol,
+                loop=request.param,
+                lifespan="off",
+                log_level="warning",
+            )
+        )
+        thread = threading.Thread(target=server.run)
+        thread.start()
+        servers.append((server, thread))
+        while not server.started:
+            time.sleep(0.01)
+        return port
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join()
+    # uvicorn с uvloop подменяет политику цикла событий всего процесса
+    asyncio.set_event_loop_policy(None)
+
+
+def test_local_file_is_sent_with_sendfile(serve, tmp_path, monkeypatch):
+    path = tmp_path / "file.bin"
+    path.write_bytes(CONTENT)
+    segments = [b"--part\r\n", ByteRange(100, 2 * 1024 * 1024), b"\r\n--part--"]
+
+    async def app(scope, receive, send):
+        headers = {"content-length": str(segments_length(segments))}
+        await LocalFileResponse(open(path, "rb"), segments, headers=headers)(
+            scope, receive, send
+        )
+
+    sent = []
+    sendfile = os.sendfile
+
+    def counting_sendfile(*args):
+        sent.append(args[3])
+        return sendfile(*args)
+
+    monkeypatch.setattr(http_protocol.os, "sendfile", counting_sendfile)
+    port = serve(app)
+
+    # Два ответа подряд по одному соединению: keep-alive не нарушен
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    bodies = []
+    for _ in range(2):
+        connection.request("GET", "/")
+        response = connection.getresponse()
+        bodies.append(response.read())
+    connection.close()
+
+    expected = b"--part\r\n" + CONTENT[100 : 2 * 1024 * 1024 + 1] + b"\r\n--part--"
+    assert bodies == [expected, expected]
+    assert sent
+
+
+def test_repeated_uvicorn_code_matches_installed_version():
+    # Протокол повторяет HttpToolsProtocol.on_headers_complete: при обновлении
+    # uvicorn повторённый код нужно сверить с новым и обновить отпечаток
+    assert http_protocol.is_supported(), uvicorn.__version__
+    source = inspect.getsource(HttpToolsProtocol.on_headers_complete)
+    fingerprint = hashlib.sha256(source.encode()).hexdigest()
+    assert fingerprint == http_protocol.UPSTREAM_ON_HEADERS_COMPLETE
+
+
+def test_pipelined_requests_use_zero_copy_cycle(serve, monkeypatch):
+    cycles = []
+
+    async def app(scope, receive, send):
+        body = scope["path"].encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-length", str(len(body)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    init = ZeroCopyCycle.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        cycles.append(type(self))
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(ZeroCopyCycle, "__init__", tracking_init)
+    port = serve(app)
+
+    # Два запроса одной записью: второй ждёт в очереди протокола
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(
+            b"GET /first HTTP/1.1\r\nHost: test\r\n\r\n"
+            b"GET /second HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n"
+        )
+        received = b""
+        while chunk := sock.recv(65536):
+            received += chunk
+
+    assert received.count(b"HTTP/1.1 200 OK") == 2
+    assert received.index(b"/first") < received.index(b"/second")
+    assert cycles == [ZeroCopyCycle, ZeroCopyCycle]
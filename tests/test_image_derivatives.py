@@ -0,0 +1,79 @@
+import asyncio
+import io
+from contextlib import asynccontextmanager
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from src.services.image_derivatives import image_derivatives  # noqa: E402
+
+PDF = b"%PDF-1.4\n" + b"6" * 5000
+
+
+class FakeProvider:
+    def __init__(self):
+        self.uploads, self.opened = {}, []
+
+    async def upload(self, key, path):
+        with open(path, "rb") as file:
+            self.uploads[key] = file.read()
+
+    @asynccontextmanager
+    async def open_stream(self, key):
+        self.opened.append(key)
+        raise FileNotFoundError(key)
+        yield
+
+
+def make_png(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def upload(client, name, body, content_type):
+    response = client.post("/files/upload", files={"file": (name, body, content_type)})
+    return response.json()["uid"]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr("src.api.file_routes.cloud_provider", provider)
+    yield provider
+    asyncio.run(image_derivatives.close())
+
+
+def test_variant_is_rendered_once_and_cached(client, provider):
+    client, storage = client
+    uid = upload(client, "photo.png", make_png(400, 200), "image/png")
+
+    response = client.get(f"/files/download/{uid}?width=128&format=webp&quality=75")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "photo.webp" in response.headers["content-disposition"]
+    assert Image.open(io.BytesIO(response.content)).size == (128, 64)
+
+    # Второй запрос обслуживается с диска: ни бакет, ни пул не нужны
+    assert len(provider.opened) == 1
+    again = client.get(f"/files/download/{uid}?width=128&format=webp&quality=75")
+    assert again.content == response.content
+    assert again.headers["etag"] == response.headers["etag"]
+    assert len(provider.opened) == 1
+
+    [key] = provider.uploads
+    assert key.endswith(".128x0-q75.webp")
+    assert (storage / key).exists()
+
+
+def test_only_allow_listed_variants(client, provider):
+    client, storage = client
+    uid = upload(client, "photo.png", make_png(40, 40), "image/png")
+    assert client.get(f"/files/download/{uid}?width=100").status_code == 400
+    assert client.get(f"/files/download/{uid}?format=gif").status_code == 400
+    assert client.get(f"/files/download/{uid}?format=jpeg&quality=42").status_code == 400
+
+    pdf_uid = upload(client, "doc.pdf", PDF, "application/pdf")
+    assert client.get(f"/files/download/{pdf_uid}?width=128").status_code == 400
+    assert provider.opened == []
@@ -0,0 +1,78 @@
+import asyncio
+
+from src.repositories import InsertBatcher, NewFile
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def new_file(uid: str) -> NewFile:
+    return NewFile(uid=uid, original_name="a.pdf", file_size=1, file_extension=".pdf")
+
+
+def make_batcher(monkeypatch, max_rows, max_latency, fail_uid=None):
+    batches = []
+
+    async def create_many(self, files):
+        batches.append([file.uid for file in files])
+        if fail_uid in batches[-1]:
+            raise RuntimeError("duplicate uid")
+        return [(f"{file.uid}.pdf", True) for file in files]
+
+    monkeypatch.setattr("src.repositories.FileRepository.create_many", create_many)
+    return InsertBatcher(FakeSession, max_rows=max_rows, max_latency=max_latency), batches
+
+
+def test_concurrent_inserts_share_one_batch(monkeypatch):
+    batcher, batches = make_batcher(monkeypatch, max_rows=100, max_latency=0.05)
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(batcher.submit([new_file(str(i))]) for i in range(10))
+        )
+        await batcher.close()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert batches == [[str(i) for i in range(10)]]
+    assert results == [[(f"{i}.pdf", True)] for i in range(10)]
+
+
+def test_full_batch_is_flushed_without_waiting(monkeypatch):
+    batcher, batches = make_batcher(monkeypatch, max_rows=2, max_latency=10)
+
+    async def scenario():
+        await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit([new_file(str(i))]) for i in range(4))),
+            timeout=1,
+        )
+        await batcher.close()
+
+    asyncio.run(scenario())
+    assert batches == [["0", "1"], ["2", "3"]]
+
+
+def test_failed_batch_is_retried_per_request(monkeypatch):
+    batcher, batches = make_batcher(
+        monkeypatch, max_rows=100, max_latency=0.01, fail_uid="bad"
+    )
+
+    async def scenario():
+        results = await asyncio.gather(
+            batcher.submit([new_file("good")]),
+            batcher.submit([new_file("bad")]),
+            return_exceptions=True,
+        )
+        await batcher.close()
+        return results
+
+    good, bad = asyncio.run(scenario())
+    assert good == [("good.pdf", True)]
+    assert isinstance(bad, RuntimeError)
+    assert batches == [["good", "bad"], ["good"], ["bad"]]
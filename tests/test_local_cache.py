@@ -0,0 +1,82 @@
+import asyncio
+
+from src.services.local_cache import LocalFileCache
+from src.services.storage_capacity import StorageCapacity
+
+
+def _make_cache(root, uploaded):
+    async def confirm_uploaded(name):
+        return name in uploaded
+
+    return LocalFileCache(
+        root=str(root),
+        max_bytes=300,
+        high_watermark=0.9,
+        low_watermark=0.5,
+        capacity=StorageCapacity(str(root), min_free_bytes=0),
+        confirm_uploaded=confirm_uploaded,
+    )
+
+
+def test_evicts_least_recently_used_uploaded_files(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_bytes(b"x" * 100)
+
+    async def run():
+        cache = _make_cache(tmp_path, uploaded={"a", "b", "c"})
+        await cache.open()
+        for name in ("a", "b", "c"):
+            await cache.add(name, 100)
+            await asyncio.sleep(0.01)
+        cache.touch("a")
+
+        freed = await cache.evict(150)
+        used = await cache.used_bytes()
+        await cache.close()
+        return freed, used
+
+    freed, used = asyncio.run(run())
+
+    assert freed == 200
+    assert used == 100
+    assert sorted(p.name for p in tmp_path.iterdir() if not p.name.startswith(".")) == ["a"]
+
+
+def test_keeps_files_not_confirmed_in_cloud(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).write_bytes(b"x" * 100)
+
+    async def run():
+        cache = _make_cache(tmp_path, uploaded={"b"})
+        await cache.open()
+        freed = await cache.evict(0)
+        await cache.close()
+        return freed
+
+    assert asyncio.run(run()) == 100
+    assert (tmp_path / "a").exists()
+    assert not (tmp_path / "b").exists()
+
+
+def test_index_survives_restart(tmp_path):
+    (tmp_path / "a").write_bytes(b"x" * 100)
+
+    async def run():
+        cache = _make_cache(tmp_path, uploaded=set())
+        await cache.open()
+        await cache.add("a", 100)
+        await cache.mark_uploaded("a")
+        await cache.close()
+
+        (tmp_path / "b").write_bytes(b"x" * 50)
+        reopened = _make_cache(tmp_path, uploaded=set())
+        await reopened.open()
+        used = await reopened.used_bytes()
+        freed = await reopened.evict(0)
+        await reopened.close()
+        return used, freed
+
+    used, freed = asyncio.run(run())
+
+    assert used == 150
+    assert freed == 100
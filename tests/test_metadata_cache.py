@@ -0,0 +1,283 @@
+import asyncio
+from contextlib import suppress
+
+from src.models import File, StorageState
+from src.repositories import FileRepository, MetadataCache, NewFile
+
+
+def make_file(uid: str) -> File:
+    return File(
+        id=1,
+        uid=uid,
+        original_name="a.pdf",
+        file_size=10,
+        file_extension=".pdf",
+        file_format="application/pdf",
+    )
+
+
+class Loader:
+    def __init__(self, files):
+        self.files, self.calls = files, 0
+
+    async def __call__(self, uid):
+        self.calls += 1
+        return self.files.get(uid)
+
+
+def test_hits_misses_and_negative_entries():
+    cache = MetadataCache(max_entries=10, ttl=60, negative_ttl=60)
+    loader = Loader({"known": make_file("known")})
+
+    async def scenario():
+        for uid in ("known", "known", "unknown", "unknown"):
+            await cache.get_or_load(uid, lambda: loader(uid))
+        return await cache.get_or_load("known", lambda: loader("known"))
+
+    file = asyncio.run(scenario())
+
+    assert file.original_name == "a.pdf"
+    assert loader.calls == 2
+    stats = cache.snapshot()
+    assert (stats["misses"], stats["local_hits"], stats["negative_hits"]) == (2, 2, 1)
+
+
+def test_invalidate_and_lru_bound():
+    cache = MetadataCache(max_entries=2, ttl=60, negative_ttl=60)
+    loader = Loader({uid: make_file(uid) for uid in "abc"})
+
+    async def scenario():
+        for uid in "abc":
+            await cache.get_or_load(uid, lambda: loader(uid))
+        assert cache.snapshot()["entries"] == 2
+
+        await cache.invalidate("c")
+        await cache.get_or_load("c", lambda: loader("c"))
+        await cache.get_or_load("a", lambda: loader("a"))
+
+    asyncio.run(scenario())
+    assert loader.calls == 5
+
+
+def test_expired_entries_are_reloaded():
+    cache = MetadataCache(max_entries=10, ttl=0, negative_ttl=0)
+    loader = Loader({})
+
+    async def scenario():
+        for _ in range(2):
+            await cache.get_or_load("x", lambda: loader("x"))
+
+    asyncio.run(scenario())
+    assert loader.calls == 2
+
+
+def test_storage_state_transitions_invalidate_cached_record(session_maker, monkeypatch):
+    monkeypatch.setattr(
+        "src.repositories.file_repository.metadata_cache",
+        MetadataCache(max_entries=10, ttl=60, negative_ttl=60),
+    )
+
+    def new_file(uid, state):
+        return NewFile(
+            uid=uid,
+            original_name="a.pdf",
+            file_size=10,
+            file_extension=".pdf",
+            digest="e" * 64,
+            storage_key="shared",
+            storage_state=state,
+        )
+
+    async def cached_state(repository, uid):
+        return (await repository.get_cached_by_uid(uid)).storage_state
+
+    async def scenario():
+        async with session_maker() as session:
+            repository = FileRepository(session)
+            await repository.create_many([new_file("first", StorageState.LOCAL_ONLY)])
+            assert await cached_state(repository, "first") == "local_only"
+
+            await repository.set_state_by_key("shared", StorageState.EVICTED_LOCALLY)
+            assert await cached_state(repository, "first") == "evicted_locally"
+
+            # Повторная загрузка вернула локальную копию вытесненного содержимого
+            await repository.create_many([new_file("second", StorageState.LOCAL_ONLY)])
+            assert await cached_state(repository, "first") == "in_cloud"
+
+            await repository.delete_by_uid("first")
+            assert await repository.get_cached_by_uid("first") is None
+
+    asyncio.run(scenario())
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values, self.subscribers = {}, []
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        # Повторяет _SET_IF_NOT_INVALIDATED
+        keys, args = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        for i in range(0, len(keys), 2):
+            generation, _, value = args[i // 2 * 3 : i // 2 * 3 + 3]
+            if self.values.get(keys[i + 1], b"") == generation:
+                self.values[keys[i]] = value
+
+    def pipeline(self, transaction):
+        return FakePipeline(self)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.commands = redis, []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def delete(self, *keys):
+        self.commands.append(lambda: [self.redis.values.pop(key, None) for key in keys])
+
+    def incr(self, key):
+        def command():
+            value = int(self.redis.values.get(key, 0)) + 1
+            self.redis.values[key] = str(value).encode()
+
+        self.commands.append(command)
+
+    def expire(self, key, seconds):
+        pass
+
+    def publish(self, channel, data):
+        message = {"type": "message", "data": data}
+        self.commands.append(
+            lambda: [queue.put_nowait(message) for queue in self.redis.subscribers]
+        )
+
+    async def execute(self):
+        for command in self.commands:
+            command()
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis, self.queue = redis, asyncio.Queue()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.redis.subscribers.remove(self.queue)
+
+    async def subscribe(self, channel):
+        self.redis.subscribers.append(self.queue)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+def test_invalidation_reaches_other_processes():
+    redis = FakeRedis()
+    caches = [
+        MetadataCache(max_entries=10, ttl=60, negative_ttl=60, redis_url="redis://")
+        for _ in range(2)
+    ]
+    for cache in caches:
+        cache._redis = redis
+    loader = Loader({"a": make_file("a")})
+
+    async def scenario():
+        listener = asyncio.create_task(caches[1].run())
+        await asyncio.sleep(0)
+        await caches[1].get_or_load("a", lambda: loader("a"))
+        assert caches[1].snapshot()["entries"] == 1 and "files:meta:a" in redis.values
+
+        await caches[0].invalidate_many(["a"])
+        await asyncio.sleep(0)
+        assert caches[1].snapshot()["entries"] == 0
+        assert "files:meta:a" not in redis.values
+
+        listener.cancel()
+        with suppress(asyncio.CancelledError):
+            await listener
+
+    asyncio.run(scenario())
+
+
+class SlowLoader:
+    """Загрузчик, который читает запись и ждёт, пока её изменят."""
+
+    def __init__(self, invalidate):
+        self.invalidate, self.calls = invalidate, 0
+
+    async def __call__(self, uid):
+        self.calls += 1
+        file = make_file(uid)
+        if self.calls == 1:
+            await self.invalidate([uid])
+        return file
+
+    async def many(self, uids):
+        return [await self(uid) for uid in uids]
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    cache = MetadataCache(max_entries=10, ttl=60, negative_ttl=60)
+    loader = SlowLoader(cache.invalidate_many)
+
+    async def scenario():
+        # Загрузка вернула прочитанное, но кэш его не запомнил
+        assert (await cache.get_or_load("a", lambda: loader("a"))).uid == "a"
+        assert cache.snapshot()["entries"] == 0
+        await cache.get_or_load("a", lambda: loader("a"))
+        await cache.get_or_load("a", lambda: loader("a"))
+
+    asyncio.run(scenario())
+    assert loader.calls == 2
+
+
+def test_invalidation_during_batch_load_skips_only_that_uid():
+    cache = MetadataCache(max_entries=10, ttl=60, negative_ttl=60)
+    loader = SlowLoader(cache.invalidate_many)
+
+    async def scenario():
+        files = await cache.get_many_or_load(["a", "b"], loader.many)
+        assert [file.uid for file in files] == ["a", "b"]
+        await cache.get_many_or_load(["a", "b"], loader.many)
+
+    asyncio.run(scenario())
+    # «a» сброшен во время первой загрузки и загружается снова, «b» — из кэша
+    assert loader.calls == 3
+
+
+def test_invalidation_by_other_process_during_load_keeps_redis_clean():
+    redis = FakeRedis()
+    caches = [
+        MetadataCache(max_entries=10, ttl=60, negative_ttl=60, redis_url="redis://")
+        for _ in range(2)
+    ]
+    for cache in caches:
+        cache._redis = redis
+
+    async def invalidate_elsewhere(uids):
+        # Сообщение по каналу ещё не дошло до процесса, который загружает
+        await caches[1].invalidate_many(uids)
+
+    loader = SlowLoader(invalidate_elsewhere)
+
+    async def scenario():
+        await caches[0].get_or_load("a", lambda: loader("a"))
+        assert "files:meta:a" not in redis.values
+
+        await caches[0].get_or_load("b", lambda: loader("b"))
+        assert "files:meta:b" in redis.values
+
+    asyncio.run(scenario())
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.config import settings
+from src.tasks.metrics import _observe_queue_wait, _stamp_published_at
+
+PDF = b"%PDF-1.4\n" + b"8" * 5000
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def stage_count(pipeline, stage):
+    return sample(
+        "files_stage_duration_seconds_count", pipeline=pipeline, stage=stage
+    )
+
+
+def test_pipeline_stages_and_bytes_are_exported(client, internal_headers):
+    client, storage = client
+    before = {
+        (pipeline, stage): stage_count(pipeline, stage)
+        for pipeline, stage in [
+            ("upload", "prepare"),
+            ("upload", "ingest"),
+            ("upload", "db_insert"),
+            ("upload", "enqueue"),
+            ("download", "lookup"),
+            ("download", "locate"),
+        ]
+    }
+    received = sample("files_transferred_bytes_total", direction="received")
+    sent = sample("files_transferred_bytes_total", direction="sent")
+    hits = sample("files_local_cache_requests_total", result="hit")
+
+    uid = client.post(
+        "/files/upload", files={"file": ("doc.pdf", PDF, "application/pdf")}
+    ).json()["uid"]
+    assert client.get(f"/files/download/{uid}").content == PDF
+
+    for key, count in before.items():
+        assert stage_count(*key) == count + 1, key
+    assert sample("files_transferred_bytes_total", direction="received") == received + len(PDF)
+    assert sample("files_transferred_bytes_total", direction="sent") == sent + len(PDF)
+    assert sample("files_local_cache_requests_total", result="hit") == hits + 1
+
+    response = client.get("/metrics", headers=internal_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Запросы учитываются по шаблону маршрута, а не по пути
+    assert 'route="/files/download/{uid}"' in response.text
+    assert uid not in response.text
+    assert "files_http_requests_in_progress" in response.text
+
+
+@pytest.mark.parametrize(
+    "path", ["/metrics", "/internal/flight-recorder", "/internal/metadata-cache"]
+)
+def test_internal_routes_require_token(client, monkeypatch, path):
+    client, storage = client
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", None)
+    assert client.get(path).status_code == 403
+
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", "secret")
+    assert client.get(path).status_code == 401
+    response = client.get(path, headers={"Authorization": "Bearer other"})
+    assert response.status_code == 401
+    response = client.get(path, headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+
+
+def test_task_queue_wait_is_measured_from_publish():
+    headers = {}
+    _stamp_published_at(headers=headers)
+    task = SimpleNamespace(
+        name="upload_file_to_cloud",
+        request=SimpleNamespace(get=lambda key: headers.get(key)),
+    )
+    count = sample("files_task_queue_wait_seconds_count", task="upload_file_to_cloud")
+
+    _observe_queue_wait(task=task)
+    assert (
+        sample("files_task_queue_wait_seconds_count", task="upload_file_to_cloud")
+        == count + 1
+    )
@@ -0,0 +1,153 @@
+import asyncio
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+from src.tasks.outbox import OutboxDispatcher
+from src.tasks.upload_to_cloud import _upload_file_to_cloud
+
+PDF = b"%PDF-1.4\n" + b"7" * 5000
+
+
+class FakeTask:
+    def __init__(self):
+        self.sent, self.fail = [], False
+
+    def apply_async(self, kwargs, producer):
+        if self.fail:
+            raise ConnectionError("broker is down")
+        self.sent.append(kwargs)
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = SimpleNamespace(single=FakeTask(), batch=FakeTask())
+    monkeypatch.setattr("src.tasks.outbox.upload_file_to_cloud", broker.single)
+    monkeypatch.setattr("src.tasks.outbox.upload_files_to_cloud", broker.batch)
+    monkeypatch.setattr(
+        "src.tasks.outbox.celery.producer_or_acquire", lambda: nullcontext()
+    )
+    return broker
+
+
+def upload(client, body=PDF):
+    response = client.post(
+        "/files/upload", files={"file": ("doc.pdf", body, "application/pdf")}
+    )
+    return response.json()["uid"]
+
+
+def test_notified_upload_is_published_and_leased(
+    client, session_maker, pending_uploads, broker
+):
+    client, storage = client
+    uid = upload(client)
+    [pending] = pending_uploads()
+    dispatcher = OutboxDispatcher(
+        session_maker, batch_size=10, recovery_delay=30, lease=600
+    )
+
+    async def scenario():
+        # Свою запись процесс отправляет сразу, не дожидаясь просмотра
+        task = asyncio.create_task(dispatcher.run(interval=60))
+        await asyncio.sleep(0)
+        dispatcher.notify([uid])
+        for _ in range(100):
+            if broker.single.sent:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert broker.single.sent == [
+        {
+            "file_path": str(storage / pending.storage_key),
+            "destination_name": pending.storage_key,
+        }
+    ]
+    # Запись ждёт подтверждения воркера и до конца аренды снова не публикуется
+    [leased] = pending_uploads()
+    assert leased.attempts == 1
+    assert asyncio.run(dispatcher.dispatch()) == 0
+    assert asyncio.run(dispatcher.dispatch([uid])) == 0
+
+
+def test_undelivered_upload_is_recovered_after_delay(
+    client, session_maker, pending_uploads, broker
+):
+    client, storage = client
+    uid = upload(client)
+
+    # Процесс, принявший файл, мог упасть: чужая запись ждёт recovery_delay
+    assert asyncio.run(OutboxDispatcher(session_maker, 10, 30, 600).dispatch()) == 0
+
+    dispatcher = OutboxDispatcher(
+        session_maker, batch_size=10, recovery_delay=0, lease=600
+    )
+    broker.single.fail = True
+    assert asyncio.run(dispatcher.dispatch([uid])) == 1
+    [pending] = pending_uploads()
+    assert pending.attempts == 1
+
+    broker.single.fail = False
+    assert asyncio.run(dispatcher.dispatch()) == 1
+    assert len(broker.single.sent) == 1
+    [pending] = pending_uploads()
+    assert pending.attempts == 2
+
+
+def test_failed_cloud_upload_is_republished_until_confirmed(
+    client, session_maker, pending_uploads, broker, monkeypatch
+):
+    client, storage = client
+    uid = upload(client)
+    uploaded = {}
+
+    class Provider:
+        fail = True
+
+        async def upload(self, key, path):
+            if self.fail:
+                raise ConnectionError("bucket is down")
+            uploaded[key] = path
+
+    provider = Provider()
+    monkeypatch.setattr("src.tasks.upload_to_cloud.cloud_provider", provider)
+    # Аренда истекает сразу, как если бы прошло OUTBOX_LEASE_SECONDS
+    dispatcher = OutboxDispatcher(
+        session_maker, batch_size=10, recovery_delay=0, lease=0
+    )
+
+    assert asyncio.run(dispatcher.dispatch([uid])) == 1
+    with pytest.raises(ConnectionError):
+        asyncio.run(_upload_file_to_cloud(**broker.single.sent[0]))
+    assert len(pending_uploads()) == 1
+
+    assert asyncio.run(dispatcher.dispatch()) == 1
+    provider.fail = False
+    asyncio.run(_upload_file_to_cloud(**broker.single.sent[1]))
+    assert list(uploaded) == [broker.single.sent[1]["destination_name"]]
+    assert pending_uploads() == []
+    assert asyncio.run(dispatcher.dispatch()) == 0
+
+
+def test_batch_upload_is_published_as_one_task(
+    client, session_maker, pending_uploads, broker
+):
+    client, storage = client
+    uids = client.post(
+        "/files/upload/batch",
+        files=[
+            ("files", ("a.pdf", PDF, "application/pdf")),
+            ("files", ("b.pdf", PDF + b"2", "application/pdf")),
+        ],
+    ).json()["uids"]
+
+    dispatcher = OutboxDispatcher(
+        session_maker, batch_size=10, recovery_delay=30, lease=600
+    )
+    assert asyncio.run(dispatcher.dispatch(uids)) == 2
+    [message] = broker.batch.sent
+    assert len(message["files"]) == 2
+    assert broker.single.sent == []
@@ -0,0 +1,149 @@
+import asyncio
+
+from src.config import settings
+from src.models import StorageState
+from src.repositories import FileRepository
+from src.services.s3 import YandexCloudProvider
+
+PDF = b"%PDF-1.4\n" + b"5" * 5000
+
+
+class FakeProvider:
+    part_size = staticmethod(YandexCloudProvider.part_size)
+
+    def __init__(self, content=PDF):
+        self.content = content
+        self.objects, self.aborted, self.deleted = {}, [], []
+
+    async def create_multipart_upload(self, key):
+        return f"mpu-{key}"
+
+    async def presigned_part_urls(self, key, upload_id, parts_count, expires_in):
+        return [f"https://s3/{key}?partNumber={n}" for n in range(1, parts_count + 1)]
+
+    async def complete_multipart_upload(self, key, upload_id, parts):
+        if parts != [{"PartNumber": 1, "ETag": '"etag-1"'}]:
+            raise FileNotFoundError(key)
+        self.objects[key] = self.content
+
+    async def abort_multipart_upload(self, key, upload_id):
+        self.aborted.append(key)
+
+    async def object_size(self, key):
+        return len(self.objects[key]) if key in self.objects else None
+
+    async def read_head(self, key, length):
+        return self.objects[key][:length]
+
+    async def delete(self, key):
+        self.deleted.append(key)
+
+    async def presigned_download_url(self, key, filename, expires_in):
+        return f"https://s3/{key}?filename={filename}"
+
+
+def start_direct_upload(client, content_type="application/pdf"):
+    return client.post(
+        "/files/uploads/direct",
+        json={"filename": "big.pdf", "content_type": content_type, "size": len(PDF)},
+    )
+
+
+def test_direct_upload_registers_object_from_bucket(client, session_maker, monkeypatch):
+    client, storage = client
+    provider = FakeProvider()
+    monkeypatch.setattr("src.api.upload_session_routes.cloud_provider", provider)
+
+    response = start_direct_upload(client)
+    assert response.status_code == 201
+    upload = response.json()
+    upload_id = upload["upload_id"]
+    assert [part["part_number"] for part in upload["parts"]] == [1]
+    assert upload["parts"][0]["url"].startswith(f"https://s3/{upload_id}.pdf")
+
+    # Части не совпадают с отправленными
+    response = client.post(
+        f"/files/uploads/direct/{upload_id}/complete",
+        json={"parts": [{"part_number": 1, "etag": '"other"'}]},
+    )
+    assert response.status_code == 409
+
+    response = client.post(
+        f"/files/uploads/direct/{upload_id}/complete",
+        json={"parts": [{"part_number": 1, "etag": '"etag-1"'}]},
+    )
+    assert response.status_code == 201
+    assert response.json()["uid"] == upload_id
+
+    async def get_file():
+        async with session_maker() as session:
+            return await FileRepository(session).get_by_uid(upload_id)
+
+    file = asyncio.run(get_file())
+    assert file.file_size == len(PDF)
+    assert file.object_key == f"{upload_id}.pdf"
+    assert file.storage_state == StorageState.EVICTED_LOCALLY
+    # Содержимое не проходило через сервис
+    assert list(storage.iterdir()) == []
+
+    response = client.post(
+        f"/files/uploads/direct/{upload_id}/complete",
+        json={"parts": [{"part_number": 1, "etag": '"etag-1"'}]},
+    )
+    assert response.status_code == 404
+
+
+def test_direct_upload_abort_and_validation(client, monkeypatch):
+    client, storage = client
+    provider = FakeProvider()
+    monkeypatch.setattr("src.api.upload_session_routes.cloud_provider", provider)
+
+    assert start_direct_upload(client, content_type="text/plain").status_code == 400
+
+    upload_id = start_direct_upload(client).json()["upload_id"]
+    # Возобновляемые загрузки и прямые не смешиваются
+    assert client.delete(f"/files/uploads/{upload_id}").status_code == 404
+    assert client.delete(f"/files/uploads/direct/{upload_id}").status_code == 204
+    assert provider.aborted == [f"{upload_id}.pdf"]
+    assert client.delete(f"/files/uploads/direct/{upload_id}").status_code == 404
+
+
+def test_direct_upload_with_forged_type_is_deleted(client, session_maker, monkeypatch):
+    client, storage = client
+    # Заявлен PDF, а в бакет отправлен исполняемый файл
+    provider = FakeProvider(content=b"MZ\x90\x00" + b"5" * (len(PDF) - 4))
+    monkeypatch.setattr("src.api.upload_session_routes.cloud_provider", provider)
+
+    upload_id = start_direct_upload(client).json()["upload_id"]
+    response = client.post(
+        f"/files/uploads/direct/{upload_id}/complete",
+        json={"parts": [{"part_number": 1, "etag": '"etag-1"'}]},
+    )
+
+    assert response.status_code == 400
+    assert provider.deleted == [f"{upload_id}.pdf"]
+
+    async def get_file():
+        async with session_maker() as session:
+            return await FileRepository(session).get_by_uid(upload_id)
+
+    assert asyncio.run(get_file()) is None
+
+
+def test_download_redirects_to_bucket(client, monkeypatch):
+    client, storage = client
+    provider = FakeProvider()
+    monkeypatch.setattr("src.api.upload_session_routes.cloud_provider", provider)
+    monkeypatch.setattr("src.api.file_routes.cloud_provider", provider)
+    monkeypatch.setattr(settings, "DOWNLOAD_PRESIGNED_REDIRECT", True)
+
+    upload_id = start_direct_upload(client).json()["upload_id"]
+    client.post(
+        f"/files/uploads/direct/{upload_id}/complete",
+        json={"parts": [{"part_number": 1, "etag": '"etag-1"'}]},
+    )
+
+    response = client.get(f"/files/download/{upload_id}", follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == f"https://s3/{upload_id}.pdf?filename=big.pdf"
+    assert response.headers["cache-control"] == "no-store"
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from src.models import UploadSession
+from src.services import resumable_upload
+
+PDF = b"%PDF-1.4\n" + b"4" * 5000
+
+
+def create_upload(client, size=len(PDF)):
+    response = client.post(
+        "/files/uploads",
+        json={"filename": "big.pdf", "content_type": "application/pdf", "size": size},
+    )
+    assert response.status_code == 201
+    return response.json()["upload_id"]
+
+
+def patch_chunk(client, upload_id, offset, data):
+    return client.patch(
+        f"/files/uploads/{upload_id}",
+        content=data,
+        headers={
+            "Upload-Offset": str(offset),
+            "Content-Type": "application/offset+octet-stream",
+        },
+    )
+
+
+def test_chunks_are_assembled_and_registered(client, pending_uploads):
+    client, storage = client
+    upload_id = create_upload(client)
+
+    assert patch_chunk(client, upload_id, 0, PDF[:2000]).headers["Upload-Offset"] == "2000"
+
+    # Повтор уже принятой части отклоняется с текущим смещением
+    response = patch_chunk(client, upload_id, 0, PDF[:2000])
+    assert response.status_code == 409
+    assert response.headers["Upload-Offset"] == "2000"
+
+    response = client.head(f"/files/uploads/{upload_id}")
+    assert response.headers["Upload-Offset"] == "2000"
+
+    # Незавершённую загрузку нельзя завершить
+    assert client.post(f"/files/uploads/{upload_id}/finalize").status_code == 409
+
+    assert patch_chunk(client, upload_id, 2000, PDF[2000:]).status_code == 204
+    response = client.post(f"/files/uploads/{upload_id}/finalize")
+    assert response.status_code == 201
+    uid = response.json()["uid"]
+
+    assert client.get(f"/files/download/{uid}").content == PDF
+    assert [pending.file_uid for pending in pending_uploads()] == [uid]
+    assert client.head(f"/files/uploads/{upload_id}").status_code == 404
+    assert not any(path.name.startswith(".upload-") for path in storage.iterdir())
+
+
+def test_rejects_oversized_chunk_and_disallowed_type(client):
+    client, storage = client
+
+    response = client.post(
+        "/files/uploads",
+        json={"filename": "a.txt", "content_type": "text/plain", "size": 10},
+    )
+    assert response.status_code == 400
+
+    upload_id = create_upload(client, size=10)
+    assert patch_chunk(client, upload_id, 0, b"x" * 11).status_code == 413
+
+
+def test_expired_uploads_are_swept(client, session_maker, monkeypatch):
+    client, storage = client
+    monkeypatch.setattr(resumable_upload, "async_session_maker", session_maker)
+    upload_id = create_upload(client)
+
+    async def expire():
+        async with session_maker() as session:
+            upload = await session.get(UploadSession, upload_id)
+            upload.expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+            await session.commit()
+
+    asyncio.run(expire())
+    assert client.head(f"/files/uploads/{upload_id}").status_code == 404
+
+    assert asyncio.run(resumable_upload.sweep_expired()) == [upload_id]
+    assert not (storage / f".upload-{upload_id}").exists()
+
+
+class ChunkRequest:
+    def __init__(self, data, started=None, proceed=None):
+        self.headers = {"content-length": str(len(data))}
+        self.data, self.started, self.proceed = data, started, proceed
+
+    async def stream(self):
+        if self.started is not None:
+            self.started.set()
+            await self.proceed.wait()
+        yield self.data
+
+
+def test_losing_concurrent_chunk_does_not_touch_staging(client, session_maker):
+    client, storage = client
+    upload_id = create_upload(client)
+
+    async def append(request):
+        async with session_maker() as session:
+            service = resumable_upload.ResumableUploadService(session)
+            return await service.append(upload_id, 0, request)
+
+    async def scenario():
+        started, proceed = asyncio.Event(), asyncio.Event()
+        # Оба запроса прошли проверку смещения, проигравший дописывает тело позже
+        loser = asyncio.create_task(append(ChunkRequest(b"B" * 2000, started, proceed)))
+        await started.wait()
+        assert await append(ChunkRequest(PDF[:2000])) == 2000
+        proceed.set()
+        with pytest.raises(HTTPException) as conflict:
+            await loser
+        assert conflict.value.status_code == 409
+
+    asyncio.run(scenario())
+    assert (storage / f".upload-{upload_id}").read_bytes() == PDF[:2000]
+    assert not any(path.name.endswith(".part") for path in storage.iterdir())
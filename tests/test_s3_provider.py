@@ -0,0 +1,20 @@
+from src.config import settings
+from src.services.s3 import YandexCloudProvider
+from src.services.s3.yandex_s3 import MAX_PARTS, MB, MIN_PART_SIZE
+
+
+def test_part_size_respects_s3_limits(monkeypatch):
+    monkeypatch.setattr(settings, "READ_CHUNK_SIZE", MB)
+
+    assert YandexCloudProvider.part_size(20 * MB) == MIN_PART_SIZE
+
+    huge = 200 * 1024 * MB
+    part_size = YandexCloudProvider.part_size(huge)
+    assert part_size % MB == 0
+    assert huge / part_size <= MAX_PARTS
+
+
+def test_part_size_prefers_configured_chunk(monkeypatch):
+    monkeypatch.setattr(settings, "READ_CHUNK_SIZE", 16 * MB)
+
+    assert YandexCloudProvider.part_size(100 * MB) == 16 * MB
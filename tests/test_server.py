@@ -0,0 +1,140 @@
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+PDF = b"%PDF-1.4\n" + os.urandom(8 * 1024 * 1024)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def launch(tmp_path):
+    """Запускает `python -m src` и возвращает процесс, порт и путь к журналу."""
+    processes = []
+
+    def start(**settings):
+        port = _free_port()
+        storage = tmp_path / "storage"
+        storage.mkdir(exist_ok=True)
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite3'}",
+            "STORAGE_PATH": str(storage),
+            "BROKER_URL": "memory://",
+            "RESULT_BACKEND": "cache+memory://",
+            "MIN_FREE_SPACE_MB": "0",
+            "SERVER_HOST": "127.0.0.1",
+            "SERVER_PORT": str(port),
+            **{key: str(value) for key, value in settings.items()},
+        }
+        log = tmp_path / "server.log"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "src"],
+            env=env,
+            stdout=log.open("wb"),
+            stderr=subprocess.STDOUT,
+        )
+        processes.append(process)
+
+        deadline = time.monotonic() + 30
+        while b"Application startup complete" not in log.read_bytes():
+            assert process.poll() is None, log.read_text()
+            assert time.monotonic() < deadline, log.read_text()
+            time.sleep(0.1)
+        return process, port, log
+
+    yield start
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def _request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def _upload(port) -> str:
+    boundary = "benchboundary"
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="doc.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + PDF + f"\r\n--{boundary}--\r\n".encode()
+    status, content = _request(
+        port,
+        "POST",
+        "/files/upload",
+        body,
+        {"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert status == 201, content
+    return content.decode().split('"uid":"')[1].split('"')[0]
+
+
+def test_sigterm_drains_streaming_download(launch):
+    process, port, log = launch(SERVER_WORKERS=2, SERVER_GRACEFUL_TIMEOUT_SECONDS=10)
+    uid = _upload(port)
+
+    # Клиент читает медленно, так что к сигналу ответ отправлен не целиком
+    client = socket.socket()
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+    client.connect(("127.0.0.1", port))
+    client.sendall(
+        f"GET /files/download/{uid} HTTP/1.1\r\nHost: test\r\n\r\n".encode()
+    )
+    received = client.recv(64 * 1024)
+
+    process.send_signal(signal.SIGTERM)
+    time.sleep(0.5)
+    assert process.poll() is None
+    with pytest.raises(ConnectionRefusedError):
+        socket.create_connection(("127.0.0.1", port), timeout=1)
+
+    while chunk := client.recv(1024 * 1024):
+        received += chunk
+    client.close()
+
+    head, _, body = received.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200")
+    assert body == PDF
+    assert process.wait(timeout=30) == 0
+    assert b"Application shutdown complete" in log.read_bytes()
+
+
+def test_worker_is_replaced_after_max_requests(launch):
+    process, port, log = launch(SERVER_WORKERS=1, SERVER_MAX_REQUESTS=3)
+
+    # Сокет остаётся открытым в главном процессе: соединения ждут нового воркера
+    statuses = []
+    for _ in range(10):
+        statuses.append(
+            _request(port, "GET", "/files/00000000-0000-0000-0000-000000000000")[0]
+        )
+        # uvicorn проверяет лимит запросов раз в 0,1 с
+        time.sleep(0.15)
+
+    assert statuses == [404] * 10
+    deadline = time.monotonic() + 10
+    while log.read_bytes().count(b"Application startup complete") < 3:
+        assert time.monotonic() < deadline, log.read_text()
+        time.sleep(0.1)
+    assert b"served its requests" in log.read_bytes()
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
@@ -0,0 +1,125 @@
+import asyncio
+import subprocess
+import sys
+
+from src.services.local_cache import LocalFileCache
+from src.services.storage_capacity import StorageCapacity
+
+
+def _make_capacity(root, free):
+    capacity = StorageCapacity(str(root), min_free_bytes=100)
+    capacity._disk_free = lambda: free[0]
+    return capacity
+
+
+def test_concurrent_reservations_do_not_exceed_free_space(tmp_path):
+    free = [1000]
+
+    async def run():
+        capacity = _make_capacity(tmp_path, free)
+        await capacity.open()
+        reservations = await asyncio.gather(
+            *(capacity.reserve(300) for _ in range(4))
+        )
+        granted = [r for r in reservations if r is not None]
+        usage = await capacity.usage()
+
+        # Место под отклонённую загрузку освобождается вместе с резервом
+        await granted[0].release()
+        retried = await capacity.reserve(300)
+        await capacity.close()
+        return len(granted), usage, retried
+
+    granted, usage, retried = asyncio.run(run())
+
+    assert granted == 3
+    assert usage == (0, 900)
+    assert retried is not None
+
+
+def test_kept_bytes_count_until_next_sample(tmp_path):
+    free = [1000]
+
+    async def run():
+        capacity = _make_capacity(tmp_path, free)
+        await capacity.open()
+        async with await capacity.reserve(500) as reservation:
+            reservation.keep(400)
+        after_release = await capacity.usage()
+
+        # Записанные байты видны в новом замере
+        free[0] -= 400
+        await capacity.sample()
+        after_sample = await capacity.usage()
+        await capacity.close()
+        return after_release, after_sample
+
+    after_release, after_sample = asyncio.run(run())
+
+    assert after_release == (500, 0)
+    assert after_sample == (500, 0)
+
+
+def test_sample_drops_reservations_of_exited_processes(tmp_path):
+    free = [1000]
+    # Резерв процесса, завершившегося без release()
+    script = (
+        "import asyncio\n"
+        "from src.services.storage_capacity import StorageCapacity\n"
+        "async def main():\n"
+        f"    capacity = StorageCapacity({str(tmp_path)!r}, 0)\n"
+        "    await capacity.open()\n"
+        "    assert await capacity.reserve(1) is not None\n"
+        "asyncio.run(main())\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    async def run():
+        capacity = _make_capacity(tmp_path, free)
+        await capacity.open()
+        usage = await capacity.usage()
+        await capacity.close()
+        return usage
+
+    assert asyncio.run(run()) == (900, 0)
+
+
+def test_make_room_evicts_when_volume_is_short(tmp_path):
+    free = [400]
+    for name in ("a", "b"):
+        (tmp_path / name).write_bytes(b"x" * 100)
+
+    async def confirm_uploaded(name):
+        return True
+
+    async def run():
+        capacity = _make_capacity(tmp_path, free)
+        cache = LocalFileCache(
+            root=str(tmp_path),
+            max_bytes=10_000,
+            high_watermark=0.9,
+            low_watermark=0.5,
+            capacity=capacity,
+            confirm_uploaded=confirm_uploaded,
+        )
+        await capacity.open()
+        await cache.open()
+        for name in ("a", "b"):
+            await cache.add(name, 100)
+            await asyncio.sleep(0.01)
+
+        held = await cache.make_room(250)
+        # Вытеснение файла "a" освобождает место на томе
+        capacity._disk_free = lambda: free[0] + 100 * (not (tmp_path / "a").exists())
+        second = await cache.make_room(100)
+        refused = await cache.make_room(1000)
+        await cache.close()
+        await capacity.close()
+        return held, second, refused
+
+    held, second, refused = asyncio.run(run())
+
+    assert held is not None
+    assert second is not None
+    assert not (tmp_path / "a").exists()
+    assert refused is None
@@ -0,0 +1,92 @@
+import asyncio
+
+from src.models import StorageState
+from src.repositories import FileRepository
+from src.tasks.outbox import _task_kwargs
+from src.tasks.upload_to_cloud import _upload_file_to_cloud
+
+PDF = b"%PDF-1.4\n" + b"3" * 5000
+
+
+class FakeProvider:
+    def __init__(self):
+        self.uploads, self.opened = {}, []
+
+    async def upload(self, key, path):
+        with open(path, "rb") as file:
+            self.uploads[key] = file.read()
+
+    def open_stream(self, key):
+        self.opened.append(key)
+        raise AssertionError("cloud must not be queried")
+
+
+def get_state(session_maker, uid):
+    async def query():
+        async with session_maker() as session:
+            return (await FileRepository(session).get_by_uid(uid)).storage_state
+
+    return asyncio.run(query())
+
+
+def test_state_follows_upload_to_cloud(
+    client, session_maker, pending_uploads, monkeypatch
+):
+    client, storage = client
+    provider = FakeProvider()
+    monkeypatch.setattr("src.tasks.upload_to_cloud.cloud_provider", provider)
+
+    response = client.post(
+        "/files/upload", files={"file": ("a.pdf", PDF, "application/pdf")}
+    )
+    uid = response.json()["uid"]
+    assert get_state(session_maker, uid) == StorageState.LOCAL_ONLY
+
+    [pending] = pending_uploads()
+    asyncio.run(_upload_file_to_cloud(**_task_kwargs(pending)))
+
+    assert list(provider.uploads.values()) == [PDF]
+    assert get_state(session_maker, uid) == StorageState.IN_CLOUD
+    # Загрузка подтверждена: задача ушла из outbox
+    assert pending_uploads() == []
+
+    # Повторная доставка задачи из outbox не загружает файл снова
+    provider.uploads.clear()
+    asyncio.run(_upload_file_to_cloud(**_task_kwargs(pending)))
+    assert provider.uploads == {}
+
+
+def test_file_not_yet_in_cloud_is_never_fetched_from_it(
+    client, session_maker, monkeypatch
+):
+    client, storage = client
+    provider = FakeProvider()
+    monkeypatch.setattr("src.api.file_routes.cloud_provider", provider)
+
+    response = client.post(
+        "/files/upload", files={"file": ("a.pdf", PDF, "application/pdf")}
+    )
+    uid = response.json()["uid"]
+    for path in storage.iterdir():
+        path.unlink()
+
+    response = client.get(f"/files/download/{uid}")
+    assert response.status_code == 404
+    assert provider.opened == []
+
+
+def test_deleted_files_are_hidden(client, session_maker):
+    client, storage = client
+
+    response = client.post(
+        "/files/upload", files={"file": ("a.pdf", PDF, "application/pdf")}
+    )
+    uid = response.json()["uid"]
+
+    async def delete():
+        async with session_maker() as session:
+            assert await FileRepository(session).delete_by_uid(uid)
+
+    asyncio.run(delete())
+    assert client.get(f"/files/{uid}").status_code == 404
+    assert client.get(f"/files/download/{uid}").status_code == 404
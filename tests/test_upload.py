@@ -0,0 +1,171 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException, Request
+from fastapi.testclient import TestClient
+
+from src.config import settings
+from src.main import app
+from src.models import StorageState
+from src.services import local_cache
+from src.services.ingest import MultipartIngestor
+from src.services.proceed_file import FileValidator
+from src.services.storage_capacity import storage_capacity
+
+client = TestClient(app)
+
+PDF = b"%PDF-1.4\n" + b"0" * 5000
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(local_cache, "root", str(tmp_path))
+    monkeypatch.setattr(storage_capacity, "root", str(tmp_path))
+    monkeypatch.setattr(storage_capacity, "min_free_bytes", 0)
+    monkeypatch.setattr(settings, "WRITE_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(settings, "DEDUPLICATE_UPLOADS", False)
+    return tmp_path
+
+
+@patch("src.repositories.FileRepository.create_many", new_callable=AsyncMock)
+def test_upload_streams_file_to_storage(mock_create, storage):
+    response = client.post(
+        "/files/upload",
+        files={"file": ("doc.pdf", PDF, "application/pdf")},
+        data={"comment": "ignored"},
+    )
+
+    assert response.status_code == 201
+    uid = response.json()["uid"]
+    assert (storage / f"{uid}.pdf").read_bytes() == PDF
+    [record] = mock_create.call_args.args[0]
+    assert record.file_size == len(PDF)
+    # Задача загрузки в облако записывается в outbox для файлов только на диске
+    assert record.storage_state == StorageState.LOCAL_ONLY
+
+
+@patch("src.repositories.FileRepository.create_many", new_callable=AsyncMock)
+def test_upload_rejects_disallowed_type(mock_create, storage):
+    response = client.post(
+        "/files/upload",
+        files={"file": ("notes.txt", b"hello", "text/plain")},
+    )
+
+    assert response.status_code == 400
+    mock_create.assert_not_called()
+    assert list(storage.iterdir()) == []
+
+
+class FakeUpload:
+    def __init__(self, uploads, key):
+        self.uploads, self.key, self.data = uploads, key, bytearray()
+
+    async def write(self, data):
+        self.data += data
+
+    async def complete(self):
+        self.uploads[self.key] = bytes(self.data)
+
+    async def abort(self):
+        pass
+
+
+class FakeProvider:
+    def __init__(self):
+        self.uploads = {}
+
+    def start_upload(self, key, size_hint=0):
+        return FakeUpload(self.uploads, key)
+
+
+@patch("src.repositories.FileRepository.create_many", new_callable=AsyncMock)
+def test_direct_upload_goes_to_cloud_and_local_cache(mock_create, storage, monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr("src.services.upload_file.cloud_provider", provider)
+
+    response = client.post(
+        "/files/upload?direct=true",
+        files={"file": ("doc.pdf", PDF, "application/pdf")},
+    )
+
+    assert response.status_code == 201
+    uid = response.json()["uid"]
+    assert provider.uploads == {f"{uid}.pdf": PDF}
+    assert (storage / f"{uid}.pdf").read_bytes() == PDF
+    [record] = mock_create.call_args.args[0]
+    assert record.storage_state == StorageState.IN_CLOUD
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+@patch("src.repositories.FileRepository.create_many", new_callable=AsyncMock)
+def test_type_is_sniffed_from_content(mock_create, storage):
+    # Заявленный тип не совпадает с содержимым
+    response = client.post(
+        "/files/upload", files={"file": ("doc.pdf", b"hello world", "application/pdf")}
+    )
+    assert response.status_code == 400
+    mock_create.assert_not_called()
+
+    response = client.post(
+        "/files/upload", files={"file": ("picture.pdf", PNG, "application/pdf")}
+    )
+    assert response.status_code == 201
+    [record] = mock_create.call_args.args[0]
+    assert record.file_format == "image/png"
+
+
+def streamed_request(consumed, chunks):
+    """Запрос, тело которого приходит частями; consumed — сколько частей прочитано."""
+    parts = [
+        b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n"
+        b"Content-Type: application/pdf\r\n\r\n"
+    ]
+    parts += [(PDF * 16)[: 64 * 1024]] * chunks + [b"\r\n--b--\r\n"]
+
+    async def receive():
+        consumed.append(len(consumed))
+        body = parts[len(consumed) - 1]
+        return {
+            "type": "http.request",
+            "body": body,
+            "more_body": len(consumed) < len(parts),
+        }
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=b")],
+    }
+    return Request(scope, receive)
+
+
+def test_oversized_file_is_aborted_while_streaming(storage):
+    validator = FileValidator(allowed_types=["application/pdf"], max_size_mb=1)
+    consumed = []
+    ingestor = MultipartIngestor(
+        streamed_request(consumed, chunks=64), str(storage), validator=validator
+    )
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ingestor.ingest())
+
+    assert error.value.status_code == 400
+    assert error.value.headers["Connection"] == "close"
+    # Чтение прекратилось сразу после превышения 1 MB
+    assert len(consumed) == 1 + 1024 * 1024 // (64 * 1024) + 1
+    assert list(storage.iterdir()) == []
+
+
+def test_body_larger_than_allowed_is_rejected_unread(storage):
+    response = client.post(
+        "/files/upload",
+        files={"file": ("doc.pdf", PDF, "application/pdf")},
+        headers={"Content-Length": str(settings.MAX_FILE_SIZE_MB * 1024 * 1024 * 2)},
+    )
+    assert response.status_code == 413
+    assert response.headers["connection"] == "close"
+    assert list(storage.iterdir()) == []
@@ -0,0 +1,23 @@
+import asyncio
+
+from src.tasks.upload_limiter import UploadLimiter
+
+
+def test_limits_files_and_bytes_in_flight():
+    limiter = UploadLimiter(max_files=3, max_bytes=100)
+    peak = {"files": 0, "bytes": 0}
+
+    async def upload(size):
+        async with limiter.acquire(size):
+            peak["files"] = max(peak["files"], limiter.files)
+            peak["bytes"] = max(peak["bytes"], limiter.bytes)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(upload(40) for _ in range(6)), upload(500))
+
+    asyncio.run(run())
+
+    assert peak["files"] == 2
+    assert peak["bytes"] == 500
+    assert limiter.files == 0 and limiter.bytes == 0